@@ -1,12 +1,28 @@
-from helper.start import start_all
+import argparse
+
+from helper.start import start_all, start_production
 
 ##############################################################################################
 #       Note: this is a starter function to start all the server and ui all at once          #
 #                               using `python app.py` command                                #
 #                                                                                            #
+#           `python app.py serve --workers 4` runs only the server, in production mode       #
+#                  (several workers sharing one embedding model, no auto-reload).            #
+#                                                                                            #
 #                Feel free to remove this app.py and helper folder and run the               #
 #                      backend/server.py and frontend/ui.py separatly.                       #
 ##############################################################################################
 
 if __name__ == "__main__":
-    start_all()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest="command")
+    serve = commands.add_parser("serve", help="Run the API server with several workers, without auto-reload")
+    serve.add_argument("--workers", type=int, default=None, help="Worker processes (default: WEB_CONCURRENCY or CPU count)")
+    serve.add_argument("--host", default="0.0.0.0")
+    serve.add_argument("--port", type=int, default=8001)
+    serve.add_argument("--model-per-worker", action="store_true", help="Load the embedding model in every worker instead of sharing one")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        raise SystemExit(start_production(args.workers, args.host, args.port, shared_embeddings=not args.model_per_worker))
+    start_all()
@@ -0,0 +1,224 @@
+import asyncio
+import os
+import random
+import time
+from contextlib import nullcontext
+
+from cache import normalize_query
+from chains import TokenUsage, format_docs, record_retrieval
+from db import aretrieve_from_db
+from filters import filter_scope
+from gateway import is_retryable, retry_after
+from limiter import OverloadedError
+from metrics import REGISTRY
+from tracing import span
+
+
+class BatchRunner:
+    """
+    Answers many queries in one pass, streaming results as they complete.
+
+    - Duplicate queries (after normalization) are answered once and share
+      the result; exact and semantic cache hits skip retrieval and generation.
+    - All remaining queries are embedded in one batched forward pass.
+    - Vector searches run concurrently, up to `search_concurrency` at a time.
+    - LLM calls run up to `llm_concurrency` at a time. Rate-limit and transient
+      errors are retried with exponential backoff and jitter. A 429 pauses
+      every worker for the Retry-After the API asked for, so the batch slows
+      down instead of hammering the endpoint.
+    - Each LLM call also holds a slot of `limiter`, the limiter /invoke uses,
+      so a batch shares the server's LLM capacity with interactive queries.
+      When no slot frees up in time the call is retried like a transient error.
+
+    Args:
+        vectorstore -> vector store with an `embeddings` model
+        rag_chain -> chain from create_rag_chain
+        retriever -> HybridRetriever (default: dense search on the vector store).
+        context_builder -> ContextBuilder (default: join the chunks).
+        async_collection -> AsyncCollection for $vectorSearch (default: None).
+        cache -> ResponseCache consulted and filled (default: None).
+        llm_concurrency -> int: LLM calls in flight (default: 8).
+        search_concurrency -> int: Vector searches in flight (default: 16).
+        max_retries -> int: Retries per LLM call (default: 5).
+        retry_base_delay -> float: First backoff delay in seconds, doubled per retry (default: 1.0).
+        limiter -> ConcurrencyLimiter each LLM call takes a slot of (default: None).
+    """
+
+    def __init__(self, vectorstore, rag_chain, retriever=None, context_builder=None, async_collection=None, cache=None,
+                 llm_concurrency=8, search_concurrency=16, max_retries=5, retry_base_delay=1.0, limiter=None):
+        self.vectorstore = vectorstore
+        self.rag_chain = rag_chain
+        self.retriever = retriever
+        self.context_builder = context_builder
+        self.async_collection = async_collection
+        self.cache = cache
+        self.llm_concurrency = llm_concurrency
+        self.search_concurrency = search_concurrency
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.limiter = limiter
+        self._paused_until = 0.0
+
+    async def _embed(self, queries):
+        with span("batch_embed", queries=len(queries)):
+            return await asyncio.to_thread(self.vectorstore.embeddings.embed_documents, queries)
+
+    async def _retrieve(self, query, query_vector, filters):
+        with span("retrieve") as retrieval:
+            if self.retriever is not None:
+                documents = await self.retriever.aretrieve(
+                    query, query_vector=query_vector, async_collection=self.async_collection, filters=filters
+                )
+            else:
+                documents = await aretrieve_from_db(
+                    query, vectorstore=self.vectorstore, async_collection=self.async_collection, query_vector=query_vector,
+                    filters=filters,
+                )
+            record_retrieval(retrieval, documents)
+        return documents
+
+    async def _generate(self, query, context, semaphore):
+        attempt = 0
+        while True:
+            async with semaphore:
+                # Another call was rate limited: wait out its Retry-After first
+                pause = self._paused_until - time.monotonic()
+                if pause > 0:
+                    await asyncio.sleep(pause)
+                usage = TokenUsage()
+                try:
+                    async with self.limiter or nullcontext():
+                        with span("llm", attempt=attempt) as llm:
+                            response = await self.rag_chain.ainvoke({"context": context, "query": query}, config={"callbacks": [usage]})
+                            usage.record(llm)
+                    return response, attempt
+                except Exception as e:
+                    if attempt >= self.max_retries or not (is_retryable(e) or isinstance(e, OverloadedError)):
+                        raise
+                    delay = retry_after(e) or self.retry_base_delay * 2 ** attempt * (0.5 + random.random())
+                    if getattr(e, "status_code", None) == 429:
+                        self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                    REGISTRY.counter("rag_batch_llm_retries", "LLM calls retried by the batch runner.").inc()
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def _answer(self, query, query_vector, search, llm, filters, generation):
+        start = time.perf_counter()
+        with span("batch_query") as trace:
+            async with search:
+                documents = await self._retrieve(query, query_vector, filters)
+            with span("prompt"):
+                context = format_docs(documents, self.context_builder)
+            response, retries = await self._generate(query, context, llm)
+            trace.set(retries=retries)
+        if self.cache is not None:
+            self.cache.set(query, query_vector, response, filter_scope(filters), generation)
+        return {
+            "response": response,
+            "documents": len(documents),
+            "retries": retries,
+            "latency_ms": round((time.perf_counter() - start) * 1000, 1),
+        }
+
+    async def run(self, queries, filters=None):
+        """
+        Answers the queries.
+
+        Args:
+            queries -> list of str
+            filters -> dict or None: normalized metadata filters applied to every query
+
+        Yields:
+            dict -> {"type": "result", "index", "query", "response" or "error", ...} per query in
+                    completion order, then {"type": "summary", ...}
+        """
+        start = time.perf_counter()
+        scope = filter_scope(filters)
+        groups = {}
+        for index, query in enumerate(queries):
+            groups.setdefault(normalize_query(query), []).append(index)
+        summary = {"queries": len(queries), "unique": len(groups), "cached": 0, "failed": 0, "retries": 0}
+
+        def results(indices, **fields):
+            return [{"type": "result", "index": index, "query": queries[index], **fields} for index in indices]
+
+        # Answers retrieved before an ingestion that lands mid-batch are not cached after it
+        generation = self.cache.generation if self.cache is not None else None
+
+        # Exact cache hits need no embedding at all
+        pending = {}
+        for key, indices in groups.items():
+            cached = self.cache.get_exact(queries[indices[0]], scope) if self.cache is not None else None
+            if cached is not None:
+                summary["cached"] += len(indices)
+                for result in results(indices, response=cached, cached=True):
+                    yield result
+            else:
+                pending[key] = indices
+
+        if pending:
+            texts = [queries[indices[0]] for indices in pending.values()]
+            try:
+                vectors = await self._embed(texts)
+            except Exception as e:
+                summary["failed"] += sum(map(len, pending.values()))
+                for indices in pending.values():
+                    for result in results(indices, error=f"Embedding failed: {e}"):
+                        yield result
+                pending, vectors = {}, []
+
+            search = asyncio.Semaphore(self.search_concurrency)
+            llm = asyncio.Semaphore(self.llm_concurrency)
+            tasks = {}
+            for (key, indices), text, vector in zip(pending.items(), texts, vectors):
+                cached = self.cache.get_semantic(vector, scope) if self.cache is not None else None
+                if cached is not None:
+                    summary["cached"] += len(indices)
+                    for result in results(indices, response=cached, cached=True):
+                        yield result
+                    continue
+                tasks[asyncio.create_task(self._answer(text, vector, search, llm, filters, generation))] = indices
+
+            remaining = set(tasks)
+            try:
+                while remaining:
+                    done, remaining = await asyncio.wait(remaining, return_when=asyncio.FIRST_COMPLETED)
+                    for finished in done:
+                        indices = tasks[finished]
+                        try:
+                            answer = finished.result()
+                        except Exception as e:
+                            summary["failed"] += len(indices)
+                            for result in results(indices, error=str(e)):
+                                yield result
+                            continue
+                        summary["retries"] += answer["retries"]
+                        for result in results(indices, cached=False, **answer):
+                            yield result
+            finally:
+                # The client went away: stop the queries still running
+                for task in remaining:
+                    task.cancel()
+
+        summary["elapsed_seconds"] = round(time.perf_counter() - start, 3)
+        yield {"type": "summary", **summary}
+
+
+def create_batch_runner(vectorstore, rag_chain, retriever=None, context_builder=None, async_collection=None, cache=None,
+                        limiter=None):
+    """
+    Creates a BatchRunner configured from the environment.
+
+        BATCH_LLM_CONCURRENCY -> int: LLM calls in flight per batch (default: 8).
+        BATCH_SEARCH_CONCURRENCY -> int: Vector searches in flight per batch (default: 16).
+        BATCH_MAX_RETRIES -> int: Retries per LLM call on rate limits and transient errors (default: 5).
+        BATCH_RETRY_BASE_DELAY -> float: First backoff delay in seconds (default: 1.0).
+    """
+    return BatchRunner(
+        vectorstore, rag_chain, retriever, context_builder, async_collection, cache,
+        llm_concurrency=int(os.getenv("BATCH_LLM_CONCURRENCY", "8")),
+        search_concurrency=int(os.getenv("BATCH_SEARCH_CONCURRENCY", "16")),
+        max_retries=int(os.getenv("BATCH_MAX_RETRIES", "5")),
+        retry_base_delay=float(os.getenv("BATCH_RETRY_BASE_DELAY", "1.0")),
+        limiter=limiter,
+    )
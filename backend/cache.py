@@ -0,0 +1,284 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from hashlib import sha256
+
+import numpy as np
+
+
+def normalize_query(query):
+    """Lower-cases the query, collapses whitespace and strips trailing punctuation."""
+    return re.sub(r"\s+", " ", query.strip().lower()).rstrip("?!. ")
+
+
+class MemoryCacheBackend:
+    """
+    In-process LRU cache with a per-entry time to live.
+
+    Args:
+        max_entries -> int: Entries kept before the least recently used one is evicted.
+        ttl -> float or None: Seconds an entry stays valid (None keeps entries until evicted).
+    """
+
+    def __init__(self, max_entries=1000, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            created, value = entry
+            if self.ttl is not None and time.time() - created > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def items(self):
+        with self._lock:
+            return [(key, value) for key, (_, value) in self._entries.items()]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskCacheBackend:
+    """
+    SQLite-backed LRU cache with a per-entry time to live, shared by every
+    process pointing at the same file and kept across restarts.
+
+    Args:
+        path -> str: SQLite file to store entries in.
+        max_entries -> int: Entries kept before the least recently used ones are evicted.
+        ttl -> float or None: Seconds an entry stays valid (None keeps entries until evicted).
+    """
+
+    def __init__(self, path, max_entries=1000, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT, created REAL, accessed REAL)"
+        )
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if self.ttl is not None and now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            return json.loads(row[0])
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now),
+            )
+            self._conn.execute(
+                "DELETE FROM entries WHERE key IN "
+                "(SELECT key FROM entries ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def items(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT key, value FROM entries").fetchall()
+        return [(key, json.loads(value)) for key, value in rows]
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+
+class ResponseCache:
+    """
+    Two-tier answer cache in front of the RAG chain.
+
+    The exact tier is keyed on the normalized query text. The semantic tier
+    compares the query embedding against the embeddings of previously answered
+    queries and returns the stored answer when the cosine similarity is at
+    least `similarity_threshold`.
+
+    Both tiers take an optional `scope` (see filters.filter_scope): an answer
+    cached for one tenant or document selection is only returned to queries
+    with the same scope.
+
+    Every `invalidate` bumps `generation`. Callers read it before their
+    lookup and pass it to `set`, so an answer built from context retrieved
+    before an ingestion is not cached after that ingestion cleared the cache.
+
+    Args:
+        backend -> MemoryCacheBackend or DiskCacheBackend holding the entries.
+        similarity_threshold -> float: Minimum cosine similarity for a semantic hit.
+    """
+
+    def __init__(self, backend, similarity_threshold=0.95):
+        self.backend = backend
+        self.similarity_threshold = similarity_threshold
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.stale_sets = 0
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._keys = []
+        self._vectors = np.empty((0, 0), dtype=np.float32)
+
+        for key, value in backend.items():
+            self._index(key, value["embedding"])
+
+    @staticmethod
+    def _key(query, scope=None):
+        text = normalize_query(query) if scope is None else f"{scope}\0{normalize_query(query)}"
+        return sha256(text.encode()).hexdigest()
+
+    def _index(self, key, embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector = vector / (np.linalg.norm(vector) or 1.0)
+        with self._lock:
+            if self._vectors.size == 0:
+                self._vectors = vector[None, :]
+            else:
+                self._vectors = np.vstack([self._vectors, vector])
+            self._keys.append(key)
+
+            # Drop vectors whose entries the backend has evicted
+            if len(self._keys) > 2 * self.backend.max_entries:
+                live = {key for key, _ in self.backend.items()}
+                keep = [i for i, k in enumerate(self._keys) if k in live]
+                self._keys = [self._keys[i] for i in keep]
+                self._vectors = self._vectors[keep]
+
+    def get_exact(self, query, scope=None):
+        """Returns the cached answer for the normalized query, or None."""
+        value = self.backend.get(self._key(query, scope))
+        if value is not None:
+            self.exact_hits += 1
+            return value["response"]
+        return None
+
+    def get_semantic(self, embedding, scope=None):
+        """Returns the answer of the most similar cached query in the same scope above the threshold, or None."""
+        with self._lock:
+            keys, vectors = list(self._keys), self._vectors
+
+        if keys:
+            query = np.asarray(embedding, dtype=np.float32)
+            similarities = vectors @ (query / (np.linalg.norm(query) or 1.0))
+            for index in np.argsort(-similarities):
+                if similarities[index] < self.similarity_threshold:
+                    break
+                value = self.backend.get(keys[index])
+                if value is not None and value.get("scope") == scope:
+                    self.semantic_hits += 1
+                    return value["response"]
+
+        self.misses += 1
+        return None
+
+    def set(self, query, embedding, response, scope=None, generation=None):
+        """
+        Caches the response under both the normalized query and its embedding.
+
+        Args:
+            generation -> int: `generation` read before the lookup; the response is dropped
+                          when the cache was invalidated since (default: None, always cached)
+        """
+        key = self._key(query, scope)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                self.stale_sets += 1
+                return
+            self.backend.set(key, {
+                "query": query,
+                "scope": scope,
+                "embedding": [float(x) for x in embedding],
+                "response": response,
+            })
+        self._index(key, embedding)
+
+    def invalidate(self, *args):
+        """Drops every entry; registered as an ingest listener so new documents are never shadowed."""
+        with self._lock:
+            self.generation += 1
+            self.backend.clear()
+            self._keys = []
+            self._vectors = np.empty((0, 0), dtype=np.float32)
+        self.invalidations += 1
+
+    def stats(self):
+        """Returns hit/miss counters and the current size."""
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "entries": len(self.backend),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.exact_hits + self.semantic_hits) / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "stale_sets": self.stale_sets,
+        }
+
+
+def create_response_cache():
+    """
+    Creates the response cache from the environment.
+
+        RESPONSE_CACHE -> "memory", "disk" or "off" (default: "memory").
+        RESPONSE_CACHE_PATH -> str: SQLite file for the disk backend (default: "./response_cache/responses.sqlite3").
+        RESPONSE_CACHE_MAX_ENTRIES -> int: LRU capacity (default: 1000).
+        RESPONSE_CACHE_TTL -> float: Seconds an entry stays valid, 0 disables expiry (default: 3600).
+        RESPONSE_CACHE_SIMILARITY -> float: Cosine threshold for semantic hits (default: 0.95).
+
+    Returns:
+        ResponseCache -> configured cache, or None when disabled
+    """
+    kind = os.getenv("RESPONSE_CACHE", "memory").lower()
+    if kind == "off":
+        return None
+
+    max_entries = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+    ttl = float(os.getenv("RESPONSE_CACHE_TTL", "3600")) or None
+
+    if kind == "disk":
+        backend = DiskCacheBackend(os.getenv("RESPONSE_CACHE_PATH", "./response_cache/responses.sqlite3"), max_entries, ttl)
+    elif kind == "memory":
+        backend = MemoryCacheBackend(max_entries, ttl)
+    else:
+        raise ValueError(f"Unknown RESPONSE_CACHE backend '{kind}'. Use 'memory', 'disk' or 'off'.")
+
+    return ResponseCache(backend, float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.95")))
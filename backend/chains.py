@@ -1,16 +1,22 @@
+import time
+from langchain_core.callbacks import BaseCallbackHandler
 from langchain_core.output_parsers import StrOutputParser
 from models import create_chat_model
 from prompts import rag_retrieval_prompt
-from db import retrieve_from_db
+from db import retrieve_from_db, aretrieve_from_db
+from filters import filter_scope
+from metrics import REGISTRY, SIZE_BUCKETS
+from tracing import span
 
+RETRIEVED_DOCUMENTS = REGISTRY.histogram("rag_retrieved_documents", "Documents retrieved per query.", SIZE_BUCKETS)
 
-def invoke_llm(user_query, vector):
+
+def create_rag_chain(llm=None):
     """
-    Creates a RAG chain for retrieval and generation.
+    Builds the prompt | llm | parser chain once so it can be reused across requests.
 
     Args:
-        user_query - user_query for retrieval
-        vectorstore ->  Instance of vector store 
+        llm -> Chat model instance (default: a new model from create_chat_model).
 
     Returns:
         rag_chain -> rag chain
@@ -19,21 +25,315 @@ def invoke_llm(user_query, vector):
     prompt = rag_retrieval_prompt()
 
     # LLM
-    llm = create_chat_model()
-
-    # Post-processing
-    def format_docs(docs):
-        return "\n\n".join(doc.page_content for doc in docs)
-    
-    # retriever = retrieve_from_chroma(user_query, vectorstore=vector)
-    retriever = retrieve_from_db(user_query, vectorstore=vector)
+    if llm is None:
+        llm = create_chat_model()
 
     # Chain
-    rag_chain = prompt| llm | StrOutputParser()
+    return prompt | llm | StrOutputParser()
+
+
+class TokenUsage(BaseCallbackHandler):
+    """Collects the prompt and completion token counts the LLM reports for one call."""
+
+    def __init__(self):
+        self.prompt_tokens = None
+        self.completion_tokens = None
+
+    def on_llm_end(self, response, **kwargs):
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        self.prompt_tokens = usage.get("prompt_tokens")
+        self.completion_tokens = usage.get("completion_tokens")
+        if self.prompt_tokens is None:
+            for generations in response.generations:
+                for generation in generations:
+                    metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                    self.prompt_tokens = metadata.get("input_tokens", self.prompt_tokens)
+                    self.completion_tokens = metadata.get("output_tokens", self.completion_tokens)
+
+    def record(self, llm_span, streamed_tokens=None):
+        """Adds the counts to rag_llm_tokens_total and the span; streamed chunks stand in for unreported completions."""
+        completion = self.completion_tokens if self.completion_tokens is not None else streamed_tokens
+        for kind, count in (("prompt", self.prompt_tokens), ("completion", completion)):
+            if count:
+                REGISTRY.counter("rag_llm_tokens", "Tokens sent to and generated by the LLM.", kind=kind).inc(count)
+                llm_span.set(**{f"{kind}_tokens": count})
+
+
+# Post-processing
+def format_docs(docs, context_builder=None):
+    """Joins the retrieved chunks, or builds a token-budgeted context when a ContextBuilder is given."""
+    if context_builder is not None:
+        return context_builder.build(docs)
+    return "\n\n".join(doc.page_content for doc in docs)
+
+
+def invoke_llm(user_query, vector, rag_chain=None, cache=None, retriever=None, context_builder=None, conversation=None, session_id=None, filters=None):
+    """
+    Runs retrieval and generation for the user query.
+
+    Args:
+        user_query - user_query for retrieval
+        vector ->  Instance of vector store
+        rag_chain -> Long-lived chain from create_rag_chain (default: built for this call).
+        cache -> ResponseCache checked before retrieval (default: None, no caching).
+        retriever -> HybridRetriever from create_retriever (default: dense search on the vector store).
+        context_builder -> ContextBuilder packing the chunks into a token budget (default: join them all).
+        conversation -> ConversationMemory from create_conversation_memory (default: None, stateless).
+        session_id -> str: Conversation the query belongs to; needs `conversation` (default: None).
+        filters -> dict: Normalized metadata filters (tenant, source, page) retrieval is limited to (default: None).
+
+    Returns:
+        response -> generated answer
+    """
+    with span("invoke", mode="sync") as trace:
+        scope = filter_scope(filters)
+        session, history, query = None, [], user_query
+        if conversation is not None and session_id is not None:
+            session = conversation.get(session_id)
+            history = conversation.history_messages(session)
+            with span("condense") as condense:
+                query = conversation.condense_query(session, user_query)
+                condense.set(rewritten=query != user_query)
+
+        query_vector = generation = None
+        if cache is not None:
+            generation = cache.generation
+            with span("cache_lookup") as lookup:
+                cached = cache.get_exact(query, scope)
+                if cached is None:
+                    with span("embed_query"):
+                        query_vector = vector.embeddings.embed_query(query)
+                    cached = cache.get_semantic(query_vector, scope)
+                lookup.set(hit=cached is not None)
+            if cached is not None:
+                trace.set(cached=True)
+                if session is not None:
+                    conversation.record(session, user_query, cached)
+                return cached
+
+        if rag_chain is None:
+            rag_chain = create_rag_chain()
+
+        with span("retrieve") as retrieval:
+            if retriever is not None:
+                documents = retriever.retrieve(query, query_vector=query_vector, filters=filters)
+            else:
+                documents = retrieve_from_db(query, vectorstore=vector, query_vector=query_vector, filters=filters)
+            record_retrieval(retrieval, documents)
+
+        with span("prompt"):
+            context = format_docs(documents, context_builder)
+
+        usage = TokenUsage()
+        with span("llm") as llm:
+            response = rag_chain.invoke({
+                "context" : context,
+                "query": user_query,
+                "history": history
+            }, config={"callbacks": [usage]})
+            usage.record(llm)
+
+        if cache is not None:
+            cache.set(query, query_vector, response, scope, generation)
+        if session is not None:
+            conversation.record(session, user_query, response)
+
+        return response
+
+
+def record_retrieval(retrieval, documents):
+    """Adds the retrieved-document count to the retrieval span and the rag_retrieved_documents histogram."""
+    retrieval.set(documents=len(documents))
+    RETRIEVED_DOCUMENTS.observe(len(documents))
+
+
+async def _acache_lookup(cache, user_query, vector, scope=None):
+    """
+    Checks both cache tiers without blocking the event loop.
+
+    Returns:
+        (response, query_vector, generation) -> cached answer or None, the query embedding when
+                                                computed, and the cache generation to pass to `set`
+    """
+    if cache is None:
+        return None, None, None
+
+    generation = cache.generation
+    with span("cache_lookup") as lookup:
+        cached = cache.get_exact(user_query, scope)
+        query_vector = None
+        if cached is None:
+            with span("embed_query"):
+                query_vector = await vector.embeddings.aembed_query(user_query)
+            cached = cache.get_semantic(query_vector, scope)
+        lookup.set(hit=cached is not None)
+    return cached, query_vector, generation
+
+
+async def _aprepare_session(conversation, session_id, user_query):
+    """
+    Loads the conversation and rewrites a follow-up into a standalone query.
+
+    Returns:
+        (session, history, query) -> Session or None, prompt history messages, query to retrieve with
+    """
+    if conversation is None or session_id is None:
+        return None, [], user_query
+
+    session = conversation.get(session_id)
+    history = conversation.history_messages(session)
+    with span("condense") as condense:
+        query = await conversation.acondense_query(session, user_query)
+        condense.set(rewritten=query != user_query)
+    return session, history, query
+
+
+async def _aretrieve(user_query, vector, async_collection, query_vector, retriever, filters=None):
+    with span("retrieve") as retrieval:
+        if retriever is not None:
+            documents = await retriever.aretrieve(
+                user_query, query_vector=query_vector, async_collection=async_collection, filters=filters
+            )
+        else:
+            documents = await aretrieve_from_db(
+                user_query, vectorstore=vector, async_collection=async_collection, query_vector=query_vector, filters=filters
+            )
+        record_retrieval(retrieval, documents)
+    return documents
+
+
+async def ainvoke_llm(user_query, vector, rag_chain=None, async_collection=None, cache=None, retriever=None, context_builder=None, conversation=None, session_id=None, filters=None):
+    """
+    Async variant of invoke_llm; retrieval and generation never block the event loop.
+
+    Args:
+        user_query - user_query for retrieval
+        vector ->  Instance of vector store
+        rag_chain -> Long-lived chain from create_rag_chain (default: built for this call).
+        async_collection -> AsyncCollection for $vectorSearch (default: vector store's async retriever).
+        cache -> ResponseCache checked before retrieval (default: None, no caching).
+        retriever -> HybridRetriever from create_retriever (default: dense search on the vector store).
+        context_builder -> ContextBuilder packing the chunks into a token budget (default: join them all).
+        conversation -> ConversationMemory from create_conversation_memory (default: None, stateless).
+        session_id -> str: Conversation the query belongs to; needs `conversation` (default: None).
+        filters -> dict: Normalized metadata filters (tenant, source, page) retrieval is limited to (default: None).
+
+    Returns:
+        response -> generated answer
+    """
+    with span("invoke", mode="async") as trace:
+        session, history, query = await _aprepare_session(conversation, session_id, user_query)
+
+        scope = filter_scope(filters)
+        cached, query_vector, generation = await _acache_lookup(cache, query, vector, scope)
+        if cached is not None:
+            trace.set(cached=True)
+            if session is not None:
+                await conversation.arecord(session, user_query, cached)
+            return cached
+
+        if rag_chain is None:
+            rag_chain = create_rag_chain()
+
+        documents = await _aretrieve(query, vector, async_collection, query_vector, retriever, filters)
+
+        with span("prompt"):
+            context = format_docs(documents, context_builder)
+
+        usage = TokenUsage()
+        with span("llm") as llm:
+            response = await rag_chain.ainvoke({
+                "context" : context,
+                "query": user_query,
+                "history": history
+            }, config={"callbacks": [usage]})
+            usage.record(llm)
+
+        if cache is not None:
+            cache.set(query, query_vector, response, scope, generation)
+        if session is not None:
+            await conversation.arecord(session, user_query, response)
+
+        return response
+
+
+async def astream_llm(user_query, vector, rag_chain=None, async_collection=None, metrics=None, cache=None, retriever=None, context_builder=None, conversation=None, session_id=None, filters=None):
+    """
+    Streams the answer token by token as it is generated.
+
+    Args:
+        user_query - user_query for retrieval
+        vector ->  Instance of vector store
+        rag_chain -> Long-lived chain from create_rag_chain (default: built for this call).
+        async_collection -> AsyncCollection for $vectorSearch (default: vector store's async retriever).
+        metrics -> dict or None: filled with ttft_ms, total_ms, tokens and tokens_per_sec when the stream ends.
+        cache -> ResponseCache checked before retrieval (default: None, no caching).
+        retriever -> HybridRetriever from create_retriever (default: dense search on the vector store).
+        context_builder -> ContextBuilder packing the chunks into a token budget (default: join them all).
+        conversation -> ConversationMemory from create_conversation_memory (default: None, stateless).
+        session_id -> str: Conversation the query belongs to; needs `conversation` (default: None).
+        filters -> dict: Normalized metadata filters (tenant, source, page) retrieval is limited to (default: None).
+
+    Yields:
+        token -> str chunk of the answer
+    """
+    start = time.perf_counter()
+
+    with span("invoke", mode="stream") as trace:
+        session, history, query = await _aprepare_session(conversation, session_id, user_query)
+
+        scope = filter_scope(filters)
+        cached, query_vector, generation = await _acache_lookup(cache, query, vector, scope)
+        if cached is not None:
+            trace.set(cached=True)
+            if session is not None:
+                await conversation.arecord(session, user_query, cached)
+            if metrics is not None:
+                elapsed = round((time.perf_counter() - start) * 1000, 1)
+                metrics.update({"ttft_ms": elapsed, "total_ms": elapsed, "tokens": 1, "tokens_per_sec": None, "cached": True})
+            yield cached
+            return
+
+        if rag_chain is None:
+            rag_chain = create_rag_chain()
+
+        first_token_at = None
+        tokens = 0
+        answer = []
+
+        documents = await _aretrieve(query, vector, async_collection, query_vector, retriever, filters)
+
+        with span("prompt"):
+            context = format_docs(documents, context_builder)
+
+        usage = TokenUsage()
+        with span("llm") as llm:
+            async for token in rag_chain.astream({
+                "context" : context,
+                "query": user_query,
+                "history": history
+            }, config={"callbacks": [usage]}):
+                if not token:
+                    continue
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                    llm.set(ttft_ms=round((first_token_at - start) * 1000, 1))
+                tokens += 1
+                answer.append(token)
+                yield token
+            usage.record(llm, streamed_tokens=tokens)
 
-    response = rag_chain.invoke({
-        "context" : format_docs(retriever),
-        "query": user_query
-    })    
+        if cache is not None:
+            cache.set(query, query_vector, "".join(answer), scope, generation)
+        if session is not None:
+            await conversation.arecord(session, user_query, "".join(answer))
 
-    return response
\ No newline at end of file
+        if metrics is not None:
+            end = time.perf_counter()
+            generation_time = end - (first_token_at or end)
+            metrics.update({
+                "ttft_ms": round(((first_token_at or end) - start) * 1000, 1),
+                "total_ms": round((end - start) * 1000, 1),
+                "tokens": tokens,
+                "tokens_per_sec": round(tokens / generation_time, 1) if generation_time > 0 else None,
+            })
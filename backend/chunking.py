@@ -0,0 +1,394 @@
+import bisect
+import multiprocessing
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from langchain_core.documents import Document
+
+STRATEGIES = ("structure", "token", "recursive")
+OVERLAPS = ("sentence", "tokens", "none")
+
+# Model whose tokenizer sizes the chunks; the default model of create_hugging_face_embedding_model
+EMBED_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Split points tried in order until every piece fits in a chunk
+_SEPARATORS = (
+    re.compile(r"\n[ \t]*\n\s*"),  # paragraphs
+    re.compile(r"\n+"),  # lines
+    re.compile(r"(?<=[.!?])\s+"),  # sentences
+    re.compile(r"\s+"),  # words
+)
+_SENTENCE_END = _SEPARATORS[2]
+
+_MARKDOWN_HEADING = re.compile(r"(#{1,6})\s+\S")
+_NUMBERED_HEADING = re.compile(r"(\d+(?:\.\d+)*)\.?\s+[A-Z]")
+_MINOR_WORDS = {"a", "an", "and", "as", "at", "by", "for", "in", "of", "on", "or", "the", "to", "vs", "with"}
+
+# Chunker built from the environment on first use, one per process
+_chunker = None
+
+# Shared process pool, created on first use
+_chunking_pool = None
+
+
+class ModelTokenCounter:
+    """
+    Counts tokens with the embedding model's own tokenizer, so chunk sizes
+    match what the model reads. The tokenizer files come from the same
+    cache as the model.
+
+    Args:
+        model_name -> str: Hugging Face model id (default: all-MiniLM-L6-v2)
+    """
+
+    def __init__(self, model_name=EMBED_MODEL_NAME, cache_folder="./hf_cache"):
+        # Imported on first use: transformers is slow to import
+        from transformers import AutoTokenizer
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name, cache_dir=cache_folder)
+
+    def count_many(self, texts):
+        encoded = self.tokenizer(
+            list(texts), add_special_tokens=False, return_attention_mask=False, return_token_type_ids=False, verbose=False,
+        )
+        return [len(ids) for ids in encoded["input_ids"]]
+
+
+class ApproxTokenCounter:
+    """
+    Estimates WordPiece tokens as words plus punctuation marks. Needs no
+    download; English text is usually within 10-20% of the real count.
+    """
+
+    _TOKEN = re.compile(r"\w+|[^\w\s]")
+
+    def count_many(self, texts):
+        return [len(self._TOKEN.findall(text)) for text in texts]
+
+
+def heading_level(line):
+    """
+    Returns the level (1-6) of a heading line, or None for body text.
+
+    Recognizes markdown headings (as produced by html_to_text), numbered
+    headings ("2.1 Installation"), and short all-caps or title-case lines
+    without closing punctuation, the usual shape of headings in PDF text.
+    """
+    line = line.strip()
+    if not line or len(line) > 80:
+        return None
+    if match := _MARKDOWN_HEADING.match(line):
+        return len(match.group(1))
+    if line[-1] in ".,;:!?" or not any(char.isalpha() for char in line):
+        return None
+    if match := _NUMBERED_HEADING.match(line):
+        return min(6, match.group(1).count(".") + 1)
+    words = line.split()
+    if len(words) > 8:
+        return None
+    if line.isupper():
+        return 1
+    if words[0][0].isupper() and all(word[0].isupper() or word[0].isdigit() or word in _MINOR_WORDS for word in words):
+        return 2
+    return None
+
+
+def _sections(text):
+    """Returns (start, heading path) of every section of text; a section starts at each heading line."""
+    sections, path = [(0, "")], []
+    for match in re.finditer(r"[^\n]+", text):
+        level = heading_level(match.group())
+        if level is None:
+            continue
+        while path and path[-1][0] >= level:
+            path.pop()
+        path.append((level, match.group().strip().lstrip("#").strip()))
+        if match.start() == sections[-1][0]:
+            sections.pop()
+        sections.append((match.start(), " > ".join(title for _, title in path)))
+    return sections
+
+
+def _pieces(text, start, end, separator):
+    """Spans of text[start:end] between matches of separator."""
+    position = start
+    for match in separator.finditer(text, start, end):
+        if match.start() > position:
+            yield position, match.start()
+        position = match.end()
+    if position < end:
+        yield position, end
+
+
+class Chunker:
+    """
+    Splits documents into chunks of at most `chunk_tokens` tokens of the
+    embedding model, as contiguous spans of the original text ("start_index"
+    metadata is the span's offset).
+
+    Text is cut at the coarsest boundary that makes every piece fit:
+    paragraphs, then lines, sentences and words. Pieces are packed back
+    together up to the token budget. With structure=True, chunks also break
+    at headings and carry the heading path in "section" metadata. Sections
+    below `min_tokens` (a lone heading, a one-line section) are packed with
+    the next section instead of becoming chunks of their own.
+
+    Overlap between consecutive chunks of a section:
+        "sentence" -> the last sentence of the previous chunk, if within `overlap_tokens`
+        "tokens"   -> as many trailing pieces of the previous chunk as fit in `overlap_tokens`
+        "none"     -> no overlap
+
+    Args:
+        counter -> ModelTokenCounter or ApproxTokenCounter
+        chunk_tokens -> int: max tokens per chunk
+        overlap -> "sentence", "tokens" or "none"
+        overlap_tokens -> int: max tokens repeated from the previous chunk
+        structure -> bool: break chunks at headings
+        min_tokens -> int: smallest section kept on its own
+    """
+
+    def __init__(self, counter, chunk_tokens=250, overlap="sentence", overlap_tokens=40, structure=True, min_tokens=50):
+        if overlap not in OVERLAPS:
+            raise ValueError(f"Unknown CHUNK_OVERLAP '{overlap}', expected one of: {', '.join(OVERLAPS)}")
+        self.counter = counter
+        self.chunk_tokens = chunk_tokens
+        self.overlap = overlap
+        self.overlap_tokens = overlap_tokens
+        self.structure = structure
+        self.min_tokens = min_tokens
+
+    def _split(self, text, spans, level=0):
+        """Splits spans into (start, end, tokens) pieces that fit in a chunk, trying each separator in turn."""
+        pieces = []
+        for (start, end), tokens in zip(spans, self.counter.count_many(text[start:end] for start, end in spans)):
+            if tokens <= self.chunk_tokens or level == len(_SEPARATORS):
+                pieces.append((start, end, tokens))
+            else:
+                pieces.extend(self._split(text, list(_pieces(text, start, end, _SEPARATORS[level])), level + 1))
+        return pieces
+
+    def _carry(self, text, current):
+        """Pieces of a finished chunk repeated at the start of the next one."""
+        if self.overlap == "tokens":
+            carried, total = [], 0
+            for piece in reversed(current[1:]):
+                if total + piece[2] > self.overlap_tokens:
+                    break
+                carried.insert(0, piece)
+                total += piece[2]
+            return carried
+        if self.overlap == "sentence":
+            start, end = current[0][0], current[-1][1]
+            boundaries = [match.end() for match in _SENTENCE_END.finditer(text, start, end) if match.end() < end]
+            if boundaries:
+                tokens = self.counter.count_many([text[boundaries[-1]:end]])[0]
+                if tokens <= self.overlap_tokens:
+                    return [(boundaries[-1], end, tokens)]
+        return []
+
+    def _pack(self, text, pieces):
+        """Groups consecutive pieces into (start, end) chunk spans within the token budget."""
+        spans, current, size = [], [], 0
+        for piece in pieces:
+            if current and size + piece[2] > self.chunk_tokens:
+                spans.append((current[0][0], current[-1][1]))
+                current = self._carry(text, current)
+                size = sum(carried[2] for carried in current)
+                if size + piece[2] > self.chunk_tokens:
+                    current, size = [], 0
+            current.append(piece)
+            size += piece[2]
+        if current:
+            spans.append((current[0][0], current[-1][1]))
+        return spans
+
+    def chunk_spans(self, text):
+        """
+        Returns:
+            list of (start, end, section) -> chunk spans of text and their heading path
+        """
+        if not self.structure:
+            return [(start, end, "") for start, end in self._pack(text, self._split(text, [(0, len(text))]))]
+
+        sections = _sections(text)
+        spans, pending, pending_tokens = [], [], 0
+        for number, (start, _) in enumerate(sections):
+            end = sections[number + 1][0] if number + 1 < len(sections) else len(text)
+            if pending_tokens >= self.min_tokens:
+                spans.extend(self._pack(text, pending))
+                pending, pending_tokens = [], 0
+            pieces = self._split(text, [(start, end)])
+            pending.extend(pieces)
+            pending_tokens += sum(piece[2] for piece in pieces)
+        spans.extend(self._pack(text, pending))
+
+        # A chunk belongs to the section it ends in, so a heading packed with its first subsection gets the subsection
+        starts = [start for start, _ in sections]
+        return [(start, end, sections[bisect.bisect_left(starts, end) - 1][1]) for start, end in spans]
+
+    def split_documents(self, docs):
+        chunks = []
+        for doc in docs:
+            text = doc.page_content
+            for start, end, section in self.chunk_spans(text):
+                content = text[start:end]
+                stripped = content.strip()
+                if not stripped:
+                    continue
+                metadata = {**doc.metadata, "start_index": start + len(content) - len(content.lstrip())}
+                if section:
+                    metadata["section"] = section
+                chunks.append(Document(page_content=stripped, metadata=metadata))
+        return chunks
+
+
+class RecursiveChunker:
+    """The original fixed splitter: 1000 characters with 200 characters of overlap."""
+
+    def __init__(self, chunk_size=1000, chunk_overlap=200):
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+        self.splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True)
+
+    def split_documents(self, docs):
+        return self.splitter.split_documents(docs)
+
+
+def create_token_counter(tokenizer=None):
+    """
+        CHUNK_TOKENIZER -> "model" (the embedding model's tokenizer, needs `transformers`)
+                           or "approx" (an estimate, no download) (default: "model").
+    """
+    tokenizer = (tokenizer or os.getenv("CHUNK_TOKENIZER", "model")).lower()
+    if tokenizer == "approx":
+        return ApproxTokenCounter()
+    if tokenizer != "model":
+        raise ValueError(f"Unknown CHUNK_TOKENIZER '{tokenizer}', expected model or approx")
+    return ModelTokenCounter()
+
+
+def create_chunker(strategy=None, overlap=None, tokenizer=None):
+    """
+    Creates the document chunker from the environment.
+
+        CHUNK_STRATEGY -> "structure" (token-sized, breaks at headings), "token" (token-sized)
+                          or "recursive" (the original 1000/200-character splitter) (default: "structure").
+        CHUNK_TOKENS -> int: max tokens per chunk; all-MiniLM-L6-v2 reads at most 256 (default: 250).
+        CHUNK_MIN_TOKENS -> int: smaller sections are packed with the next one (default: 50).
+        CHUNK_OVERLAP -> "sentence", "tokens" or "none" (default: "sentence").
+        CHUNK_OVERLAP_TOKENS -> int: max tokens repeated from the previous chunk (default: 40).
+        CHUNK_TOKENIZER -> see create_token_counter.
+
+    Args:
+        strategy, overlap, tokenizer -> str or None: override the environment
+
+    Returns:
+        Chunker or RecursiveChunker
+    """
+    strategy = (strategy or os.getenv("CHUNK_STRATEGY", "structure")).lower()
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown CHUNK_STRATEGY '{strategy}', expected one of: {', '.join(STRATEGIES)}")
+    if strategy == "recursive":
+        return RecursiveChunker()
+
+    return Chunker(
+        create_token_counter(tokenizer),
+        chunk_tokens=int(os.getenv("CHUNK_TOKENS", "250")),
+        overlap=(overlap or os.getenv("CHUNK_OVERLAP", "sentence")).lower(),
+        overlap_tokens=int(os.getenv("CHUNK_OVERLAP_TOKENS", "40")),
+        structure=strategy == "structure",
+        min_tokens=int(os.getenv("CHUNK_MIN_TOKENS", "50")),
+    )
+
+
+def get_chunker():
+    """Returns this process's chunker, created from the environment on first use."""
+    global _chunker
+    if _chunker is None:
+        _chunker = create_chunker()
+    return _chunker
+
+
+def _chunk_in_worker(doc):
+    return get_chunker().split_documents([doc])
+
+
+def get_chunking_pool():
+    """
+    Returns the shared process pool that splits pages in parallel.
+
+        CHUNK_WORKERS -> int: Worker processes, 0 splits on the calling thread (default: 0).
+
+    Returns:
+        ProcessPoolExecutor or None when CHUNK_WORKERS is 0
+    """
+    global _chunking_pool
+    workers = int(os.getenv("CHUNK_WORKERS", "0"))
+    if workers <= 0:
+        return None
+
+    if _chunking_pool is None:
+        _chunking_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    return _chunking_pool
+
+
+def shutdown_chunking_pool():
+    """Stops the shared chunking pool, if one was started."""
+    global _chunking_pool
+    if _chunking_pool is not None:
+        _chunking_pool.shutdown(wait=True, cancel_futures=True)
+        _chunking_pool = None
+
+
+def iter_chunks(docs, pool=None, max_inflight=None):
+    """
+    Splits documents (pages) one at a time and yields their chunks in order.
+
+    With a pool, up to `max_inflight` pages (default: 2 x CHUNK_WORKERS)
+    are split in parallel while the next ones are read, so only those pages
+    are held in memory.
+
+    Args:
+        docs -> iterable of documents
+        pool -> ProcessPoolExecutor or None (default: split on the calling thread)
+
+    Yields:
+        chunk -> Document
+    """
+    if pool is None:
+        chunker = get_chunker()
+        for doc in docs:
+            yield from chunker.split_documents([doc])
+        return
+
+    max_inflight = max_inflight or 2 * int(os.getenv("CHUNK_WORKERS", "1"))
+    inflight = deque()
+    for doc in docs:
+        inflight.append(pool.submit(_chunk_in_worker, doc))
+        if len(inflight) >= max_inflight:
+            yield from inflight.popleft().result()
+    while inflight:
+        yield from inflight.popleft().result()
+
+
+def html_to_text(soup):
+    """
+    Extracts the readable text of a parsed HTML page with h1-h6 headings
+    kept as markdown heading lines ("## Installation"), so the structure
+    chunker can break at them. Scripts and styles are dropped.
+
+    Args:
+        soup -> BeautifulSoup document (modified in place)
+
+    Returns:
+        str
+    """
+    for tag in soup(["script", "style", "noscript"]):
+        tag.decompose()
+    for heading in soup.find_all(["h1", "h2", "h3", "h4", "h5", "h6"]):
+        title = heading.get_text(" ", strip=True)
+        if title:
+            heading.string = f"{'#' * int(heading.name[1])} {title}"
+    return soup.get_text("\n", strip=True)
@@ -0,0 +1,261 @@
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+from metrics import REGISTRY, TOKEN_BUCKETS
+
+
+class ApproxTokenCounter:
+    """
+    Estimates BPE tokens as words plus punctuation marks. Needs no download;
+    English prose is usually within 10-20% of the cl100k_base count.
+    """
+
+    _TOKEN = re.compile(r"\w+|[^\w\s]")
+
+    def count(self, text):
+        return len(self._TOKEN.findall(text))
+
+    def truncate(self, text, max_tokens):
+        if max_tokens <= 0:
+            return ""
+        for number, match in enumerate(self._TOKEN.finditer(text), start=1):
+            if number == max_tokens:
+                return text[:match.end()]
+        return text
+
+
+class TiktokenCounter:
+    """
+    Counts and truncates prompt tokens with a tiktoken BPE encoding.
+
+    The encoding is an approximation of the serving model's tokenizer, close
+    enough to budget a prompt and orders of magnitude faster than loading the
+    model's own tokenizer. It is loaded on first use; tiktoken downloads it
+    once, so on a host without network access or a tiktoken cache the counter
+    falls back to ApproxTokenCounter instead of failing every request.
+
+    Args:
+        encoding -> str: tiktoken encoding name
+    """
+
+    def __init__(self, encoding="cl100k_base"):
+        self.name = encoding
+        self._encoding = None
+        self._fallback = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._encoding is None and self._fallback is None:
+                try:
+                    import tiktoken
+                    self._encoding = tiktoken.get_encoding(self.name)
+                except Exception as e:
+                    print(f"Could not load tiktoken encoding '{self.name}', estimating context tokens instead: {e}")
+                    self._fallback = ApproxTokenCounter()
+
+    def count(self, text):
+        if self._encoding is None:
+            self._load()
+            if self._fallback is not None:
+                return self._fallback.count(text)
+        return len(self._encoding.encode_ordinary(text))
+
+    def truncate(self, text, max_tokens):
+        if self._encoding is None:
+            self._load()
+            if self._fallback is not None:
+                return self._fallback.truncate(text, max_tokens)
+        return self._encoding.decode(self._encoding.encode_ordinary(text)[:max_tokens])
+
+
+def _words(text):
+    return Counter(re.findall(r"\w+", text.lower()))
+
+
+def _cosine(a, b):
+    dot = sum(count * b[word] for word, count in a.items() if word in b)
+    norm = math.sqrt(sum(c * c for c in a.values())) * math.sqrt(sum(c * c for c in b.values()))
+    return dot / norm if norm else 0.0
+
+
+def _text_overlap(first, second, min_overlap, max_overlap):
+    """Length of the longest suffix of `first` that is also a prefix of `second`, or 0."""
+    for size in range(min(len(first), len(second), max_overlap), min_overlap - 1, -1):
+        if first.endswith(second[:size]):
+            return size
+    return 0
+
+
+class Passage:
+    """One or more chunks of the same source (and page) merged into a contiguous span."""
+
+    def __init__(self, doc):
+        self.source = doc.metadata.get("source")
+        self.page = doc.metadata.get("page")
+        self.text = doc.page_content
+        self.start = doc.metadata.get("start_index")
+        self.chunks = 1
+
+    def merge(self, doc, min_overlap, max_overlap):
+        """Absorbs `doc` if it overlaps or directly follows/precedes this passage; returns whether it did."""
+        if (doc.metadata.get("source"), doc.metadata.get("page")) != (self.source, self.page):
+            return False
+        text = doc.page_content
+        start = doc.metadata.get("start_index")
+
+        if self.start is not None and start is not None:
+            (first, first_start), (second, second_start) = sorted([(self.text, self.start), (text, start)], key=lambda span: span[1])
+            first_end = first_start + len(first)
+            # Chunks are stripped, so neighbours may be a couple of whitespace characters apart
+            if second_start > first_end + 2:
+                return False
+            if second_start + len(second) <= first_end:
+                self.text = first
+            elif second_start >= first_end:
+                self.text = first + " " + second
+            else:
+                self.text = first + second[first_end - second_start:]
+            self.start = first_start
+        elif text in self.text:
+            pass
+        elif self.text in text:
+            self.text = text
+        elif size := _text_overlap(self.text, text, min_overlap, max_overlap):
+            self.text = self.text + text[size:]
+        elif size := _text_overlap(text, self.text, min_overlap, max_overlap):
+            self.text = text + self.text[size:]
+        else:
+            return False
+
+        self.chunks += 1
+        return True
+
+
+class ContextBuilder:
+    """
+    Turns retrieved chunks into the prompt context within a token budget.
+
+    Chunks are reordered with maximal marginal relevance (relevance from the
+    retrieval rank, similarity from their word overlap) so near-duplicates
+    sink. Chunks of the same source that overlap or touch (the splitter's
+    chunk_overlap) are merged into one passage so repeated text is sent
+    once. Passages are then packed in order until `max_tokens`.
+
+    Args:
+        tokenizer -> object with count(text) and truncate(text, max_tokens), e.g. TiktokenCounter
+        max_tokens -> int: context budget in tokens
+        mmr_lambda -> float: 1 keeps the retrieval order, lower values favour diversity
+        min_overlap, max_overlap -> int: character range searched for overlapping text
+                                    when chunks carry no start_index
+        separator -> str: placed between passages
+    """
+
+    def __init__(self, tokenizer, max_tokens=3000, mmr_lambda=0.7, min_overlap=20, max_overlap=400, separator="\n\n"):
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        self.mmr_lambda = mmr_lambda
+        self.min_overlap = min_overlap
+        self.max_overlap = max_overlap
+        self.separator = separator
+
+        self.requests = 0
+        self.tokens_retrieved = 0
+        self.tokens_sent = 0
+        self._lock = threading.Lock()
+
+    def _mmr(self, documents):
+        vectors = [_words(doc.page_content) for doc in documents]
+        relevance = [1 - rank / len(documents) for rank in range(len(documents))]
+        similarity = [0.0] * len(documents)
+        remaining = list(range(len(documents)))
+        ordered = []
+        while remaining:
+            best = max(remaining, key=lambda i: self.mmr_lambda * relevance[i] - (1 - self.mmr_lambda) * similarity[i])
+            remaining.remove(best)
+            ordered.append(documents[best])
+            for i in remaining:
+                similarity[i] = max(similarity[i], _cosine(vectors[i], vectors[best]))
+        return ordered
+
+    def _passages(self, documents):
+        passages = []
+        for doc in documents:
+            if not any(passage.merge(doc, self.min_overlap, self.max_overlap) for passage in passages):
+                passages.append(Passage(doc))
+        return passages
+
+    def _pack(self, passages):
+        separator_tokens = self.tokenizer.count(self.separator)
+        parts, used = [], 0
+        for passage in passages:
+            tokens = self.tokenizer.count(passage.text) + (separator_tokens if parts else 0)
+            if used + tokens <= self.max_tokens:
+                parts.append(passage.text)
+                used += tokens
+            elif not parts:
+                parts.append(self.tokenizer.truncate(passage.text, self.max_tokens))
+                used = self.max_tokens
+        return self.separator.join(parts)
+
+    def build(self, documents):
+        """
+        Returns the context string for the retrieved documents, best first.
+
+        Args:
+            documents -> list of Document, in retrieval order
+        """
+        if not documents:
+            return ""
+
+        unique = list({doc.page_content: doc for doc in documents}.values())
+        context = self._pack(self._passages(self._mmr(unique)))
+
+        retrieved = self.tokenizer.count("\n\n".join(doc.page_content for doc in documents))
+        sent = self.tokenizer.count(context)
+        with self._lock:
+            self.requests += 1
+            self.tokens_retrieved += retrieved
+            self.tokens_sent += sent
+        REGISTRY.histogram("rag_context_tokens", "Context tokens per prompt.", TOKEN_BUCKETS, kind="retrieved").observe(retrieved)
+        REGISTRY.histogram("rag_context_tokens", "Context tokens per prompt.", TOKEN_BUCKETS, kind="sent").observe(sent)
+        print(f"Context: {sent} tokens from {len(documents)} chunks, saved {retrieved - sent} tokens.")
+        return context
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "max_tokens": self.max_tokens,
+                "tokens_retrieved": self.tokens_retrieved,
+                "tokens_sent": self.tokens_sent,
+                "tokens_saved": self.tokens_retrieved - self.tokens_sent,
+                "saved_ratio": round(1 - self.tokens_sent / self.tokens_retrieved, 4) if self.tokens_retrieved else 0.0,
+            }
+
+
+def create_context_builder():
+    """
+    Creates the prompt context builder from the environment.
+
+        CONTEXT_BUILDER -> "true" or "false"; false joins the chunks as they are (default: "true").
+        CONTEXT_MAX_TOKENS -> int: token budget for the context (default: 3000).
+        CONTEXT_MMR_LAMBDA -> float: relevance vs. diversity trade-off, 0-1 (default: 0.7).
+        CONTEXT_TOKENIZER -> str: tiktoken encoding used to count tokens, or "approx" to estimate
+                             them without tiktoken (default: "cl100k_base").
+
+    Returns:
+        ContextBuilder, or None when disabled
+    """
+    if os.getenv("CONTEXT_BUILDER", "true").lower() != "true":
+        return None
+
+    tokenizer = os.getenv("CONTEXT_TOKENIZER", "cl100k_base")
+    return ContextBuilder(
+        ApproxTokenCounter() if tokenizer.lower() == "approx" else TiktokenCounter(tokenizer),
+        max_tokens=int(os.getenv("CONTEXT_MAX_TOKENS", "3000")),
+        mmr_lambda=float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7")),
+    )
@@ -0,0 +1,300 @@
+import asyncio
+import json
+import os
+import queue
+import threading
+import time
+from urllib.parse import urljoin, urldefrag, urlparse
+from xml.etree import ElementTree
+
+import httpx
+from bs4 import BeautifulSoup
+from langchain_core.documents import Document
+
+from chunking import html_to_text
+
+
+class Page:
+    """
+    Result of fetching one URL.
+
+    Attributes:
+        url -> str: the fetched url
+        status -> "fetched", "unchanged" (304) or "failed"
+        document -> Document with the page text, only when fetched
+        error -> str, only when failed
+        validators -> dict with the page's etag, last_modified and links, only when fetched;
+                      the consumer records them with ValidatorCache.put once the page is stored
+    """
+
+    def __init__(self, url, status, document=None, error=None, validators=None):
+        self.url = url
+        self.status = status
+        self.document = document
+        self.error = error
+        self.validators = validators
+
+
+class ValidatorCache:
+    """
+    Persists ETag / Last-Modified validators and outgoing links per URL so
+    re-crawls can send conditional GETs and still follow links of pages that
+    answered 304 Not Modified.
+
+    Args:
+        path -> str or None: JSON file to load from and save to (None keeps it in memory).
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._entries = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self._entries = json.load(f)
+
+    def get(self, url):
+        with self._lock:
+            return self._entries.get(url)
+
+    def put(self, url, etag, last_modified, links):
+        """Records a page's validators; call it only once the page was ingested, or a re-crawl skips it."""
+        with self._lock:
+            self._entries[url] = {"etag": etag, "last_modified": last_modified, "links": links}
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump(self._entries, f)
+            os.replace(temp_path, self.path)
+
+
+class HostRateLimiter:
+    """Spaces requests to the same host at least 1 / requests_per_second apart."""
+
+    def __init__(self, requests_per_second):
+        self.interval = 1 / requests_per_second if requests_per_second > 0 else 0
+        self._next_allowed = {}
+        self._locks = {}
+
+    async def wait(self, url):
+        if not self.interval:
+            return
+        host = urlparse(url).netloc
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            now = time.monotonic()
+            delay = self._next_allowed.get(host, now) - now
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next_allowed[host] = max(now, self._next_allowed.get(host, now)) + self.interval
+
+
+def parse_html(url, html):
+    """
+    Extracts the readable text (headings kept as markdown heading lines) and
+    outgoing http(s) links of an HTML page.
+
+    Returns:
+        (document, links) -> Document with source/title metadata, list of absolute urls
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    links = []
+    for anchor in soup.find_all("a", href=True):
+        link = urldefrag(urljoin(url, anchor["href"]))[0]
+        if urlparse(link).scheme in ("http", "https"):
+            links.append(link)
+
+    title = soup.title.get_text(strip=True) if soup.title else ""
+    document = Document(page_content=html_to_text(soup), metadata={"source": url, "title": title})
+    return document, list(dict.fromkeys(links))
+
+
+def parse_sitemap(xml):
+    """
+    Returns (page_urls, nested_sitemap_urls) listed in a sitemap or sitemap index.
+    """
+    root = ElementTree.fromstring(xml)
+    urls = [element.text.strip() for element in root.iter() if element.tag.split("}")[-1] == "loc"]
+    if root.tag.split("}")[-1] == "sitemapindex":
+        return [], urls
+    return urls, []
+
+
+def create_crawl_client():
+    """
+    Creates the pooled async HTTP client used for crawling.
+
+        CRAWL_MAX_CONNECTIONS -> int: Maximum open connections (default: 20).
+        CRAWL_TIMEOUT -> float: Request timeout in seconds (default: 20).
+        USER_AGENT -> str: User-Agent header (default: "generic-rag-bot").
+    """
+    return httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=int(os.getenv("CRAWL_MAX_CONNECTIONS", "20"))),
+        timeout=float(os.getenv("CRAWL_TIMEOUT", "20")),
+        follow_redirects=True,
+        headers={"User-Agent": os.getenv("USER_AGENT", "generic-rag-bot")},
+    )
+
+
+async def crawl(seeds, sitemap=None, max_depth=1, max_pages=100, same_host=True,
+                concurrency=8, requests_per_second=2.0, validators=None, client=None):
+    """
+    Crawls breadth-first from the seed urls (and the urls listed in a sitemap),
+    fetching concurrently over one pooled client.
+
+    Args:
+        seeds -> list of urls to start from
+        sitemap -> str or None: sitemap or sitemap index url whose pages are added as seeds
+        max_depth -> int: how many links away from a seed to follow (0 fetches only the seeds)
+        max_pages -> int: stop after this many pages were requested
+        same_host -> bool: only follow links to the host of the page they were found on
+        concurrency -> int: concurrent requests
+        requests_per_second -> float: per-host rate limit
+        validators -> ValidatorCache read for conditional GETs (default: in-memory). Fetched pages
+                      carry their new validators; the caller records them after storing the page
+        client -> httpx.AsyncClient (default: a new pooled client)
+
+    Yields:
+        page -> Page, in completion order
+    """
+    validators = validators or ValidatorCache()
+    limiter = HostRateLimiter(requests_per_second)
+    own_client = client is None
+    client = client or create_crawl_client()
+
+    frontier = asyncio.Queue()
+    results = asyncio.Queue(maxsize=concurrency * 2)
+    seen = set()
+
+    def enqueue(url, depth):
+        if url not in seen and len(seen) < max_pages:
+            seen.add(url)
+            frontier.put_nowait((url, depth))
+
+    async def fetch(url, depth):
+        headers = {}
+        cached = validators.get(url)
+        if cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        await limiter.wait(url)
+        response = await client.get(url, headers=headers)
+
+        if response.status_code == 304 and cached:
+            links, page = cached.get("links", []), Page(url, "unchanged")
+        else:
+            response.raise_for_status()
+            document, links = parse_html(str(response.url), response.text)
+            page = Page(url, "fetched", document, validators={
+                "etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified"), "links": links,
+            })
+
+        if depth < max_depth:
+            host = urlparse(url).netloc
+            for link in links:
+                if not same_host or urlparse(link).netloc == host:
+                    enqueue(link, depth + 1)
+        return page
+
+    async def worker():
+        while True:
+            url, depth = await frontier.get()
+            try:
+                page = await fetch(url, depth)
+            except Exception as e:
+                page = Page(url, "failed", error=str(e))
+            await results.put(page)
+            frontier.task_done()
+
+    try:
+        if sitemap:
+            pending = [sitemap]
+            while pending:
+                response = await client.get(pending.pop())
+                response.raise_for_status()
+                pages, nested = parse_sitemap(response.content)
+                pending.extend(nested)
+                seeds = list(seeds) + pages
+
+        for url in seeds:
+            enqueue(url, 0)
+
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        done = asyncio.create_task(frontier.join())
+        try:
+            while not (done.done() and results.empty()):
+                getter = asyncio.create_task(results.get())
+                finished, _ = await asyncio.wait({getter, done}, return_when=asyncio.FIRST_COMPLETED)
+                if getter in finished:
+                    yield getter.result()
+                else:
+                    getter.cancel()
+        finally:
+            for task in workers + [done]:
+                task.cancel()
+    finally:
+        if own_client:
+            await client.aclose()
+
+
+def iter_crawl(buffer_size=16, **kwargs):
+    """
+    Runs `crawl` on a background event loop and yields its pages synchronously,
+    so ingestion workers can consume pages while later ones are still being
+    fetched. At most `buffer_size` pages wait to be consumed.
+
+    Args:
+        buffer_size -> int: pages buffered between the crawler and the consumer
+        **kwargs -> passed to crawl
+
+    Yields:
+        page -> Page
+    """
+    pages = queue.Queue(maxsize=buffer_size)
+    stop = threading.Event()
+    finished = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    async def produce():
+        try:
+            async for page in crawl(**kwargs):
+                await asyncio.to_thread(put, page)
+                if stop.is_set():
+                    break
+        except Exception as e:
+            put(e)
+        finally:
+            put(finished)
+
+    threading.Thread(target=asyncio.run, args=(produce(),), name="crawler", daemon=True).start()
+    try:
+        while (item := pages.get()) is not finished:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+def create_validator_cache():
+    """
+    Loads the conditional-GET validator cache.
+
+        CRAWL_CACHE_PATH -> str: JSON file for ETag/Last-Modified validators (default: "./crawl_cache/validators.json").
+    """
+    return ValidatorCache(os.getenv("CRAWL_CACHE_PATH", "./crawl_cache/validators.json"))
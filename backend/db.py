@@ -1,117 +1,569 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, AsyncMongoClient
+from langchain_core.documents import Document
 from pymongo.operations import SearchIndexModel
 from langchain_mongodb import MongoDBAtlasVectorSearch
-from uuid import uuid4
-from langchain_community.document_loaders import WebBaseLoader
-from models import create_hugging_face_embedding_model
+from pymongo.errors import BulkWriteError
+from models import create_hugging_face_embedding_model, warm_up_embedding_model
+from embeddings import create_embedding_service
+from embed_server import create_remote_embeddings
+from ingest import run_ingestion, get_embedding_pool
+from crawler import iter_crawl, create_validator_cache
+from chunking import html_to_text
+from dedup import diff_chunks, fingerprint_documents, fingerprint_stream, fingerprint_bytes, MemoryManifestStore, JsonManifestStore, MongoManifestStore
+from vectorstores import LocalVectorStore, create_local_vectorstore
+from startup import StartupState
+from quantization import encode_vector, rescore, get_vector_storage_config
+from filters import get_filter_fields, matches, to_mongo
+from tracing import annotate, span, traced
+from concurrent.futures import ThreadPoolExecutor
+import threading
 import utils
 import os
 import certifi
 import time
 
-def initialize_db():
+def load_embedding_service(startup):
     """
-    Initializes and returns a Chroma vector store.
+    Loads the embedding model, runs a warm-up pass and wraps it in the batching service.
+
+    With EMBED_SERVER set, connects to the shared embedding server instead,
+    which already batches queries from every worker (see embed_server.py).
+    """
+    if os.getenv("EMBED_SERVER"):
+        with startup.phase("embedding_server_connect", component="embedding_model"):
+            return create_remote_embeddings()
+    with startup.phase("embedding_model_load", component="embedding_model"):
+        model = create_hugging_face_embedding_model()
+    with startup.phase("embedding_warmup"):
+        warm_up_embedding_model(model)
+    return create_embedding_service(model)
+
+def initialize_db(startup=None):
+    """
+    Initializes and returns the vector store selected by VECTOR_STORE.
+
+    The embedding model loads on a second thread while the database
+    connection is established. On Atlas, the vector search index is
+    created and awaited in the background (see start_search_index_check).
+
+        VECTOR_STORE -> "atlas" (MongoDB Atlas Vector Search) or "local" (in-process index on disk) (default: "atlas").
 
     Args:
-        persist_directory - Directory to store ChromaDB.
-    
+        startup -> StartupState recording phase timings and component status (default: a new one).
+
     Returns:
-        vectorstore - Initialized Chroma vector store.
+        vectorstore - Initialized vector store.
     """
-    # initialize MongoDB python client
-    MONGODB_URI = os.getenv("MONGO_API_KEY")
-    if not MONGODB_URI:
-        raise ValueError("MONGODB_URI is not set. Make sure to set it in the environment.")
-    
-    try:
-        # Create MongoDB client
-        mongo_client= MongoClient(MONGODB_URI)
-        print("MongoDB connection established successfully.")
-    except Exception as e:
-        print(f"Error connecting to MongoDB: {e}")
-        return None
+    startup = startup or StartupState()
 
-    DB_NAME = os.getenv("MONGO_DB_NAME")
-    COLLECTION_NAME = os.getenv("MONGO_COLLECTION_NAME")
-    ATLAS_VECTOR_SEARCH_INDEX_NAME = os.getenv("MONGO_ATLAS_VECTOR_SEARCH_INDEX_NAME")
-
-    MONGODB_COLLECTION = mongo_client[DB_NAME][COLLECTION_NAME]
-    # Initialize the Chroma vector store
-    vectorstore = MongoDBAtlasVectorSearch(
-        collection=MONGODB_COLLECTION,
-        embedding=create_hugging_face_embedding_model(),
-        index_name=ATLAS_VECTOR_SEARCH_INDEX_NAME,
-        relevance_score_fn="cosine",
-    )
-    # Check if the search index already exists
-    message = ensure_vector_search_index(mongo_client, DB_NAME, COLLECTION_NAME,ATLAS_VECTOR_SEARCH_INDEX_NAME)
-    print(message)
-    
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-loader") as loader:
+        embedding = loader.submit(load_embedding_service, startup)
+
+        if os.getenv("VECTOR_STORE", "atlas").lower() == "local":
+            with startup.phase("local_store_open", component="db"):
+                vectorstore = create_local_vectorstore(None)
+            vectorstore.embeddings = embedding.result()
+            print(f"Local vector store opened at '{vectorstore.path}' with {len(vectorstore)} documents.")
+            return vectorstore
+
+        # initialize MongoDB python client
+        MONGODB_URI = os.getenv("MONGO_API_KEY")
+        if not MONGODB_URI:
+            raise ValueError("MONGODB_URI is not set. Make sure to set it in the environment.")
+
+        try:
+            # MongoClient connects lazily; ping so the handshake happens now, alongside the model load
+            with startup.phase("mongo_connect", component="db"):
+                mongo_client = MongoClient(MONGODB_URI)
+                mongo_client.admin.command("ping")
+            print("MongoDB connection established successfully.")
+        except Exception as e:
+            print(f"Error connecting to MongoDB: {e}")
+            return None
+
+        DB_NAME = os.getenv("MONGO_DB_NAME")
+        COLLECTION_NAME = os.getenv("MONGO_COLLECTION_NAME")
+        ATLAS_VECTOR_SEARCH_INDEX_NAME = os.getenv("MONGO_ATLAS_VECTOR_SEARCH_INDEX_NAME")
+
+        MONGODB_COLLECTION = mongo_client[DB_NAME][COLLECTION_NAME]
+        vectorstore = MongoDBAtlasVectorSearch(
+            collection=MONGODB_COLLECTION,
+            embedding=embedding.result(),
+            index_name=ATLAS_VECTOR_SEARCH_INDEX_NAME,
+            relevance_score_fn="cosine",
+        )
+
+    start_search_index_check(mongo_client, DB_NAME, COLLECTION_NAME, ATLAS_VECTOR_SEARCH_INDEX_NAME, startup)
     return vectorstore
 
+def start_search_index_check(mongo_client, db_name, collection_name, index_name, startup):
+    """
+    Ensures the vector search index on a background thread, so startup does
+    not wait for Atlas to build it. The "search_index" component becomes
+    ready, failed, or "timeout" after INDEX_READY_TIMEOUT seconds (default: 300).
+    """
+    startup.require("search_index")
+    timeout = float(os.getenv("INDEX_READY_TIMEOUT", "300"))
+    quantization = get_vector_storage_config().quantization
+
+    def check():
+        with startup.phase("search_index"):
+            try:
+                startup.set("search_index", "loading")
+                print(ensure_vector_search_index(
+                    mongo_client, db_name, collection_name, index_name, quantization=quantization, timeout=timeout,
+                    filter_fields=get_filter_fields(),
+                ))
+                startup.set("search_index", "ready")
+            except TimeoutError as e:
+                print(f"{e} Serving anyway; vector search returns no results until it is ready.")
+                startup.set("search_index", "timeout", e)
+            except Exception as e:
+                print(f"Error ensuring search index '{index_name}': {e}")
+                startup.set("search_index", "failed", e)
+
+    threading.Thread(target=check, name="search-index-check", daemon=True).start()
+
 #### INDEXING ####
-def store_pdf_in_db(uploaded_file, file_content,vectorstore):
+_ingest_listeners = []
+
+def register_ingest_listener(callback):
     """
-    Stores it in a local ChromaDB.
+    Registers a callback invoked after new documents are stored.
 
     Args:
-        uploaded_file -> file for RAG ingestion pipeline
-        vectorstore ->  Instance of vector store        
+        callback -> callable(ids, documents)
+    """
+    _ingest_listeners.append(callback)
+
+def _notify_ingest(ids, documents):
+    for callback in _ingest_listeners:
+        callback(ids, documents)
+
+_delete_listeners = []
+
+def register_delete_listener(callback):
+    """
+    Registers a callback invoked after stale documents are removed.
+
+    Args:
+        callback -> callable(ids)
+    """
+    _delete_listeners.append(callback)
+
+def _notify_delete(ids):
+    for callback in _delete_listeners:
+        callback(ids)
+
+_manifest_stores = {}
+
+def get_manifest_store(vectorstore):
+    """
+    Returns the store of per-source manifests (document fingerprint + chunk ids)
+    for this vector store. Atlas keeps them in a `<collection>_manifest`
+    collection next to the vectors, the local store in a JSON file in its
+    directory, and other stores in memory.
+    """
+    key = id(vectorstore)
+    if key not in _manifest_stores:
+        if isinstance(vectorstore, MongoDBAtlasVectorSearch):
+            collection = vectorstore.collection
+            _manifest_stores[key] = MongoManifestStore(collection.database[f"{collection.name}_manifest"])
+        elif isinstance(vectorstore, LocalVectorStore):
+            _manifest_stores[key] = JsonManifestStore(os.path.join(vectorstore.path, "manifests.json"))
+        else:
+            _manifest_stores[key] = MemoryManifestStore()
+    return _manifest_stores[key]
+
+def add_embedded_documents(vectorstore, documents, vectors, ids):
+    """
+    Bulk-inserts documents whose embeddings were already computed.
+
+    Args:
+        vectorstore -> Instance of vector store
+        documents -> list of Document chunks
+        vectors -> list of embeddings, one per document
+        ids -> list of str ids, one per document
+    """
+    if hasattr(vectorstore, "add_embeddings"):
+        vectorstore.add_embeddings(documents, vectors, ids)
+    elif isinstance(vectorstore, MongoDBAtlasVectorSearch):
+        storage = get_vector_storage_config().storage
+        try:
+            vectorstore.collection.insert_many([
+                {"_id": id, "text": doc.page_content, "embedding": encode_vector(vector, storage), **doc.metadata}
+                for id, doc, vector in zip(ids, documents, vectors)
+            ], ordered=False)
+        except BulkWriteError as e:
+            # Content-hash ids make re-inserting an existing chunk a no-op
+            if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                raise
+    else:
+        vectorstore.add_documents(documents=documents, ids=ids)
+
+@traced("store_splits")
+def store_splits_in_db(splits, vectorstore, source, fingerprint, on_progress=None, tenant=None):
+    """
+    Embeds and stores a stream of chunks from one source in fixed-size batches,
+    re-embedding only what changed since the source was last ingested.
+
+    Chunks get content-hash ids. If the source fingerprint matches the stored
+    manifest, nothing is embedded at all; otherwise only chunks that were not
+    in the previous version are embedded, and chunks that disappeared are
+    deleted once the new version is stored.
+
+    Every chunk is tagged with its `source` and, when given, its `tenant`, so
+    queries can pre-filter on them. Sources are tracked per tenant: two
+    tenants ingesting the same file get separate chunks and manifests.
+    Chunks stored without a tenant have no `tenant` field, so only queries
+    without a tenant retrieve them.
+
+    Args:
+        splits -> iterable of Document chunks
+        vectorstore ->  Instance of vector store
+        source -> str: file name or url the chunks come from
+        fingerprint -> str: hash of the whole source document
+        on_progress -> callable(stats) called after every stored batch (default: None)
+        tenant -> str or None: tenant the source belongs to (default: None, untagged: never returned to tenant queries)
 
     Returns:
-        vectorstore -> Instance of vector store        
+        stats -> dict with chunk/batch counts, embeddings saved and seconds spent per stage
     """
+    manifests = get_manifest_store(vectorstore)
+    key = f"{tenant}:{source}" if tenant is not None else source
+    previous = manifests.get(key)
+
+    if previous is not None and previous["fingerprint"] == fingerprint:
+        saved = len(previous["chunk_ids"])
+        print(f"Skipped unchanged source '{source}', saved {saved} embedding calls.")
+        annotate(skipped=True, chunks=saved)
+        return {"skipped": True, "chunks_total": saved, "embeddings_saved": saved}
 
-    splits = utils.process_pdf_for_rag(uploaded_file, file_content)
+    previous_ids = set(previous["chunk_ids"]) if previous is not None else set()
+    diff = {}
 
-    uuids = [str(uuid4()) for _ in range(len(splits))]
+    def tagged(splits):
+        for doc in splits:
+            doc.metadata.setdefault("source", source)
+            if tenant is not None:
+                doc.metadata["tenant"] = tenant
+            yield doc
 
-    # Embed and store in local ChromaDB
-    vectorstore.add_documents(documents=splits, ids=uuids)
+    def insert(documents, vectors):
+        ids = [doc.id for doc in documents]
+        add_embedded_documents(vectorstore, documents, vectors, ids)
+        _notify_ingest(ids, documents)
 
-def store_url_in_db(vector_store,request):
+    def report(stats):
+        if on_progress is not None:
+            on_progress({**stats, **{key: value for key, value in diff.items() if not key.startswith("_")}})
+
+    stats = run_ingestion(
+        diff_chunks(tagged(splits), key, previous_ids, diff), vectorstore, insert,
+        embed_pool=get_embedding_pool(), on_progress=report,
+    )
+
+    current_ids = list(diff.pop("_chunk_ids"))
+    stale_ids = list(previous_ids.difference(current_ids))
+    if stale_ids:
+        vectorstore.delete(ids=stale_ids)
+        _notify_delete(stale_ids)
+    manifests.put(key, fingerprint, current_ids)
+
+    stats.update(diff)
+    stats["skipped"] = False
+    stats["chunks_deleted"] = len(stale_ids)
+    stats["embeddings_saved"] = diff["chunks_unchanged"] + diff["chunks_duplicate"]
+    annotate(chunks=stats["chunks_embedded"], batches=stats["batches"], embeddings_saved=stats["embeddings_saved"])
+    print(f"Ingested '{source}': embedded {stats['chunks_embedded']} chunks, saved {stats['embeddings_saved']} embedding calls, removed {len(stale_ids)} stale chunks.")
+    return stats
+
+@traced("store_pdf")
+def store_pdf_in_db(uploaded_file, file_content,vectorstore, on_progress=None, tenant=None):
     """
     Stores it in a local ChromaDB.
 
     Args:
         uploaded_file -> file for RAG ingestion pipeline
+        file_content -> bytes or seekable binary stream with the PDF data
         vectorstore ->  Instance of vector store        
+        on_progress -> callable(stats) called after every stored batch (default: None)
+        tenant -> str or None: tenant the document belongs to (default: None, untagged: never returned to tenant queries)
 
     Returns:
-        vectorstore -> Instance of vector store        
+        stats -> dict with chunk/batch counts and seconds spent per stage
     """
+    if isinstance(file_content, (bytes, bytearray)):
+        fingerprint = fingerprint_bytes(file_content)
+    else:
+        fingerprint = fingerprint_stream(file_content)
 
-     # Load webpage content
-    loader = WebBaseLoader(request.url)
-    docs = loader.load()
+    pages = utils.iter_pdf_pages(file_content, uploaded_file.filename)
 
-    splits = utils.doc_splitter(docs)
+    # Embed and store page by page in bounded batches
+    return store_splits_in_db(utils.iter_splits(pages), vectorstore, uploaded_file.filename, fingerprint, on_progress, tenant)
 
-    uuids = [str(uuid4()) for _ in range(len(splits))]
+@traced("store_url")
+def store_url_in_db(vector_store,request, on_progress=None):
+    """
+    Stores it in a local ChromaDB.
+
+    Args:
+        vector_store ->  Instance of vector store        
+        request -> WebURLRequest with the url to ingest and optional tenant
+        on_progress -> callable(stats) called after every stored batch (default: None)
+
+    Returns:
+        stats -> dict with chunk/batch counts and seconds spent per stage
+    """
+
+    # Imported on first use: langchain_community is slow to import
+    from langchain_community.document_loaders import WebBaseLoader
+
+     # Load webpage content
+    start = time.perf_counter()
+    with span("load_url"):
+        soup = WebBaseLoader(request.url).scrape()
+        title = soup.title.get_text(strip=True) if soup.title else ""
+        docs = [Document(page_content=html_to_text(soup), metadata={"source": request.url, "title": title})]
+    load_seconds = time.perf_counter() - start
+
+    def report(stats):
+        if on_progress is not None:
+            on_progress({"load_seconds": load_seconds, **stats})
 
     # Store documents in ChromaDB
-    vector_store.add_documents(documents=splits, ids=uuids)
+    stats = store_splits_in_db(utils.iter_splits(docs), vector_store, request.url, fingerprint_documents(docs), report, request.tenant)
+    return {"load_seconds": load_seconds, **stats}
+
+@traced("store_crawl")
+def store_crawl_in_db(vector_store, request, on_progress=None):
+    """
+    Crawls a list of urls and/or a sitemap and stores every page as its own source.
+
+    Pages are fetched concurrently on a background event loop and streamed
+    into the split/embed/store stages as they arrive. Pages that answer
+    304 Not Modified to a conditional GET are skipped without being parsed.
+
+    Args:
+        vector_store ->  Instance of vector store
+        request -> CrawlRequest with urls, sitemap, crawl limits and optional tenant
+        on_progress -> callable(stats) called after every page and stored batch (default: None)
+
+    Returns:
+        stats -> dict with page counts, summed chunk counts and seconds spent per stage
+    """
+    validators = create_validator_cache()
+    totals = {"pages_fetched": 0, "pages_unchanged": 0, "pages_failed": 0}
+    start = time.perf_counter()
+
+    def merged(stats):
+        combined = dict(totals)
+        for key, value in stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                combined[key] = combined.get(key, 0) + value
+        return combined
+
+    def report(stats):
+        if on_progress is not None:
+            on_progress(merged(stats))
+
+    pages = iter_crawl(
+        seeds=request.urls,
+        sitemap=request.sitemap,
+        max_depth=request.max_depth,
+        max_pages=request.max_pages,
+        same_host=request.same_host,
+        concurrency=int(os.getenv("CRAWL_CONCURRENCY", "8")),
+        requests_per_second=float(os.getenv("CRAWL_REQUESTS_PER_SECOND", "2")),
+        validators=validators,
+    )
+
+    try:
+        for page in pages:
+            if page.status == "failed":
+                print(f"Failed to fetch {page.url}: {page.error}")
+                totals["pages_failed"] += 1
+            elif page.status == "unchanged":
+                totals["pages_unchanged"] += 1
+            else:
+                totals["pages_fetched"] += 1
+                docs = [page.document]
+                stats = store_splits_in_db(
+                    utils.iter_splits(docs), vector_store, page.url, fingerprint_documents(docs), report, request.tenant
+                )
+                # Only a stored page may answer 304 on the next crawl; failed and unconsumed pages are fetched again
+                validators.put(page.url, **page.validators)
+                totals.update(merged(stats))
+            report({})
+    finally:
+        validators.save()
+
+    totals["crawl_seconds"] = time.perf_counter() - start
+    return totals
 
 #### RETRIEVAL ####
-def retrieve_from_db(query, vectorstore):
+@traced("vector_search")
+def retrieve_from_db(query, vectorstore, query_vector=None, k=4, filters=None):
     """
-    Retrieves the most relevant documents from the Chroma vector store
+    Retrieves the most relevant documents from the vector store
     based on the user's query.
 
     Args:
         query -> The query string for searching the vector store.
-        vectorstore -> The Chroma vector store instance for document retrieval.
+        vectorstore -> The vector store instance for document retrieval.
+        query_vector -> list[float] or None: Precomputed query embedding (default: embed the query).
+        k -> int: Number of documents to return (default: 4).
+        filters -> dict or None: Normalized filters (see filters.normalize_filters), applied
+                   before the nearest-neighbour search rather than to its results (default: None).
 
     Returns:
-        documents - The most relevant documents retrieved from Chroma.
+        documents - The most relevant documents retrieved.
     """
-    retriever = vectorstore.as_retriever()
+    if filters:
+        annotate(filtered=True)
+        if query_vector is None:
+            query_vector = vectorstore.embeddings.embed_query(query)
+
+    if query_vector is not None and isinstance(vectorstore, MongoDBAtlasVectorSearch):
+        config = get_vector_storage_config()
+        results = list(vectorstore.collection.aggregate(_vector_search_pipeline(query_vector, k, config, filters)))
+        annotate(backend="atlas", candidates=len(results))
+        return _vector_search_documents(results, query_vector, k, config)
+
+    if query_vector is not None:
+        return vectorstore.similarity_search_by_vector(query_vector, k=k, **_filter_kwargs(vectorstore, filters))
+
+    retriever = vectorstore.as_retriever(search_kwargs={"k": k})
     results =retriever.invoke(query)
 
     return results
 
-def ensure_vector_search_index(mongo_client, db_name, collection_name, index_name, path="embedding", dimensions=384):
+def _vector_search_pipeline(query_vector, k, config, filters=None):
+    """
+    Builds the $vectorSearch aggregation. With a quantized index over float
+    storage, k * rescore_factor candidates are returned with their stored
+    vectors so they can be rescored locally. Filters become the stage's
+    `filter`, so Atlas only walks the graph over matching chunks.
+    """
+    limit = k * config.rescore_factor if config.rescoring else k
+    search = {
+        "index": os.getenv("MONGO_ATLAS_VECTOR_SEARCH_INDEX_NAME"),
+        "path": "embedding",
+        "queryVector": encode_vector(query_vector, config.storage),
+        "numCandidates": limit * 10,
+        "limit": limit,
+    }
+    if filters:
+        search["filter"] = to_mongo(filters)
+    return [
+        {"$vectorSearch": search},
+        {"$set": {"score": {"$meta": "vectorSearchScore"}}},
+    ] + ([] if config.rescoring else [{"$project": {"embedding": 0}}])
+
+def _filter_kwargs(vectorstore, filters):
+    """Passes normalized filters to a vector store's own search in the form it understands."""
+    if not filters:
+        return {}
+    if isinstance(vectorstore, LocalVectorStore):
+        return {"filter": filters}
+    if isinstance(vectorstore, MongoDBAtlasVectorSearch):
+        return {"pre_filter": to_mongo(filters)}
+    # InMemoryVectorStore takes a predicate over documents
+    return {"filter": lambda doc: matches(doc.metadata, filters)}
+
+def _vector_search_documents(results, query_vector, k, config):
+    if config.rescoring:
+        results = rescore(query_vector, results, k)
+    documents = []
+    for result in results:
+        result["_id"] = str(result["_id"])
+        documents.append(Document(page_content=result.pop("text"), metadata=result))
+    return documents
+
+def stored_document_ids(vectorstore):
+    """Returns the ids of every chunk in the vector store, reading only the ids on Atlas."""
+    if isinstance(vectorstore, MongoDBAtlasVectorSearch):
+        return {str(record["_id"]) for record in vectorstore.collection.find({}, {"_id": 1})}
+    if isinstance(vectorstore, LocalVectorStore):
+        return {doc.id for doc in vectorstore.iter_documents()}
+    if hasattr(vectorstore, "store"):
+        # InMemoryVectorStore
+        return set(vectorstore.store)
+    return set()
+
+def iter_stored_documents(vectorstore):
+    """
+    Yields every chunk in the vector store without its embedding.
+
+    Yields:
+        (id, document) -> str id and Document with `id` set
+    """
+    if isinstance(vectorstore, MongoDBAtlasVectorSearch):
+        for record in vectorstore.collection.find({}, {"embedding": 0}):
+            id = str(record.pop("_id"))
+            yield id, Document(id=id, page_content=record.pop("text", ""), metadata=record)
+    elif isinstance(vectorstore, LocalVectorStore):
+        for doc in vectorstore.iter_documents():
+            yield doc.id, doc
+    elif hasattr(vectorstore, "store"):
+        # InMemoryVectorStore
+        for id, record in list(vectorstore.store.items()):
+            yield id, Document(id=id, page_content=record["text"], metadata=record["metadata"])
+
+def initialize_async_collection():
+    """
+    Creates an async MongoDB collection handle for non-blocking $vectorSearch.
+
+    Returns:
+        collection -> AsyncCollection, or None when MONGO_API_KEY is not set or VECTOR_STORE is "local"
+    """
+    MONGODB_URI = os.getenv("MONGO_API_KEY")
+    if not MONGODB_URI or os.getenv("VECTOR_STORE", "atlas").lower() == "local":
+        return None
+
+    async_client = AsyncMongoClient(MONGODB_URI)
+    return async_client[os.getenv("MONGO_DB_NAME")][os.getenv("MONGO_COLLECTION_NAME")]
+
+@traced("vector_search")
+async def aretrieve_from_db(query, vectorstore, async_collection=None, k=4, query_vector=None, filters=None):
+    """
+    Async variant of retrieve_from_db that does not block the event loop.
+
+    The query is embedded off the loop and, when an async collection is given,
+    the $vectorSearch aggregation runs on the async MongoDB driver. Otherwise the
+    vector store's own async retriever is used.
+
+    Args:
+        query -> The query string for searching the vector store.
+        vectorstore -> The vector store instance for document retrieval.
+        async_collection -> AsyncCollection from initialize_async_collection (default: None).
+        k -> int: Number of documents to return (default: 4).
+        query_vector -> list[float] or None: Precomputed query embedding (default: embed the query).
+        filters -> dict or None: Normalized filters applied as a pre-filter (default: None).
+
+    Returns:
+        documents - The most relevant documents retrieved.
+    """
+    if filters:
+        annotate(filtered=True)
+    elif async_collection is None and query_vector is None:
+        return await vectorstore.as_retriever(search_kwargs={"k": k}).ainvoke(query)
+
+    if query_vector is None:
+        query_vector = await vectorstore.embeddings.aembed_query(query)
+
+    if async_collection is None:
+        return await vectorstore.asimilarity_search_by_vector(query_vector, k=k, **_filter_kwargs(vectorstore, filters))
+
+    config = get_vector_storage_config()
+    cursor = await async_collection.aggregate(_vector_search_pipeline(query_vector, k, config, filters))
+    results = [result async for result in cursor]
+    annotate(backend="atlas", candidates=len(results))
+    return _vector_search_documents(results, query_vector, k, config)
+
+def ensure_vector_search_index(mongo_client, db_name, collection_name, index_name, path="embedding", dimensions=384,
+                               quantization=None, timeout=None, poll_interval=5, filter_fields=None):
     """
     Ensures a vector search index exists in MongoDB Atlas. If not found, it creates one.
 
@@ -121,47 +573,64 @@ def ensure_vector_search_index(mongo_client, db_name, collection_name, index_nam
     :param index_name: Name of the vector search index
     :param path: Field storing the embedding vectors
     :param dimensions: Number of dimensions in the vector embeddings
+    :param quantization: "none", "scalar" or "binary"; an existing index with a different
+                         setting is updated (None leaves an existing index as it is)
+    :param timeout: Seconds to wait for a new index to become queryable (None waits forever)
+    :param poll_interval: Seconds between readiness checks
+    :param filter_fields: Metadata fields indexed for $vectorSearch pre-filtering; an existing
+                          index declaring different ones is updated (None leaves them as they are)
     :return: Status message (str)
+    :raises TimeoutError: if the index is not queryable within `timeout`
     """
 
     database = mongo_client[db_name]
     collection = database[collection_name]
 
+    field = {
+        "type": "vector",
+        "numDimensions": dimensions,
+        "path": path,
+        "similarity": "cosine"
+    }
+    if quantization and quantization != "none":
+        field["quantization"] = quantization
+    definition = {"fields": [field] + [{"type": "filter", "path": name} for name in filter_fields or []]}
+
     # Check if the search index already exists
     existing_search_indexes = list(collection.list_search_indexes())
-    index_exists = any(idx["name"] == index_name for idx in existing_search_indexes)
+    existing = next((idx for idx in existing_search_indexes if idx["name"] == index_name), None)
+    unchanged = quantization is None and filter_fields is None
 
-    if index_exists:
+    if existing is not None and (unchanged or existing.get("latestDefinition", {}).get("fields") == definition["fields"]):
         message = f"Search index '{index_name}' already exists."
     else:
-        # Define the vector search index model
-        search_index_model = SearchIndexModel(
-            definition={
-                "fields": [
-                    {
-                        "type": "vector",
-                        "numDimensions": dimensions,
-                        "path": path,
-                        "similarity": "cosine"
-                    }
-                ]
-            },
-            name=index_name,
-            type="vectorSearch"
-        )
+        if existing is not None:
+            # Rebuilds in place; the previous version keeps serving queries meanwhile
+            collection.update_search_index(index_name, definition)
+            result = index_name
+        else:
+            # Define the vector search index model
+            search_index_model = SearchIndexModel(
+                definition=definition,
+                name=index_name,
+                type="vectorSearch"
+            )
 
-        # Create the search index
-        result = collection.create_search_index(model=search_index_model)
+            # Create the search index
+            result = collection.create_search_index(model=search_index_model)
         message = f"New search index named '{result}' is building."
 
         # Wait for the index to be ready
         predicate = lambda index: index.get("queryable") is True
 
+        deadline = time.monotonic() + timeout if timeout is not None else None
         while True:
             indices = list(collection.list_search_indexes(result))
             if len(indices) and predicate(indices[0]):
                 break
-            time.sleep(5)  # Wait before checking again
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"Search index '{result}' is not queryable after {timeout:.0f}s.")
+            time.sleep(poll_interval)  # Wait before checking again
         
         message = f"Search index '{result}' is ready for querying."
         
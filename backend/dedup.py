@@ -0,0 +1,122 @@
+import json
+import os
+import threading
+from hashlib import sha256
+
+
+def chunk_id(source, text):
+    """
+    Deterministic id for a chunk: the same text from the same source always
+    maps to the same id, so re-ingesting it never creates a second vector.
+
+    The id is 32 hex characters so it is never mistaken for a 24 character ObjectId.
+    """
+    return sha256(f"{source}\0{text}".encode()).hexdigest()[:32]
+
+
+def fingerprint_stream(stream, block_size=1024 * 1024):
+    """Hashes a seekable binary stream block by block and rewinds it."""
+    digest = sha256()
+    stream.seek(0)
+    while block := stream.read(block_size):
+        digest.update(block)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def fingerprint_bytes(content):
+    return sha256(content).hexdigest()
+
+
+def fingerprint_documents(docs):
+    """Hashes the text of the documents in order."""
+    digest = sha256()
+    for doc in docs:
+        digest.update(doc.page_content.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class MemoryManifestStore:
+    """Keeps source manifests (fingerprint + chunk ids) in process memory."""
+
+    def __init__(self):
+        self._manifests = {}
+
+    def get(self, source):
+        return self._manifests.get(source)
+
+    def put(self, source, fingerprint, chunk_ids):
+        self._manifests[source] = {"fingerprint": fingerprint, "chunk_ids": list(chunk_ids)}
+
+
+class JsonManifestStore(MemoryManifestStore):
+    """Keeps source manifests in memory and persists them to a JSON file on every change."""
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as f:
+                self._manifests = json.load(f)
+
+    def put(self, source, fingerprint, chunk_ids):
+        with self._lock:
+            super().put(source, fingerprint, chunk_ids)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump(self._manifests, f)
+            os.replace(temp_path, self.path)
+
+
+class MongoManifestStore:
+    """Keeps source manifests in a MongoDB collection next to the vectors, one document per source."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def get(self, source):
+        return self.collection.find_one({"_id": source}, {"_id": 0})
+
+    def put(self, source, fingerprint, chunk_ids):
+        self.collection.replace_one(
+            {"_id": source},
+            {"fingerprint": fingerprint, "chunk_ids": list(chunk_ids)},
+            upsert=True,
+        )
+
+
+def diff_chunks(splits, source, previous_ids, stats):
+    """
+    Assigns content-hash ids to a stream of chunks and yields only the ones
+    that need embedding.
+
+    Chunks whose id was stored by the previous version of the source, and
+    repeats of a chunk already seen in this version, are counted in `stats`
+    and skipped.
+
+    Args:
+        splits -> iterable of Document chunks
+        source -> str: source the chunks belong to
+        previous_ids -> set of chunk ids stored for the previous version
+        stats -> dict updated with chunks_total, chunks_unchanged, chunks_duplicate
+                 and the ordered list of current ids under "_chunk_ids"
+
+    Yields:
+        chunk -> Document with `id` set, not stored yet
+    """
+    seen = {}
+    stats.update({"chunks_total": 0, "chunks_unchanged": 0, "chunks_duplicate": 0, "_chunk_ids": seen})
+    for doc in splits:
+        stats["chunks_total"] += 1
+        id = chunk_id(source, doc.page_content)
+        if id in seen:
+            stats["chunks_duplicate"] += 1
+            continue
+        seen[id] = None
+        if id in previous_ids:
+            stats["chunks_unchanged"] += 1
+            continue
+        doc.id = id
+        yield doc
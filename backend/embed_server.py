@@ -0,0 +1,180 @@
+import argparse
+import os
+import threading
+import time
+
+import httpx
+import numpy as np
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, Response
+from langchain_core.embeddings import Embeddings
+from pydantic import BaseModel
+
+from embeddings import create_embedding_service
+from models import create_hugging_face_embedding_model, warm_up_embedding_model
+
+app = FastAPI()
+
+# Batching embedding service around the one model copy, set once loading finishes
+service = None
+load_error = None
+
+
+class QueryRequest(BaseModel):
+    text: str
+
+
+class DocumentsRequest(BaseModel):
+    texts: list[str]
+
+
+def load_model():
+    """Loads and warms up the embedding model, then serves it through the batching service."""
+    global service, load_error
+    try:
+        model = create_hugging_face_embedding_model()
+        warm_up_embedding_model(model)
+        service = create_embedding_service(model)
+        print("Embedding server ready.")
+    except Exception as e:
+        load_error = str(e)
+        print(f"Error loading the embedding model: {e}")
+
+
+@app.on_event("startup")
+def start_loading():
+    """Loads the model on a background thread so /healthz answers while it loads."""
+    threading.Thread(target=load_model, name="embedding-model-loader", daemon=True).start()
+
+
+def vectors_response(vectors):
+    matrix = np.asarray(vectors, dtype=np.float32)
+    return Response(matrix.tobytes(), media_type="application/octet-stream", headers={"X-Embedding-Dim": str(matrix.shape[-1])})
+
+
+def require_service():
+    if service is None:
+        raise HTTPException(status_code=503, detail=load_error or "Embedding model is loading.", headers={"Retry-After": "1"})
+    return service
+
+
+@app.get("/healthz")
+def healthz():
+    """200 once the model is loaded, 503 while it loads or after it failed to."""
+    if service is None:
+        return JSONResponse({"status": "failed" if load_error else "loading", "error": load_error}, status_code=503)
+    return {"status": "ok", "pid": os.getpid()}
+
+
+@app.post("/embed/query")
+async def embed_query(request: QueryRequest):
+    """Embeds one query; concurrent queries from every server worker share forward passes."""
+    return vectors_response(await require_service().aembed_query(request.text))
+
+
+@app.post("/embed/documents")
+def embed_documents(request: DocumentsRequest):
+    """Embeds an ingestion batch as float32 rows."""
+    return vectors_response(require_service().embed_documents(request.texts))
+
+
+@app.get("/stats")
+def stats():
+    embeddings = require_service()
+    return embeddings.stats() if hasattr(embeddings, "stats") else {}
+
+
+class RemoteEmbeddings(Embeddings):
+    """
+    Client for the shared embedding server over its Unix socket.
+
+    Server workers use this instead of loading their own copy of the model.
+    Vectors travel as raw float32 bytes, so a query costs one local round
+    trip on top of the (batched) forward pass.
+
+    Args:
+        socket_path -> str: Unix socket the embedding server listens on.
+        timeout -> float: Seconds per request.
+    """
+
+    def __init__(self, socket_path, timeout=60):
+        self.socket_path = socket_path
+        self._client = httpx.Client(transport=httpx.HTTPTransport(uds=socket_path), base_url="http://embed", timeout=timeout)
+        self._async_client = httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(uds=socket_path), base_url="http://embed", timeout=timeout
+        )
+
+    @staticmethod
+    def _vectors(response):
+        response.raise_for_status()
+        dimensions = int(response.headers["X-Embedding-Dim"])
+        return np.frombuffer(response.content, dtype=np.float32).reshape(-1, dimensions).tolist()
+
+    def wait_until_ready(self, timeout=120):
+        """Blocks until the server reports the model loaded; raises RuntimeError on failure or timeout."""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                response = self._client.get("/healthz")
+                if response.status_code == 200:
+                    return
+                if response.json().get("status") == "failed":
+                    raise RuntimeError(f"Embedding server failed to load the model: {response.json()['error']}")
+            except httpx.TransportError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Embedding server at {self.socket_path} not ready after {timeout}s")
+            time.sleep(0.2)
+
+    def embed_query(self, text):
+        return self._vectors(self._client.post("/embed/query", json={"text": text}))[0]
+
+    async def aembed_query(self, text):
+        return self._vectors(await self._async_client.post("/embed/query", json={"text": text}))[0]
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        return self._vectors(self._client.post("/embed/documents", json={"texts": list(texts)}))
+
+    async def aembed_documents(self, texts):
+        if not texts:
+            return []
+        return self._vectors(await self._async_client.post("/embed/documents", json={"texts": list(texts)}))
+
+    def stats(self):
+        """Returns the shared service's batching and cache stats."""
+        try:
+            return self._client.get("/stats").json()
+        except httpx.HTTPError:
+            return {}
+
+
+def create_remote_embeddings():
+    """
+    Connects to the shared embedding server configured in the environment.
+
+        EMBED_SERVER -> str: Unix socket of the embedding server (default: unset, each process loads its own model).
+        EMBED_SERVER_TIMEOUT -> float: Seconds to wait for the server's model to load (default: 120).
+
+    Returns:
+        RemoteEmbeddings -> ready client, or None when EMBED_SERVER is not set
+    """
+    socket_path = os.getenv("EMBED_SERVER")
+    if not socket_path:
+        return None
+    embeddings = RemoteEmbeddings(socket_path)
+    embeddings.wait_until_ready(float(os.getenv("EMBED_SERVER_TIMEOUT", "120")))
+    return embeddings
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serves one copy of the embedding model to every server worker.")
+    parser.add_argument("--uds", required=True, help="Unix socket to listen on")
+    args = parser.parse_args()
+
+    if os.path.exists(args.uds):
+        os.unlink(args.uds)
+    uvicorn.run(app, uds=args.uds, log_level="warning")
@@ -0,0 +1,143 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from langchain_core.embeddings import Embeddings
+
+from cache import MemoryCacheBackend
+from metrics import Histogram, SIZE_BUCKETS
+
+
+class BatchingEmbeddings(Embeddings):
+    """
+    Embedding service that micro-batches concurrent query embeddings.
+
+    Queries submitted within `batch_window_ms` of each other (up to
+    `max_batch_size`) are embedded in a single forward pass on a dedicated
+    worker thread, and an LRU cache of query -> vector lets repeated queries
+    skip the model entirely. Document embedding (ingestion) is passed straight
+    through since it is already batched by the caller.
+
+    Args:
+        model -> Embeddings: The wrapped embedding model.
+        max_batch_size -> int: Maximum queries per forward pass.
+        batch_window_ms -> float: How long the first query in a batch waits for others.
+        cache_size -> int: Number of query vectors kept in the LRU cache (0 disables it).
+    """
+
+    def __init__(self, model, max_batch_size=32, batch_window_ms=5, cache_size=2048):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window_ms / 1000
+        self.cache = MemoryCacheBackend(max_entries=cache_size) if cache_size else None
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.batch_sizes = Histogram(SIZE_BUCKETS)
+        self.batch_latency = Histogram()
+        self.query_latency = Histogram()
+
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self.batch_window
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            # Identical queries in the same window share one row of the batch
+            texts = list(dict.fromkeys(text for text, _ in batch))
+            start = time.perf_counter()
+            try:
+                vectors = dict(zip(texts, self.model.embed_documents(texts)))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batch_latency.observe(time.perf_counter() - start)
+            self.batch_sizes.observe(len(texts))
+
+            for text, future in batch:
+                if self.cache is not None:
+                    self.cache.set(text, vectors[text])
+                future.set_result(vectors[text])
+
+    def _submit(self, text):
+        """Returns (vector, None) on a cache hit or (None, Future) once queued for the batcher."""
+        if self.cache is not None:
+            vector = self.cache.get(text)
+            if vector is not None:
+                self.cache_hits += 1
+                return vector, None
+            self.cache_misses += 1
+
+        future = Future()
+        self._queue.put((text, future))
+        return None, future
+
+    def embed_query(self, text):
+        start = time.perf_counter()
+        vector, future = self._submit(text)
+        if future is not None:
+            vector = future.result()
+        self.query_latency.observe(time.perf_counter() - start)
+        return vector
+
+    async def aembed_query(self, text):
+        start = time.perf_counter()
+        vector, future = self._submit(text)
+        if future is not None:
+            vector = await asyncio.wrap_future(future)
+        self.query_latency.observe(time.perf_counter() - start)
+        return vector
+
+    def embed_documents(self, texts):
+        return self.model.embed_documents(texts)
+
+    def stats(self):
+        """Returns cache counters and batch-size / latency histograms."""
+        return {
+            "cache_entries": len(self.cache) if self.cache is not None else 0,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "batch_size": self.batch_sizes.snapshot(),
+            "batch_latency_seconds": self.batch_latency.snapshot(),
+            "query_latency_seconds": self.query_latency.snapshot(),
+        }
+
+
+def create_embedding_service(model):
+    """
+    Wraps the embedding model in the batching service, configured from the environment.
+
+        EMBED_BATCHING -> "true" or "false" (default: "true").
+        EMBED_MAX_BATCH_SIZE -> int: Maximum queries per forward pass (default: 32).
+        EMBED_BATCH_WINDOW_MS -> float: Micro-batching window in milliseconds (default: 5).
+        EMBED_CACHE_SIZE -> int: Query vectors kept in the LRU cache, 0 disables it (default: 2048).
+
+    Args:
+        model -> Embeddings: The embedding model to wrap.
+
+    Returns:
+        Embeddings -> BatchingEmbeddings, or the model itself when batching is disabled
+    """
+    if os.getenv("EMBED_BATCHING", "true").lower() != "true":
+        return model
+
+    return BatchingEmbeddings(
+        model,
+        max_batch_size=int(os.getenv("EMBED_MAX_BATCH_SIZE", "32")),
+        batch_window_ms=float(os.getenv("EMBED_BATCH_WINDOW_MS", "5")),
+        cache_size=int(os.getenv("EMBED_CACHE_SIZE", "2048")),
+    )
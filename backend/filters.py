@@ -0,0 +1,116 @@
+import json
+import os
+
+# Comparison operators accepted in query filters; the same subset $vectorSearch pre-filters support
+OPERATORS = ("$eq", "$ne", "$gt", "$gte", "$lt", "$lte", "$in", "$nin")
+
+
+def get_filter_fields():
+    """
+    Metadata fields queries may filter on. On Atlas they are declared as
+    filter fields of the vector search index.
+
+        FILTER_FIELDS -> str: comma-separated field names (default: "tenant,source,page").
+    """
+    return [field.strip() for field in os.getenv("FILTER_FIELDS", "tenant,source,page").split(",") if field.strip()]
+
+
+def _check_value(field, value):
+    if isinstance(value, (dict, list, tuple)):
+        raise ValueError(f"Filter on '{field}' must compare with a string, number or boolean")
+
+
+def normalize_filters(filters=None, tenant=None, fields=None):
+    """
+    Validates query filters and rewrites them in one canonical form,
+    {field: {operator: value}}. A plain value means $eq and a list means $in.
+
+        {"source": "report.pdf", "page": {"$lte": 3}}
+        -> {"source": {"$eq": "report.pdf"}, "page": {"$lte": 3}}
+
+    Args:
+        filters -> dict or None: field -> value, list of values, or {operator: value}
+        tenant -> str or None: added as {"tenant": {"$eq": tenant}}, overriding any tenant in `filters`
+        fields -> list of str: fields allowed (default: get_filter_fields())
+
+    Returns:
+        dict, or None when there is nothing to filter on
+
+    Raises:
+        ValueError -> on an unknown field or operator, or a value of the wrong type
+    """
+    fields = get_filter_fields() if fields is None else fields
+    normalized = {}
+    for field, condition in (filters or {}).items():
+        if field not in fields:
+            raise ValueError(f"Cannot filter on '{field}', filterable fields are: {', '.join(fields)}")
+        if not isinstance(condition, dict):
+            condition = {"$in": condition} if isinstance(condition, (list, tuple)) else {"$eq": condition}
+        if not condition:
+            raise ValueError(f"Empty filter on '{field}'")
+        for operator, value in condition.items():
+            if operator not in OPERATORS:
+                raise ValueError(f"Unknown filter operator '{operator}', expected one of: {', '.join(OPERATORS)}")
+            if operator in ("$in", "$nin"):
+                if not isinstance(value, (list, tuple)):
+                    raise ValueError(f"'{operator}' on '{field}' needs a list of values")
+                for item in value:
+                    _check_value(field, item)
+            else:
+                _check_value(field, value)
+        normalized[field] = {operator: list(value) if operator in ("$in", "$nin") else value
+                             for operator, value in condition.items()}
+    if tenant is not None:
+        normalized["tenant"] = {"$eq": tenant}
+    return normalized or None
+
+
+def to_mongo(filters):
+    """Returns normalized filters as a $vectorSearch `filter` (MQL), or None."""
+    if not filters:
+        return None
+    clauses = [{field: condition} for field, condition in filters.items()]
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def _compare(value, operator, operand):
+    if operator == "$eq":
+        return value == operand
+    if operator == "$ne":
+        return value != operand
+    if operator == "$in":
+        return value in operand
+    if operator == "$nin":
+        return value not in operand
+    if value is None or isinstance(value, bool) != isinstance(operand, bool):
+        return False
+    try:
+        if operator == "$gt":
+            return value > operand
+        if operator == "$gte":
+            return value >= operand
+        if operator == "$lt":
+            return value < operand
+        return value <= operand
+    except TypeError:
+        return False
+
+
+def matches_value(value, condition):
+    """True if one metadata value satisfies every operator of a normalized condition."""
+    return all(_compare(value, operator, operand) for operator, operand in condition.items())
+
+
+def matches(metadata, filters):
+    """True if a chunk's metadata satisfies normalized filters; missing fields compare as None."""
+    return all(matches_value(metadata.get(field), condition) for field, condition in (filters or {}).items())
+
+
+def filter_scope(filters):
+    """
+    Canonical string for normalized filters, used to keep cached answers
+    apart per tenant and document selection. None when unfiltered.
+    """
+    if not filters:
+        return None
+    return json.dumps(filters, sort_keys=True, separators=(",", ":"))
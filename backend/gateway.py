@@ -0,0 +1,515 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from pydantic import PrivateAttr
+
+from metrics import REGISTRY
+
+# HTTP statuses worth retrying: rate limits, timeouts and transient server errors
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+def retry_after(error):
+    """Returns the Retry-After seconds sent with an API error, or None."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error):
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return isinstance(error, (TimeoutError, ConnectionError)) or type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+class GatewayError(RuntimeError):
+    """Raised when no endpoint can take a call because every circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Stops sending calls to an endpoint after `failure_threshold` consecutive
+    failures. After `reset_timeout` seconds one probe call is let through
+    (half-open): its success closes the breaker, its failure opens it again.
+
+    Args:
+        failure_threshold -> int: Consecutive retryable failures that open the breaker (default: 5).
+        reset_timeout -> float: Seconds the breaker stays open before a probe (default: 30).
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.trips = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """True if a call may be sent now; in the half-open state only one probe is let through."""
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._probing = False
+            if self.state == "half_open":
+                if self._probing:
+                    return False
+                self._probing = True
+            return self.state != "open"
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                self.trips += 1
+
+    def release(self):
+        """Gives the probe slot back when a half-open call was cancelled without an outcome."""
+        with self._lock:
+            self._probing = False
+
+
+class Endpoint:
+    """
+    One OpenAI-compatible endpoint and model behind the gateway.
+
+    Tracks the calls in flight and, per kind of call ("generate": the whole
+    completion, "stream": time to first chunk), an exponentially weighted
+    moving average and a rolling window of recent latencies.
+
+    Args:
+        name -> str: Label used in stats and metrics.
+        model -> chat model sending the calls, created with retries disabled.
+        fallback -> bool: Only used when no primary endpoint is available (default: False).
+        breaker -> CircuitBreaker (default: a new one with default settings).
+        window -> int: Latencies kept for percentiles (default: 200).
+        min_samples -> int: Latencies needed before percentiles are reported (default: 20).
+    """
+
+    def __init__(self, name, model, fallback=False, breaker=None, window=200, min_samples=20):
+        self.name = name
+        self.model = model
+        self.fallback = fallback
+        self.breaker = breaker or CircuitBreaker()
+        self.min_samples = min_samples
+        self.inflight = 0
+        self.calls = 0
+        self.failures = 0
+        self.throttled_until = 0.0
+        self._latencies = {kind: deque(maxlen=window) for kind in ("generate", "stream")}
+        self._ewma = {}
+        self._lock = threading.Lock()
+
+    def enter(self):
+        with self._lock:
+            self.inflight += 1
+
+    def exit(self):
+        with self._lock:
+            self.inflight -= 1
+
+    def expected_latency(self, kind):
+        """
+        EWMA latency scaled by the calls already queued on the endpoint, plus
+        any Retry-After wait it asked for; 0 until it has been measured.
+        """
+        return self._ewma.get(kind, 0.0) * (self.inflight + 1) + max(0.0, self.throttled_until - time.monotonic())
+
+    def percentile(self, kind, q):
+        """Returns the q-quantile (0-1) of recent latencies in seconds, or None with too few samples."""
+        with self._lock:
+            latencies = sorted(self._latencies[kind])
+        if len(latencies) < self.min_samples:
+            return None
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+    def _update_ewma(self, kind, seconds):
+        previous = self._ewma.get(kind)
+        self._ewma[kind] = seconds if previous is None else 0.8 * previous + 0.2 * seconds
+
+    def record_success(self, kind, seconds):
+        with self._lock:
+            self.calls += 1
+            self._latencies[kind].append(seconds)
+            self._update_ewma(kind, seconds)
+        self.breaker.record_success()
+        REGISTRY.histogram(
+            "rag_llm_endpoint_latency_seconds", "LLM latency per endpoint: whole completion or time to first chunk.",
+            endpoint=self.name, kind=kind,
+        ).observe(seconds)
+        self._count("success")
+
+    def record_failure(self, error):
+        with self._lock:
+            self.calls += 1
+            self.failures += 1
+        if getattr(error, "status_code", None) == 429:
+            # Rate limited, not unhealthy: route around it until its Retry-After has passed
+            self.throttled_until = time.monotonic() + (retry_after(error) or 1.0)
+            self.breaker.release()
+        elif is_retryable(error):
+            self.breaker.record_failure()
+        else:
+            # A rejected request (bad input) says nothing about the endpoint's health
+            self.breaker.release()
+        self._count("error")
+
+    def record_cancelled(self, kind, seconds):
+        # A call that lost to a hedge took at least this long: count it so a slow
+        # endpoint does not keep looking unmeasured (and so preferred)
+        with self._lock:
+            self._update_ewma(kind, seconds)
+        self.breaker.release()
+        self._count("cancelled")
+
+    def _count(self, outcome):
+        REGISTRY.counter("rag_llm_endpoint_calls", "LLM calls per endpoint and outcome.", endpoint=self.name, outcome=outcome).inc()
+
+    def stats(self):
+        p50, p95 = self.percentile("generate", 0.5), self.percentile("generate", 0.95)
+        return {
+            "model": getattr(self.model, "model_name", None),
+            "fallback": self.fallback,
+            "breaker": self.breaker.state,
+            "breaker_trips": self.breaker.trips,
+            "inflight": self.inflight,
+            "calls": self.calls,
+            "failures": self.failures,
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+        }
+
+
+class LLMGateway(BaseChatModel):
+    """
+    Chat model that spreads calls over several OpenAI-compatible endpoints
+    and keeps answering when some of them are slow or failing.
+
+    - Load balancing: each call goes to the primary endpoint with the
+      lowest expected latency (moving average x calls in flight) whose
+      circuit breaker is closed. Fallback endpoints (e.g. a smaller model)
+      are used only when no primary endpoint is available.
+    - Deadline: every call, including its retries and hedges, finishes
+      within `deadline` seconds or raises TimeoutError.
+    - Hedging: if the first endpoint has not answered after its p95 latency
+      (or a fixed `hedge_after`), the same call is sent to the next best
+      endpoint and the first answer wins. At most `hedge_budget` of calls
+      are hedged, so a slow provider does not get twice the load.
+    - Retries: rate-limit, timeout and server errors are retried on another
+      endpoint when there is one, with exponential backoff and jitter.
+
+    Streams are hedged and retried until the first chunk arrives; after
+    that the stream stays on its endpoint.
+
+    Args:
+        endpoints -> list of Endpoint
+        deadline -> float: Seconds a call may take in total (default: 60).
+        max_retries -> int: Retries after the first attempt (default: 2).
+        retry_base_delay -> float: First backoff delay in seconds, doubled per retry (default: 0.25).
+        hedge_after -> "p95", float seconds, or None to disable hedging (default: "p95").
+        hedge_budget -> float: Largest share of calls that may be hedged (default: 0.1).
+    """
+
+    endpoints: list
+    deadline: float = 60.0
+    max_retries: int = 2
+    retry_base_delay: float = 0.25
+    hedge_after: Optional[Any] = "p95"
+    hedge_budget: float = 0.1
+
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _pool: Any = PrivateAttr(default=None)
+    _requests: int = PrivateAttr(default=0)
+    _hedges: int = PrivateAttr(default=0)
+    _hedges_won: int = PrivateAttr(default=0)
+
+    @property
+    def _llm_type(self):
+        return "llm-gateway"
+
+    @property
+    def _identifying_params(self):
+        return {"endpoints": [endpoint.name for endpoint in self.endpoints]}
+
+    def _pick(self, kind, exclude=()):
+        """Returns the available endpoint with the lowest expected latency, primaries first, or None."""
+        for fallback in (False, True):
+            candidates = [endpoint for endpoint in self.endpoints if endpoint.fallback == fallback and endpoint not in exclude]
+            for endpoint in sorted(candidates, key=lambda endpoint: (endpoint.expected_latency(kind), random.random())):
+                if endpoint.breaker.allow():
+                    return endpoint
+        return None
+
+    def _hedge_delay(self, endpoint, kind):
+        if self.hedge_after is None:
+            return None
+        if self.hedge_after == "p95":
+            return endpoint.percentile(kind, 0.95)
+        return float(self.hedge_after)
+
+    def _take_hedge(self):
+        with self._lock:
+            if self._hedges >= self.hedge_budget * self._requests:
+                return False
+            self._hedges += 1
+        REGISTRY.counter("rag_llm_hedges", "LLM calls hedged on a second endpoint.").inc()
+        return True
+
+    def _hedge_won(self):
+        with self._lock:
+            self._hedges_won += 1
+        REGISTRY.counter("rag_llm_hedges_won", "Hedged LLM calls answered by the hedge first.").inc()
+
+    def _backoff(self, error, attempt, remaining):
+        REGISTRY.counter("rag_llm_retries", "LLM calls retried by the gateway.").inc()
+        delay = retry_after(error) or self.retry_base_delay * 2 ** attempt * (0.5 + random.random())
+        return min(delay, max(remaining, 0.0))
+
+    def _start(self):
+        with self._lock:
+            self._requests += 1
+        return time.monotonic() + self.deadline
+
+    def _check_retry(self, error, attempt, deadline):
+        if attempt >= self.max_retries or not is_retryable(error):
+            raise error
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"LLM call exceeded its {self.deadline:g}s deadline") from error
+
+    def _next(self, kind, tried):
+        endpoint = self._pick(kind, tried) or self._pick(kind)
+        if endpoint is None:
+            raise GatewayError("No LLM endpoint available: every circuit breaker is open.")
+        return endpoint
+
+    #### ASYNC ####
+    async def _aattempt(self, kind, call, endpoint, deadline):
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+            raise TimeoutError(f"LLM call exceeded its {self.deadline:g}s deadline")
+        endpoint.enter()
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(call(endpoint, timeout), timeout)
+        except asyncio.CancelledError:
+            endpoint.record_cancelled(kind, time.perf_counter() - start)
+            raise
+        except Exception as e:
+            endpoint.record_failure(e)
+            raise
+        finally:
+            endpoint.exit()
+        endpoint.record_success(kind, time.perf_counter() - start)
+        return endpoint, result
+
+    async def _ahedged(self, kind, call, endpoint, deadline, tried, cleanup):
+        tried.add(endpoint)
+        tasks = {asyncio.create_task(self._aattempt(kind, call, endpoint, deadline)): endpoint}
+        winner = None
+        try:
+            delay = self._hedge_delay(endpoint, kind)
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=min(delay, max(deadline - time.monotonic(), 0.0)))
+                if not done and self._take_hedge():
+                    hedge = self._pick(kind, tried) or self._pick(kind)
+                    if hedge is not None:
+                        tried.add(hedge)
+                        tasks[asyncio.create_task(self._aattempt(kind, call, hedge, deadline))] = hedge
+
+            pending, error = set(tasks), None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        winner = task
+                        if len(tasks) > 1 and tasks[task] is not endpoint:
+                            self._hedge_won()
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Both attempts can finish together: release the loser's result (e.g. an open stream)
+            for task in tasks:
+                if task is not winner and task.done() and not task.cancelled() and task.exception() is None and cleanup:
+                    await cleanup(task.result()[1])
+
+    async def _arun(self, kind, call, cleanup=None):
+        """
+        Runs `call(endpoint, timeout)` with load balancing, hedging, retries
+        and the deadline applied.
+
+        Returns:
+            (endpoint, result) -> endpoint that answered and the coroutine's result
+        """
+        deadline = self._start()
+        tried = set()
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await self._ahedged(kind, call, self._next(kind, tried), deadline, tried, cleanup)
+            except GatewayError:
+                raise
+            except Exception as e:
+                self._check_retry(e, attempt, deadline)
+                await asyncio.sleep(self._backoff(e, attempt, deadline - time.monotonic()))
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        async def call(endpoint, timeout):
+            return await endpoint.model._agenerate(messages, stop=stop, timeout=timeout, **kwargs)
+
+        endpoint, result = await self._arun("generate", call)
+        result.llm_output = {**(result.llm_output or {}), "endpoint": endpoint.name}
+        return result
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        async def first_chunk(endpoint, timeout):
+            stream = endpoint.model._astream(messages, stop=stop, timeout=timeout, **kwargs)
+            try:
+                return stream, await anext(stream, None)
+            except BaseException:
+                await stream.aclose()
+                raise
+
+        async def close(result):
+            await result[0].aclose()
+
+        _, (stream, first) = await self._arun("stream", first_chunk, close)
+        try:
+            if first is not None:
+                yield first
+            async for chunk in stream:
+                yield chunk
+        finally:
+            await stream.aclose()
+
+    #### SYNC ####
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-gateway")
+            return self._pool
+
+    def _attempt(self, kind, call, endpoint, deadline):
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+            raise TimeoutError(f"LLM call exceeded its {self.deadline:g}s deadline")
+        endpoint.enter()
+        start = time.perf_counter()
+        try:
+            result = call(endpoint, timeout)
+        except Exception as e:
+            endpoint.record_failure(e)
+            raise
+        finally:
+            endpoint.exit()
+        endpoint.record_success(kind, time.perf_counter() - start)
+        return endpoint, result
+
+    def _hedged(self, kind, call, endpoint, deadline, tried, cleanup):
+        # Threads cannot be cancelled: a losing attempt runs to completion (bounded
+        # by its timeout) in the background and its result is released by `cleanup`
+        pool = self._executor()
+        tried.add(endpoint)
+        futures = {pool.submit(self._attempt, kind, call, endpoint, deadline): endpoint}
+        delay = self._hedge_delay(endpoint, kind)
+        if delay is not None:
+            done, _ = wait(futures, timeout=min(delay, max(deadline - time.monotonic(), 0.0)))
+            if not done and self._take_hedge():
+                hedge = self._pick(kind, tried) or self._pick(kind)
+                if hedge is not None:
+                    tried.add(hedge)
+                    futures[pool.submit(self._attempt, kind, call, hedge, deadline)] = hedge
+
+        pending, error = set(futures), None
+        while pending:
+            done, pending = wait(pending, timeout=max(deadline - time.monotonic(), 0.0), return_when=FIRST_COMPLETED)
+            if not done:
+                error = TimeoutError(f"LLM call exceeded its {self.deadline:g}s deadline")
+                break
+            for future in done:
+                if future.exception() is None:
+                    if len(futures) > 1 and futures[future] is not endpoint:
+                        self._hedge_won()
+                    self._release(set(futures) - {future}, cleanup)
+                    return future.result()
+                error = future.exception()
+        self._release(pending, cleanup)
+        raise error
+
+    @staticmethod
+    def _release(futures, cleanup):
+        """Releases the results of attempts that lost, now or whenever they finish."""
+        if cleanup is None:
+            return
+        for future in futures:
+            future.add_done_callback(lambda f: f.exception() is None and cleanup(f.result()[1]))
+
+    def _run(self, kind, call, cleanup=None):
+        """Sync variant of _arun; attempts run on the gateway's thread pool so the deadline holds."""
+        deadline = self._start()
+        tried = set()
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self._hedged(kind, call, self._next(kind, tried), deadline, tried, cleanup)
+            except GatewayError:
+                raise
+            except Exception as e:
+                self._check_retry(e, attempt, deadline)
+                time.sleep(self._backoff(e, attempt, deadline - time.monotonic()))
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        def call(endpoint, timeout):
+            return endpoint.model._generate(messages, stop=stop, timeout=timeout, **kwargs)
+
+        endpoint, result = self._run("generate", call)
+        result.llm_output = {**(result.llm_output or {}), "endpoint": endpoint.name}
+        return result
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        def first_chunk(endpoint, timeout):
+            stream = endpoint.model._stream(messages, stop=stop, timeout=timeout, **kwargs)
+            try:
+                return stream, next(stream, None)
+            except BaseException:
+                stream.close()
+                raise
+
+        _, (stream, first) = self._run("stream", first_chunk, lambda result: result[0].close())
+        try:
+            if first is not None:
+                yield first
+            yield from stream
+        finally:
+            stream.close()
+
+    def stats(self):
+        """Returns call, hedge and per-endpoint breaker and latency stats."""
+        with self._lock:
+            requests, hedges, hedges_won = self._requests, self._hedges, self._hedges_won
+        return {
+            "requests": requests,
+            "hedges": hedges,
+            "hedges_won": hedges_won,
+            "endpoints": {endpoint.name: endpoint.stats() for endpoint in self.endpoints},
+        }
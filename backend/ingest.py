@@ -0,0 +1,148 @@
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from metrics import REGISTRY, SIZE_BUCKETS
+from tracing import record_stage
+
+# Embedding model loaded once per pool worker process
+_worker_model = None
+
+# Shared process pool, created on first use
+_embedding_pool = None
+
+BATCH_SIZES = REGISTRY.histogram("rag_ingest_batch_size", "Chunks per embedding/store batch during ingestion.", SIZE_BUCKETS)
+
+
+def batched(iterable, size):
+    """Yields lists of at most `size` items from iterable."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _init_embedding_worker(threads):
+    global _worker_model
+    from models import create_hugging_face_embedding_model
+    _worker_model = create_hugging_face_embedding_model(threads=threads)
+
+
+def _embed_in_worker(texts):
+    return _worker_model.embed_documents(texts)
+
+
+def get_embedding_pool():
+    """
+    Returns the shared process pool used to embed ingestion batches.
+
+        INGEST_EMBED_WORKERS -> int: Worker processes, 0 embeds on the calling thread (default: 0).
+
+    Each worker loads its own copy of the embedding model and uses
+    cpu_count / workers intra-op threads so the workers don't oversubscribe the CPU.
+
+    Returns:
+        ProcessPoolExecutor or None when INGEST_EMBED_WORKERS is 0
+    """
+    global _embedding_pool
+    workers = int(os.getenv("INGEST_EMBED_WORKERS", "0"))
+    if workers <= 0:
+        return None
+
+    if _embedding_pool is None:
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        _embedding_pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_embedding_worker,
+            initargs=(threads,),
+        )
+    return _embedding_pool
+
+
+def shutdown_embedding_pool():
+    """Stops the shared embedding pool, if one was started."""
+    global _embedding_pool
+    if _embedding_pool is not None:
+        _embedding_pool.shutdown(wait=True, cancel_futures=True)
+        _embedding_pool = None
+
+
+def run_ingestion(chunks, vectorstore, insert, batch_size=None, embed_pool=None, max_inflight=None, on_progress=None):
+    """
+    Staged ingestion: embeds a stream of chunks in fixed-size batches and
+    bulk-inserts each batch as soon as it is embedded.
+
+    Chunks are pulled lazily from the iterator, so only the batches that are
+    in flight are held in memory regardless of how large the source is. With a
+    process pool, the next batches are embedded while the current one is
+    being inserted; at most `max_inflight` batches are in flight.
+
+    Args:
+        chunks -> iterable of Document chunks (e.g. from utils.iter_splits)
+        vectorstore -> vector store whose embeddings are used when there is no pool
+        insert -> callable(documents, vectors): stores one embedded batch
+        batch_size -> int: chunks per embedding batch (default: INGEST_BATCH_SIZE or 64)
+        embed_pool -> ProcessPoolExecutor or None (default: embed on the calling thread)
+        max_inflight -> int: batches submitted to the pool at once (default: INGEST_MAX_INFLIGHT or 4)
+        on_progress -> callable(stats) called after every stored batch (default: None)
+
+    Returns:
+        stats -> dict with chunk/batch counts and seconds spent per stage
+    """
+    batch_size = batch_size or int(os.getenv("INGEST_BATCH_SIZE", "64"))
+    max_inflight = max_inflight or int(os.getenv("INGEST_MAX_INFLIGHT", "4"))
+
+    stats = {
+        "chunks_embedded": 0,
+        "chunks_stored": 0,
+        "batches": 0,
+        "parse_split_seconds": 0.0,
+        "embed_seconds": 0.0,
+        "store_seconds": 0.0,
+    }
+
+    def store(documents, vectors, embed_started):
+        embed_seconds = time.perf_counter() - embed_started
+        stats["embed_seconds"] += embed_seconds
+        stats["chunks_embedded"] += len(documents)
+        record_stage("ingest_embed", embed_seconds)
+        BATCH_SIZES.observe(len(documents))
+
+        start = time.perf_counter()
+        insert(documents, vectors)
+        store_seconds = time.perf_counter() - start
+        stats["store_seconds"] += store_seconds
+        record_stage("ingest_store", store_seconds)
+        stats["chunks_stored"] += len(documents)
+        stats["batches"] += 1
+        if on_progress is not None:
+            on_progress(stats)
+
+    inflight = deque()
+    batches = batched(chunks, batch_size)
+    while True:
+        start = time.perf_counter()
+        documents = next(batches, None)
+        stats["parse_split_seconds"] += time.perf_counter() - start
+        if documents is None:
+            break
+
+        texts = [doc.page_content for doc in documents]
+        if embed_pool is None:
+            embed_started = time.perf_counter()
+            store(documents, vectorstore.embeddings.embed_documents(texts), embed_started)
+            continue
+
+        inflight.append((documents, embed_pool.submit(_embed_in_worker, texts), time.perf_counter()))
+        if len(inflight) >= max_inflight:
+            documents, future, embed_started = inflight.popleft()
+            store(documents, future.result(), embed_started)
+
+    while inflight:
+        documents, future, embed_started = inflight.popleft()
+        store(documents, future.result(), embed_started)
+
+    return stats
@@ -0,0 +1,305 @@
+import itertools
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from uuid import uuid4
+
+
+class Job:
+    """
+    A unit of background work (one ingestion) and its observable state.
+
+    Attributes:
+        status -> "queued", "running", "succeeded" or "failed"
+        progress -> dict of counters reported by the work (e.g. chunks_embedded, chunks_stored)
+        stages -> dict of seconds spent per stage, including time spent queued
+    """
+
+    def __init__(self, kind, priority, description=""):
+        self.id = str(uuid4())
+        self.kind = kind
+        self.priority = priority
+        self.description = description
+        self.status = "queued"
+        self.progress = {}
+        self.stages = {}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.on_change = None
+
+    def changed(self):
+        if self.on_change is not None:
+            self.on_change(self)
+
+    def update_progress(self, stats):
+        """Records pipeline stats; counters go to progress and *_seconds entries to stages."""
+        for key, value in stats.items():
+            if key.endswith("_seconds"):
+                self.stages[key[: -len("_seconds")]] = round(value, 3)
+            else:
+                self.progress[key] = value
+        self.changed()
+
+    def to_dict(self):
+        end = self.finished_at or time.time()
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "description": self.description,
+            "priority": self.priority,
+            "status": self.status,
+            "progress": self.progress,
+            "stages": self.stages,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "elapsed_seconds": round(end - (self.started_at or end), 3),
+        }
+
+
+class StoredJob:
+    """A job tracked by another worker process, as last saved to the JobStateStore."""
+
+    def __init__(self, state):
+        self.id = state["job_id"]
+        self.state = state
+
+    def to_dict(self):
+        return self.state
+
+
+class JobStateStore:
+    """
+    SQLite table of job states shared by every worker process, so /jobs/{id}
+    answers on whichever worker the poll lands on.
+
+    Args:
+        path -> str: SQLite file to store job states in.
+        max_jobs_kept -> int: Most recent jobs kept.
+    """
+
+    def __init__(self, path, max_jobs_kept=1000):
+        self.max_jobs_kept = max_jobs_kept
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, state TEXT, created REAL)")
+
+    def save(self, job):
+        state = job.to_dict()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs (id, state, created) VALUES (?, ?, ?)",
+                (job.id, json.dumps(state, default=str), job.created_at),
+            )
+
+    def evict(self):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM jobs WHERE id IN (SELECT id FROM jobs ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                (self.max_jobs_kept,),
+            )
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT state FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return StoredJob(json.loads(row[0])) if row else None
+
+    def list(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT state FROM jobs ORDER BY created DESC LIMIT ?", (self.max_jobs_kept,)).fetchall()
+        return [StoredJob(json.loads(state)) for state, in rows]
+
+
+class JobQueue:
+    """
+    Priority job queue served by a pool of worker threads.
+
+    Jobs with a lower priority number run first; ties run in submission order.
+    Workers run at a lower OS scheduling priority and, between batches, back
+    off while queries are in flight so that ingestion never competes head-on
+    with query latency.
+
+    Args:
+        workers -> int: Number of worker threads.
+        nice -> int: Niceness increment applied to each worker thread (Linux only).
+        yield_max_ms -> float: Longest a worker pauses for in-flight queries per checkpoint.
+        max_jobs_kept -> int: Finished jobs kept for status lookups.
+        state_store -> JobStateStore or None: Where job states are shared with other worker processes.
+    """
+
+    def __init__(self, workers=2, nice=10, yield_max_ms=200, max_jobs_kept=1000, state_store=None):
+        self.workers = workers
+        self.nice = nice
+        self.yield_max = yield_max_ms / 1000
+        self.max_jobs_kept = max_jobs_kept
+        self.state_store = state_store
+        self.active_queries = 0
+
+        self._jobs = OrderedDict()
+        self._queue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def _start_workers(self):
+        with self._lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._run, name=f"ingest-worker-{len(self._threads)}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _run(self):
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), self.nice)
+        except (AttributeError, OSError):
+            pass
+
+        while True:
+            _, _, job, fn, args = self._queue.get()
+            if job is None:
+                return
+
+            if job.finished_at:
+                continue  # failed by shutdown() while still queued
+
+            job.status = "running"
+            job.started_at = time.time()
+            job.stages["queued"] = round(job.started_at - job.created_at, 3)
+            job.changed()
+            try:
+                job.result = fn(job, *args)
+                job.status = "succeeded"
+            except Exception as e:
+                print(f"Job {job.id} failed: {e}")
+                job.error = str(e)
+                job.status = "failed"
+            finally:
+                job.finished_at = time.time()
+                job.changed()
+
+    def submit(self, kind, fn, *args, priority=10, description=""):
+        """
+        Queues fn(job, *args) and returns the Job immediately.
+
+        Args:
+            kind -> str: job type shown in status responses (e.g. "pdf", "url")
+            fn -> callable(job, *args) returning a JSON-serializable result
+            priority -> int: lower numbers run first (default: 10)
+            description -> str: human readable label (e.g. the file name)
+        """
+        self._start_workers()
+        job = Job(kind, priority, description)
+        if self.state_store is not None:
+            job.on_change = self.state_store.save
+            job.changed()
+            self.state_store.evict()
+        with self._lock:
+            self._jobs[job.id] = job
+            self._evict_finished()
+        self._queue.put((priority, next(self._sequence), job, fn, args))
+        return job
+
+    def _evict_finished(self):
+        while len(self._jobs) > self.max_jobs_kept:
+            oldest = next((id for id, job in self._jobs.items() if job.finished_at), None)
+            if oldest is None:
+                break
+            del self._jobs[oldest]
+
+    def get(self, job_id):
+        """Returns the Job with this id (or its stored state when another worker runs it), or None."""
+        job = self._jobs.get(job_id)
+        if job is None and self.state_store is not None:
+            return self.state_store.get(job_id)
+        return job
+
+    def list(self):
+        """Returns all tracked jobs, newest first."""
+        local = list(reversed(self._jobs.values()))
+        if self.state_store is None:
+            return local
+        ids = {job.id for job in local}
+        stored = [job for job in self.state_store.list() if job.id not in ids]
+        return sorted(local + stored, key=lambda job: job.to_dict()["created_at"], reverse=True)
+
+    def query_started(self):
+        with self._lock:
+            self.active_queries += 1
+
+    def query_finished(self):
+        with self._lock:
+            self.active_queries -= 1
+
+    @contextmanager
+    def query_running(self):
+        """Marks a query as in flight so workers yield the CPU to it."""
+        self.query_started()
+        try:
+            yield
+        finally:
+            self.query_finished()
+
+    def yield_to_queries(self):
+        """Called by workers between batches; pauses while queries are in flight, up to yield_max."""
+        deadline = time.perf_counter() + self.yield_max
+        while self.active_queries > 0 and time.perf_counter() < deadline:
+            time.sleep(0.005)
+
+    def shutdown(self, timeout=None):
+        """
+        Stops the workers after the jobs already queued ahead of the stop signal.
+
+        With a timeout, waits up to that many seconds for them to finish, then
+        marks the jobs still queued or running as failed so pollers stop waiting.
+        """
+        for _ in self._threads:
+            self._queue.put((float("inf"), next(self._sequence), None, None, None))
+        if timeout is None:
+            return
+
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0, deadline - time.monotonic()))
+        for job in list(self._jobs.values()):
+            if not job.finished_at:
+                job.error = "Interrupted by server shutdown"
+                job.status = "failed"
+                job.finished_at = time.time()
+                job.changed()
+
+
+def create_job_queue():
+    """
+    Creates the ingestion job queue from the environment.
+
+        INGEST_WORKERS -> int: Concurrent ingestion jobs (default: 2).
+        INGEST_NICE -> int: Niceness increment for worker threads (default: 10).
+        INGEST_YIELD_MAX_MS -> float: Longest pause per batch while queries run (default: 200).
+        JOBS_MAX_KEPT -> int: Finished jobs kept for /jobs lookups (default: 1000).
+        JOBS_STATE_PATH -> str: SQLite file sharing job states between server worker processes
+                           (default: unset, jobs are only visible to the worker that queued them).
+
+    Returns:
+        JobQueue -> configured queue; workers start on the first submission
+    """
+    max_jobs_kept = int(os.getenv("JOBS_MAX_KEPT", "1000"))
+    state_path = os.getenv("JOBS_STATE_PATH")
+    return JobQueue(
+        workers=int(os.getenv("INGEST_WORKERS", "2")),
+        nice=int(os.getenv("INGEST_NICE", "10")),
+        yield_max_ms=float(os.getenv("INGEST_YIELD_MAX_MS", "200")),
+        max_jobs_kept=max_jobs_kept,
+        state_store=JobStateStore(state_path, max_jobs_kept) if state_path else None,
+    )
@@ -0,0 +1,87 @@
+import asyncio
+import os
+
+
+class OverloadedError(Exception):
+    """Raised when a request is rejected because the server is at capacity."""
+
+
+class ConcurrencyLimiter:
+    """
+    Bounded concurrency limiter with backpressure for async request handlers.
+
+    At most `max_concurrency` requests run at once and at most `max_queue`
+    requests wait for a slot. Anything beyond that, or anything that waits
+    longer than `queue_timeout` seconds, is rejected with OverloadedError so
+    callers can answer 503 instead of letting tail latency grow with queue depth.
+
+    Usage:
+        async with limiter:
+            ...
+    """
+
+    def __init__(self, max_concurrency, max_queue, queue_timeout=None):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    def check(self):
+        """
+        Raises OverloadedError if a request arriving now would be rejected
+        without waiting. Lets a handler answer 503 before it commits to a
+        streamed response that acquires its slot later.
+        """
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise OverloadedError(f"Too many queued requests ({self.waiting}/{self.max_queue}).")
+
+    async def __aenter__(self):
+        self.check()
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise OverloadedError(f"Timed out after {self.queue_timeout}s waiting for a free slot.")
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.active -= 1
+        self._semaphore.release()
+
+    def stats(self):
+        """Returns the current limiter state as a dict."""
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+        }
+
+
+def create_invoke_limiter():
+    """
+    Creates the limiter for /invoke from the environment.
+
+        INVOKE_MAX_CONCURRENCY -> int: Requests processed at once (default: 64).
+        INVOKE_MAX_QUEUE -> int: Requests allowed to wait for a slot (default: 256).
+        INVOKE_QUEUE_TIMEOUT -> float: Seconds a request may wait for a slot (default: 30).
+
+    Returns:
+        ConcurrencyLimiter -> configured limiter
+    """
+    return ConcurrencyLimiter(
+        max_concurrency=int(os.getenv("INVOKE_MAX_CONCURRENCY", "64")),
+        max_queue=int(os.getenv("INVOKE_MAX_QUEUE", "256")),
+        queue_timeout=float(os.getenv("INVOKE_QUEUE_TIMEOUT", "30")),
+    )
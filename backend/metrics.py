@@ -0,0 +1,207 @@
+import threading
+
+# Default latency buckets in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Default buckets for batch and result sizes
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class Histogram:
+    """
+    Thread-safe cumulative histogram with fixed upper bounds.
+
+    Args:
+        buckets -> tuple: Sorted upper bounds; an implicit +Inf bucket is added.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self._counts[i] += 1
+                    break
+            else:
+                self._counts[-1] += 1
+            self._sum += value
+            self._count += 1
+
+    def quantile(self, q):
+        """Estimates the q-quantile (0-1) as the upper bound of the bucket containing it."""
+        with self._lock:
+            if self._count == 0:
+                return 0.0
+            target = q * self._count
+            seen = 0
+            for bound, count in zip(self.buckets + (float("inf"),), self._counts):
+                seen += count
+                if seen >= target:
+                    return bound
+        return float("inf")
+
+    def snapshot(self):
+        """Returns count, sum, mean, p50/p95/p99 estimates and per-bucket counts."""
+        with self._lock:
+            counts, total, count = list(self._counts), self._sum, self._count
+        return {
+            "count": count,
+            "sum": round(total, 6),
+            "mean": round(total / count, 6) if count else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": {str(bound): c for bound, c in zip(self.buckets + ("+Inf",), counts)},
+        }
+
+
+# Buckets for prompt and completion token counts
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+
+class Counter:
+    """Thread-safe monotonically increasing counter."""
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        with self._lock:
+            return self._value
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _is_histogram_snapshot(value):
+    return isinstance(value, dict) and "buckets" in value and "count" in value
+
+
+class Registry:
+    """
+    Named metric families rendered in the Prometheus text exposition format.
+
+    A family holds one Histogram or Counter per label set. Components that
+    keep their own counters can instead register a stats() callable: its
+    numeric values are exported as gauges and its Histogram snapshots as
+    histograms, read at scrape time.
+    """
+
+    def __init__(self):
+        self._families = {}
+        self._collectors = {}
+        self._lock = threading.Lock()
+
+    def _get(self, kind, name, help, labels, factory):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            family = self._families.setdefault(name, {"type": kind, "help": help, "metrics": {}})
+            if family["type"] != kind:
+                raise ValueError(f"Metric '{name}' is already registered as a {family['type']}")
+            metric = family["metrics"].get(key)
+            if metric is None:
+                metric = family["metrics"][key] = factory()
+            return metric
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS, **labels):
+        """Returns the Histogram for this name and label set, creating it on first use."""
+        return self._get("histogram", name, help, labels, lambda: Histogram(buckets))
+
+    def counter(self, name, help, **labels):
+        """Returns the Counter for this name and label set, creating it on first use."""
+        return self._get("counter", name, help, labels, Counter)
+
+    def register_stats(self, prefix, stats, label="key"):
+        """
+        Exports a component's stats() dict on every scrape.
+
+        Args:
+            prefix -> str: metric name prefix, e.g. "rag_cache"
+            stats -> callable returning a dict; numbers become `<prefix>_<key>` gauges,
+                     Histogram snapshots become histograms, and dicts of snapshots
+                     become one histogram labelled by `label`
+            label -> str: label name for nested histogram dicts (default: "key")
+        """
+        with self._lock:
+            self._collectors[prefix] = (stats, label)
+
+    def render(self):
+        """Returns every metric in the Prometheus text format (version 0.0.4)."""
+        lines = []
+        with self._lock:
+            families = {name: (family["type"], family["help"], dict(family["metrics"]))
+                        for name, family in self._families.items()}
+            collectors = dict(self._collectors)
+
+        for name, (kind, help, metrics) in sorted(families.items()):
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+            for labels, metric in sorted(metrics.items()):
+                if kind == "counter":
+                    lines.append(f"{name}_total{_format_labels(labels)} {_format_value(metric.value)}")
+                else:
+                    lines += self._histogram_lines(name, labels, metric.snapshot())
+
+        for prefix, (stats, label) in sorted(collectors.items()):
+            try:
+                values = stats()
+            except Exception:
+                continue
+            lines += self._stats_lines(prefix, values, label)
+
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _histogram_lines(name, labels, snapshot):
+        lines = []
+        cumulative = 0
+        for bound, count in snapshot["buckets"].items():
+            cumulative += count
+            lines.append(f"{name}_bucket{_format_labels(labels + (('le', bound),))} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(snapshot['sum'])}")
+        lines.append(f"{name}_count{_format_labels(labels)} {snapshot['count']}")
+        return lines
+
+    def _stats_lines(self, prefix, values, label):
+        lines = []
+        for key, value in values.items():
+            name = f"{prefix}_{key}"
+            if isinstance(value, bool):
+                value = int(value)
+            if isinstance(value, (int, float)):
+                lines += [f"# TYPE {name} gauge", f"{name} {_format_value(value)}"]
+            elif _is_histogram_snapshot(value):
+                lines += [f"# TYPE {name} histogram"] + self._histogram_lines(name, (), value)
+            elif isinstance(value, dict) and value and all(map(_is_histogram_snapshot, value.values())):
+                lines.append(f"# TYPE {name} histogram")
+                for sub, snapshot in value.items():
+                    lines += self._histogram_lines(name, ((label, sub),), snapshot)
+        return lines
+
+
+# Process-wide registry served on /metrics
+REGISTRY = Registry()
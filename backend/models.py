@@ -1,34 +1,182 @@
-from langchain_openai import ChatOpenAI
-from langchain_huggingface import HuggingFaceEmbeddings
+import httpx
+import json
 import os
 
 
+def create_http_clients():
+    """
+    Creates the pooled HTTP clients shared by every request to `BASE_URL`.
+
+    Connections are kept alive between calls so that only the first request
+    pays for the TCP/TLS handshake. Pool sizes are read from the environment:
+
+        LLM_MAX_CONNECTIONS -> int: Maximum open connections (default: 100).
+        LLM_MAX_KEEPALIVE_CONNECTIONS -> int: Idle connections kept in the pool (default: 20).
+        LLM_KEEPALIVE_EXPIRY -> float: Seconds an idle connection is kept (default: 30).
+        LLM_TIMEOUT -> float: Request timeout in seconds (default: 60).
+
+    Returns:
+        (httpx.Client, httpx.AsyncClient): sync and async pooled clients
+    """
+    limits = httpx.Limits(
+        max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20")),
+        keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30")),
+    )
+    timeout = httpx.Timeout(float(os.getenv("LLM_TIMEOUT", "60")))
+
+    return httpx.Client(limits=limits, timeout=timeout), httpx.AsyncClient(limits=limits, timeout=timeout)
+
+
+def _endpoint_specs(model):
+    """Reads the endpoint list from LLM_ENDPOINTS, or builds it from BASE_URL / MODEL / LLM_FALLBACK_MODEL."""
+    if os.getenv("LLM_ENDPOINTS"):
+        return json.loads(os.getenv("LLM_ENDPOINTS"))
+    specs = [{"name": "primary", "model": os.getenv("MODEL", model)}]
+    if os.getenv("LLM_FALLBACK_MODEL"):
+        specs.append({"name": "fallback", "model": os.getenv("LLM_FALLBACK_MODEL"), "fallback": True})
+    return specs
+
+
 def create_chat_model(
     model="llama3-70b-8192",
+    http_client=None,
+    http_async_client=None,
 ):
     """
     Creates and returns a configured instance of the LLM model.
 
+    By default the model is an LLMGateway (see gateway.py) over one or more
+    OpenAI-compatible endpoints, configured from the environment:
+
+        LLM_GATEWAY -> "true" or "false"; false returns a plain client for BASE_URL (default: "true").
+        LLM_ENDPOINTS -> JSON list of {"name", "base_url", "api_key" or "api_key_env", "model", "fallback"};
+                         missing keys default to BASE_URL, API_KEY and MODEL (default: one endpoint at BASE_URL).
+        LLM_FALLBACK_MODEL -> str: smaller model on BASE_URL used while the primary is failing (default: none).
+        LLM_DEADLINE -> float: Seconds a call may take including retries and hedges (default: LLM_TIMEOUT or 60).
+        LLM_MAX_RETRIES -> int: Retries on rate-limit, timeout and server errors (default: 2).
+        LLM_HEDGE_AFTER -> "p95", seconds, or "off": when to send a hedged copy of a slow call (default: "p95").
+        LLM_HEDGE_BUDGET -> float: Largest share of calls that may be hedged (default: 0.1).
+        LLM_BREAKER_FAILURES -> int: Consecutive failures that open an endpoint's circuit breaker (default: 5).
+        LLM_BREAKER_RESET -> float: Seconds before an open breaker lets a probe call through (default: 30).
+
     Args:
-        model -> str: The model to use (default: "mixtral-8x7b-32768").
-        temperature -> float: Sampling temperature for randomness (default: 0).
-        max_tokens -> int or None: Maximum number of tokens to generate (default: None).
-        timeout -> int or None: Timeout for requests in seconds (default: None).
-        max_retries -> int: Number of retries on request failures (default: 2).
+        model -> str: The model to use (default: "llama3-70b-8192").
+        http_client -> httpx.Client or None: Pooled client reused across calls (default: None).
+        http_async_client -> httpx.AsyncClient or None: Pooled async client reused across calls (default: None).
 
     Returns:
         LLM: Configured LLM model instance
     """
-    return ChatOpenAI(model=os.getenv("MODEL", model),base_url=os.getenv("BASE_URL"),api_key=os.getenv("API_KEY"))
+    # Imported on first use: the OpenAI SDK takes most of a second to import
+    from langchain_openai import ChatOpenAI
+
+    if os.getenv("LLM_GATEWAY", "true").lower() != "true":
+        return ChatOpenAI(
+            model=os.getenv("MODEL", model),
+            base_url=os.getenv("BASE_URL"),
+            api_key=os.getenv("API_KEY"),
+            http_client=http_client,
+            http_async_client=http_async_client,
+        )
+
+    from gateway import CircuitBreaker, Endpoint, LLMGateway
 
-def create_hugging_face_embedding_model(model_name="sentence-transformers/all-MiniLM-L6-v2"):
+    endpoints = []
+    for number, spec in enumerate(_endpoint_specs(model)):
+        api_key = spec.get("api_key") or os.getenv(spec.get("api_key_env", "API_KEY"))
+        endpoints.append(Endpoint(
+            spec.get("name", f"endpoint-{number}"),
+            ChatOpenAI(
+                model=spec.get("model", os.getenv("MODEL", model)),
+                base_url=spec.get("base_url", os.getenv("BASE_URL")),
+                api_key=api_key,
+                http_client=http_client,
+                http_async_client=http_async_client,
+                # The gateway retries, on another endpoint when it can
+                max_retries=0,
+            ),
+            fallback=spec.get("fallback", False),
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+                reset_timeout=float(os.getenv("LLM_BREAKER_RESET", "30")),
+            ),
+        ))
+
+    hedge_after = os.getenv("LLM_HEDGE_AFTER", "p95").lower()
+    return LLMGateway(
+        endpoints=endpoints,
+        deadline=float(os.getenv("LLM_DEADLINE", os.getenv("LLM_TIMEOUT", "60"))),
+        max_retries=int(os.getenv("LLM_MAX_RETRIES", "2")),
+        hedge_after=None if hedge_after == "off" else hedge_after if hedge_after == "p95" else float(hedge_after),
+        hedge_budget=float(os.getenv("LLM_HEDGE_BUDGET", "0.1")),
+    )
+
+# Default ONNX exports shipped in the sentence-transformers model repos
+ONNX_FILES = {
+    "onnx": "onnx/model.onnx",
+    "onnx-int8": "onnx/model_quint8_avx2.onnx",
+}
+
+def create_hugging_face_embedding_model(model_name="sentence-transformers/all-MiniLM-L6-v2", backend=None, threads=None):
     """
     Creates and returns a configured instance of the huggingface embeddings model.
 
+    The inference backend and thread count are read from the environment
+    unless given:
+
+        EMBED_BACKEND -> "torch", "onnx" or "onnx-int8" (default: "torch").
+                         The ONNX backends need `optimum[onnxruntime]`.
+        EMBED_THREADS -> int: Intra-op threads per process (default: the library default, all cores).
+        EMBED_ONNX_FILE -> str: ONNX file inside the model repo
+                           (default: "onnx/model.onnx", or "onnx/model_quint8_avx2.onnx" for onnx-int8).
+
     Args:
         model_name -> str: The model to use (default: "sentence-transformers/all-MiniLM-L6-v").
+        backend -> str or None: Overrides EMBED_BACKEND.
+        threads -> int or None: Overrides EMBED_THREADS.
 
     Returns:
         HuggingFaceEmbeddings: Configured HuggingFaceEmbeddings model instance
     """
-    return HuggingFaceEmbeddings(model_name=model_name, cache_folder="./hf_cache")
\ No newline at end of file
+    # Imported on first use: sentence-transformers pulls in torch, which takes seconds to import
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    backend = (backend or os.getenv("EMBED_BACKEND", "torch")).lower()
+    threads = threads or int(os.getenv("EMBED_THREADS", "0")) or None
+
+    if backend == "torch":
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        return HuggingFaceEmbeddings(model_name=model_name, cache_folder="./hf_cache")
+
+    if backend not in ONNX_FILES:
+        raise ValueError(f"Unknown EMBED_BACKEND '{backend}', expected torch, onnx or onnx-int8")
+
+    import onnxruntime
+
+    session_options = onnxruntime.SessionOptions()
+    if threads:
+        session_options.intra_op_num_threads = threads
+        session_options.inter_op_num_threads = 1
+
+    return HuggingFaceEmbeddings(
+        model_name=model_name,
+        cache_folder="./hf_cache",
+        model_kwargs={
+            "backend": "onnx",
+            "model_kwargs": {
+                "file_name": os.getenv("EMBED_ONNX_FILE", ONNX_FILES[backend]),
+                "provider": "CPUExecutionProvider",
+                "session_options": session_options,
+            },
+        },
+    )
+
+def warm_up_embedding_model(model):
+    """
+    Runs one forward pass so weights are paged in and kernels initialized
+    before the first real query pays for it.
+    """
+    model.embed_query("warm-up")
@@ -0,0 +1,112 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+# Modules whose frames mean a thread is blocked rather than working
+IDLE_MODULES = ("threading.py", "selectors.py", "queue.py", "socket.py", "ssl.py")
+
+# Functions that block inside C code, leaving themselves as the innermost Python frame
+IDLE_FUNCTIONS = (("thread.py", "_worker"),)
+
+_profile_lock = threading.Lock()
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler for a running server. A background thread samples
+    the stack of every other thread at a fixed interval, so the overhead is
+    independent of how much code runs and nothing has to be restarted.
+
+    Stacks are aggregated in the collapsed format ("thread;outer;...;inner count")
+    read by flamegraph.pl, speedscope and similar tools.
+
+    Args:
+        interval -> float: Seconds between samples (default: 0.01).
+        include_idle -> bool: Keep stacks of threads blocked in locks, queues and sockets (default: False).
+    """
+
+    def __init__(self, interval=0.01, include_idle=False):
+        self.interval = interval
+        self.include_idle = include_idle
+        self.samples = 0
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+        self._caller = None
+
+    def start(self):
+        # The thread that started the profile is only waiting for it
+        self._caller = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        return self
+
+    def _run(self):
+        skipped = {threading.get_ident(), self._caller}
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident in skipped:
+                    continue
+                stack = self._stack(frame)
+                if stack is not None:
+                    self.stacks[";".join([names.get(ident, str(ident))] + stack)] += 1
+            self.samples += 1
+
+    def _stack(self, frame):
+        if not self.include_idle:
+            module = os.path.basename(frame.f_code.co_filename)
+            if module in IDLE_MODULES or (module, frame.f_code.co_name) in IDLE_FUNCTIONS:
+                return None
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        return stack[::-1]
+
+    def collapsed(self):
+        """Returns the sampled stacks in collapsed format, most frequent first."""
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+    def top(self, limit=20):
+        """Returns the functions most often on top of a sampled stack, with their share of samples."""
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return [{"function": function, "samples": count, "share": round(count / total, 4)}
+                for function, count in leaves.most_common(limit)]
+
+
+def profile(seconds, interval=0.01, include_idle=False):
+    """
+    Samples all threads for `seconds` and returns the profiler.
+    Only one profile runs at a time.
+
+    Throws:
+        RuntimeError -> if another profile is already running
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise RuntimeError("A profile is already running.")
+    try:
+        profiler = SamplingProfiler(interval, include_idle).start()
+        time.sleep(seconds)
+        return profiler.stop()
+    finally:
+        _profile_lock.release()
+
+
+def profiling_enabled():
+    """PROFILING_ENABLED -> "true" exposes the on-demand profiler at /debug/profile (default: "false")."""
+    return os.getenv("PROFILING_ENABLED", "false").lower() == "true"
@@ -1,4 +1,4 @@
-from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 
 def rag_retrieval_prompt():
     """
@@ -22,15 +22,56 @@ def rag_retrieval_prompt():
     
     user_msg = "Answer the question: {query}, considering the following context: {context}"
     
+    # Earlier turns of the conversation, when the request belongs to a session
     prompt_template = ChatPromptTemplate([
         ("system", system_msg),
+        MessagesPlaceholder("history", optional=True),
         ("user", user_msg)
     ])
     
     return prompt_template
 
 
+def condense_question_prompt():
+    """
+    Generates a prompt that rewrites a follow-up question into a standalone
+    question, so retrieval does not depend on the conversation.
+
+    Returns:
+        ChatPromptTemplate -> Configured ChatPromptTemplate instance
+    """
+
+    system_msg = (
+        "Rewrite the user's last question as a single standalone question that can be understood "
+        "without the conversation, resolving pronouns and references. Keep names, codes and terms exactly. "
+        "If it is already standalone, return it unchanged. Return only the question."
+    )
+
+    user_msg = "Conversation:\n{history}\n\nLast question: {query}\n\nStandalone question:"
+
+    return ChatPromptTemplate([
+        ("system", system_msg),
+        ("user", user_msg)
+    ])
+
 
+def summarize_history_prompt():
+    """
+    Generates a prompt that folds older conversation turns into a running summary.
+
+    Returns:
+        ChatPromptTemplate -> Configured ChatPromptTemplate instance
+    """
 
+    system_msg = (
+        "You maintain a running summary of a conversation between a user and an assistant. "
+        "Extend the current summary with the new turns. Keep facts, names, numbers and open questions "
+        "the user may refer back to; drop greetings and repetition. Use at most {max_words} words."
+    )
 
+    user_msg = "Current summary:\n{summary}\n\nNew turns:\n{turns}\n\nUpdated summary:"
 
+    return ChatPromptTemplate([
+        ("system", system_msg),
+        ("user", user_msg)
+    ])
@@ -0,0 +1,118 @@
+import os
+
+import numpy as np
+from bson.binary import Binary, BinaryVectorDtype
+
+# How embeddings are written to MongoDB
+STORAGE_FORMATS = ("list", "float32", "int8")
+
+# Quantization Atlas can apply to float vectors when building the index
+INDEX_QUANTIZATIONS = ("none", "scalar", "binary")
+
+
+def quantize_int8(vector):
+    """
+    Scales a vector into int8 so its largest component maps to +/-127.
+    Cosine similarity is scale-invariant, so the per-vector scale is not kept.
+    """
+    vector = np.asarray(vector, dtype=np.float32)
+    peak = float(np.abs(vector).max()) or 1.0
+    return np.round(vector * (127 / peak)).astype(np.int8)
+
+
+def encode_vector(vector, storage):
+    """
+    Encodes an embedding for MongoDB.
+
+    Args:
+        vector -> list of floats
+        storage -> "list" (BSON array of doubles, ~12 bytes per dimension),
+                   "float32" (packed BSON binary vector, 4 bytes per dimension) or
+                   "int8" (scalar-quantized BSON binary vector, 1 byte per dimension)
+    """
+    if storage == "list":
+        return [float(value) for value in vector]
+    if storage == "float32":
+        return Binary.from_vector(np.asarray(vector, dtype=np.float32).tolist(), BinaryVectorDtype.FLOAT32)
+    if storage == "int8":
+        return Binary.from_vector(quantize_int8(vector).tolist(), BinaryVectorDtype.INT8)
+    raise ValueError(f"Unknown vector storage '{storage}', expected one of {STORAGE_FORMATS}")
+
+
+def decode_vector(value):
+    """Decodes a stored embedding (array or BSON binary vector) into a float32 numpy array."""
+    if isinstance(value, Binary):
+        return np.asarray(value.as_vector().data, dtype=np.float32)
+    return np.asarray(value, dtype=np.float32)
+
+
+def rescore(query_vector, results, k, field="embedding"):
+    """
+    Re-ranks approximate search results by exact cosine similarity between
+    the query and each result's stored vector, and keeps the best k.
+
+    Args:
+        query_vector -> list of floats
+        results -> list of dicts holding the stored vector under `field`
+        k -> int: results kept
+        field -> str: name of the vector field, removed from the results
+
+    Returns:
+        list of the k best results with "score" set to the exact cosine similarity
+    """
+    if not results:
+        return []
+    query = np.asarray(query_vector, dtype=np.float32)
+    query /= np.linalg.norm(query) or 1.0
+    vectors = np.stack([decode_vector(result.pop(field)) for result in results])
+    norms = np.linalg.norm(vectors, axis=1)
+    scores = vectors @ query / np.where(norms == 0, 1, norms)
+    for result, score in zip(results, scores):
+        result["score"] = float(score)
+    return sorted(results, key=lambda result: result["score"], reverse=True)[:k]
+
+
+class VectorStorageConfig:
+    """
+    How embeddings are stored, indexed and searched on Atlas.
+
+    Attributes:
+        storage -> one of STORAGE_FORMATS
+        quantization -> one of INDEX_QUANTIZATIONS (ignored for int8 storage, which is already quantized)
+        rescore_factor -> int: with a quantized index over float storage, fetch k * rescore_factor
+                          candidates and rescore them locally against their full-precision vectors;
+                          1 disables rescoring. int8 storage keeps no full-precision copy, so it is
+                          never rescored
+    """
+
+    def __init__(self, storage="list", quantization="none", rescore_factor=4):
+        if storage not in STORAGE_FORMATS:
+            raise ValueError(f"Unknown vector storage '{storage}', expected one of {STORAGE_FORMATS}")
+        if quantization not in INDEX_QUANTIZATIONS:
+            raise ValueError(f"Unknown index quantization '{quantization}', expected one of {INDEX_QUANTIZATIONS}")
+        self.storage = storage
+        self.quantization = "none" if storage == "int8" else quantization
+        self.rescore_factor = max(1, rescore_factor)
+
+    @property
+    def quantized(self):
+        return self.storage == "int8" or self.quantization != "none"
+
+    @property
+    def rescoring(self):
+        return self.quantization != "none" and self.rescore_factor > 1
+
+
+def get_vector_storage_config():
+    """
+    Reads the vector storage settings from the environment.
+
+        VECTOR_STORAGE -> "list", "float32" or "int8" (default: "list").
+        VECTOR_INDEX_QUANTIZATION -> "none", "scalar" or "binary" (default: "none").
+        VECTOR_RESCORE_FACTOR -> int: candidates fetched per result for local rescoring with a quantized index (default: 4).
+    """
+    return VectorStorageConfig(
+        storage=os.getenv("VECTOR_STORAGE", "list").lower(),
+        quantization=os.getenv("VECTOR_INDEX_QUANTIZATION", "none").lower(),
+        rescore_factor=int(os.getenv("VECTOR_RESCORE_FACTOR", "4")),
+    )
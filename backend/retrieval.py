@@ -0,0 +1,480 @@
+import asyncio
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from langchain_core.documents import Document
+from langchain_mongodb import MongoDBAtlasVectorSearch
+
+try:
+    import fcntl
+except ImportError:  # Windows: one server process per index
+    fcntl = None
+
+from db import (
+    aretrieve_from_db, retrieve_from_db, iter_stored_documents, stored_document_ids, register_ingest_listener,
+    register_delete_listener,
+)
+from filters import matches
+from metrics import Histogram
+from vectorstores import LocalVectorStore
+
+_TOKEN = re.compile(r"\w+(?:[-./:]\w+)*")
+
+
+def tokenize(text):
+    """
+    Lower-cased word tokens. Compound terms such as error codes, versions or
+    paths ("ERR-404", "v1.2.3") are kept whole and also split into their
+    parts, so both exact and partial mentions match.
+    """
+    tokens = []
+    for match in _TOKEN.findall(text.lower()):
+        tokens.append(match)
+        if not match.isalnum() and "_" not in match:
+            tokens.extend(re.findall(r"\w+", match))
+    return tokens
+
+
+def document_key(doc):
+    """Identity of a retrieved chunk across retrievers: its id, its Mongo _id, or its text."""
+    return doc.id or doc.metadata.get("_id") or doc.page_content
+
+
+class LexicalIndex:
+    """
+    In-process BM25 inverted index over the stored chunks.
+
+    Changes are appended to a JSON-lines log that is replayed on startup, and
+    the log is compacted when most of it describes deleted chunks. Several
+    server worker processes can share one log: writes hold a lock file, and
+    every read first applies the records other processes appended since.
+
+    Args:
+        path -> str or None: log file (None keeps the index in memory only)
+        k1, b -> float: BM25 term-frequency saturation and length normalization
+    """
+
+    def __init__(self, path=None, k1=1.5, b=0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._lock_file = None
+        self._lock_depth = 0
+        self._reset()
+
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            if fcntl is not None:
+                self._lock_file = open(f"{path}.lock", "a")
+            with self.exclusive():
+                if self._records > 2 * len(self._documents) + 1000:
+                    self._compact()
+
+    def _reset(self):
+        self._postings = defaultdict(dict)
+        self._lengths = {}
+        self._documents = {}
+        self._total_length = 0
+        self._records = 0
+        self._offset = 0
+        self._inode = None
+
+    def _catch_up(self):
+        """Applies the log records appended since the last read; rebuilds if the log was compacted."""
+        if not self.path:
+            return
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if self._inode is not None and (stat.st_ino != self._inode or stat.st_size < self._offset):
+            self._reset()
+        self._inode = stat.st_ino
+        if stat.st_size == self._offset:
+            return
+
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # still being written by another process
+                self._offset += len(line)
+                record = json.loads(line)
+                self._records += 1
+                if record["op"] == "add":
+                    self._add(record["id"], Document(page_content=record["text"], metadata=record["metadata"]))
+                else:
+                    self._delete(record["ids"])
+
+    @contextmanager
+    def exclusive(self):
+        """Holds the index against writers in this and other processes, caught up with the log."""
+        with self._lock:
+            if self._lock_depth == 0 and self._lock_file is not None:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                self._catch_up()
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0 and self._lock_file is not None:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _compact(self):
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as f:
+            for id, doc in self._documents.items():
+                f.write(json.dumps({"op": "add", "id": id, "text": doc.page_content, "metadata": doc.metadata}) + "\n")
+        os.replace(temp_path, self.path)
+        stat = os.stat(self.path)
+        self._inode, self._offset, self._records = stat.st_ino, stat.st_size, len(self._documents)
+
+    def _append(self, records):
+        if not self.path:
+            return
+        lines = "".join(json.dumps(record) + "\n" for record in records).encode()
+        with open(self.path, "ab") as f:
+            f.write(lines)
+        self._offset += len(lines)
+        self._inode = os.stat(self.path).st_ino
+
+    def _add(self, id, doc):
+        if id in self._documents:
+            self._delete([id])
+        counts = Counter(tokenize(doc.page_content))
+        for term, count in counts.items():
+            self._postings[term][id] = count
+        length = sum(counts.values())
+        self._lengths[id] = length
+        self._total_length += length
+        self._documents[id] = doc
+
+    def _delete(self, ids):
+        for id in ids:
+            doc = self._documents.pop(id, None)
+            if doc is None:
+                continue
+            for term in set(tokenize(doc.page_content)):
+                postings = self._postings.get(term)
+                if postings is not None:
+                    postings.pop(id, None)
+                    if not postings:
+                        del self._postings[term]
+            self._total_length -= self._lengths.pop(id)
+
+    def add(self, ids, documents):
+        """Indexes documents under their ids; re-adding an id replaces it. Usable as an ingest listener."""
+        with self.exclusive():
+            for id, doc in zip(ids, documents):
+                self._add(id, Document(page_content=doc.page_content, metadata=doc.metadata))
+            self._append(
+                {"op": "add", "id": id, "text": doc.page_content, "metadata": doc.metadata}
+                for id, doc in zip(ids, documents)
+            )
+
+    def delete(self, ids):
+        """Removes documents by id. Usable as a delete listener."""
+        with self.exclusive():
+            ids = [id for id in ids if id in self._documents]
+            self._delete(ids)
+            if ids:
+                self._append([{"op": "delete", "ids": ids}])
+
+    def search(self, query, k=4, filters=None):
+        """
+        Ranks the indexed chunks by BM25 score for the query.
+
+        Args:
+            query -> str
+            k -> int: results returned
+            filters -> dict or None: normalized metadata filters; only matching chunks are scored
+
+        Returns:
+            list of (Document with id set, score), best first
+        """
+        with self._lock:
+            self._catch_up()
+            total = len(self._documents)
+            if not total:
+                return []
+            average_length = self._total_length / total
+            scores = defaultdict(float)
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+                for id, frequency in postings.items():
+                    if filters and not matches(self._documents[id].metadata, filters):
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[id] / average_length)
+                    scores[id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+            top = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+            return [
+                (Document(id=id, page_content=self._documents[id].page_content, metadata=self._documents[id].metadata), score)
+                for id, score in top
+            ]
+
+    def ids(self):
+        """Returns the ids of the indexed chunks."""
+        with self.exclusive():
+            return list(self._documents)
+
+    def __contains__(self, id):
+        return id in self._documents
+
+    def __len__(self):
+        return len(self._documents)
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Merges several ranked lists of documents: each document scores
+    sum(1 / (k + rank)) over the lists it appears in. The first list's copy
+    of a document is kept.
+
+    Args:
+        rankings -> list of lists of Document, each best first
+        k -> int: damping constant; larger values flatten the rank contribution
+
+    Returns:
+        list of Document, best first
+    """
+    scores = defaultdict(float)
+    documents = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = document_key(doc)
+            scores[key] += 1 / (k + rank)
+            documents.setdefault(key, doc)
+    return [documents[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+
+class CrossEncoderReranker:
+    """
+    Re-scores (query, chunk) pairs with a cross-encoder on the CPU and keeps the best.
+
+    Args:
+        model_name -> str: sentence-transformers cross-encoder model
+        batch_size -> int: pairs scored per forward pass
+    """
+
+    def __init__(self, model_name="cross-encoder/ms-marco-MiniLM-L-6-v2", batch_size=32):
+        from sentence_transformers import CrossEncoder
+
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.model = CrossEncoder(model_name, device="cpu", cache_folder="./hf_cache")
+
+    def rerank(self, query, documents, top_k):
+        if not documents:
+            return []
+        scores = self.model.predict([(query, doc.page_content) for doc in documents], batch_size=self.batch_size)
+        ranked = sorted(zip(scores, range(len(documents))), reverse=True)[:top_k]
+        return [documents[i] for _, i in ranked]
+
+
+class HybridRetriever:
+    """
+    Retrieval pipeline: dense vector search and BM25 lexical search, merged
+    with reciprocal-rank fusion and optionally re-ranked by a cross-encoder.
+
+    Each retriever returns `candidates` chunks when fusing or re-ranking and
+    the result is trimmed to `k`. Per-stage latencies (embed, dense, lexical,
+    fusion, rerank, total) are recorded in histograms.
+
+    Args:
+        vectorstore -> vector store for dense search
+        lexical_index -> LexicalIndex, required unless mode is "dense"
+        mode -> "dense", "lexical" or "hybrid"
+        k -> int: chunks returned
+        candidates -> int: chunks taken from each retriever before fusion / re-ranking
+        rrf_k -> int: reciprocal-rank fusion constant
+        reranker -> CrossEncoderReranker or None
+    """
+
+    STAGES = ("embed", "dense", "lexical", "fusion", "rerank", "total")
+
+    def __init__(self, vectorstore, lexical_index=None, mode="hybrid", k=4, candidates=20, rrf_k=60, reranker=None):
+        if mode not in ("dense", "lexical", "hybrid"):
+            raise ValueError(f"Unknown retrieval mode '{mode}'")
+        self.vectorstore = vectorstore
+        self.lexical_index = lexical_index
+        self.mode = mode
+        self.k = k
+        self.candidates = max(candidates, k)
+        self.rrf_k = rrf_k
+        self.reranker = reranker
+        self.latency = {stage: Histogram() for stage in self.STAGES}
+
+    @contextmanager
+    def _timed(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.latency[stage].observe(time.perf_counter() - start)
+
+    @property
+    def _depth(self):
+        return self.candidates if self.mode == "hybrid" or self.reranker is not None else self.k
+
+    def _lexical(self, query, filters=None):
+        with self._timed("lexical"):
+            return [doc for doc, _ in self.lexical_index.search(query, self._depth, filters)]
+
+    def _combine(self, query, dense, lexical):
+        rankings = [ranking for ranking in (dense, lexical) if ranking is not None]
+        if len(rankings) > 1:
+            with self._timed("fusion"):
+                documents = reciprocal_rank_fusion(rankings, self.rrf_k)
+        else:
+            documents = rankings[0]
+
+        if self.reranker is not None:
+            with self._timed("rerank"):
+                return self.reranker.rerank(query, documents, self.k)
+        return documents[: self.k]
+
+    def retrieve(self, query, query_vector=None, filters=None):
+        """
+        Returns the top-k chunks for the query.
+
+        Args:
+            query -> str
+            query_vector -> list[float] or None: precomputed query embedding
+            filters -> dict or None: normalized metadata filters applied by both retrievers
+        """
+        with self._timed("total"):
+            dense = lexical = None
+            if self.mode != "lexical":
+                if query_vector is None:
+                    with self._timed("embed"):
+                        query_vector = self.vectorstore.embeddings.embed_query(query)
+                with self._timed("dense"):
+                    dense = retrieve_from_db(query, self.vectorstore, query_vector=query_vector, k=self._depth, filters=filters)
+            if self.mode != "dense":
+                lexical = self._lexical(query, filters)
+            return self._combine(query, dense, lexical)
+
+    async def aretrieve(self, query, query_vector=None, async_collection=None, filters=None):
+        """
+        Async variant of retrieve; dense and lexical search run concurrently
+        and CPU-bound stages run off the event loop.
+
+        Args:
+            query -> str
+            query_vector -> list[float] or None: precomputed query embedding
+            async_collection -> AsyncCollection for $vectorSearch (default: vector store's async search)
+            filters -> dict or None: normalized metadata filters applied by both retrievers
+        """
+        with self._timed("total"):
+            async def dense_search():
+                nonlocal query_vector
+                if query_vector is None:
+                    with self._timed("embed"):
+                        query_vector = await self.vectorstore.embeddings.aembed_query(query)
+                with self._timed("dense"):
+                    return await aretrieve_from_db(
+                        query, self.vectorstore, async_collection, k=self._depth, query_vector=query_vector, filters=filters
+                    )
+
+            async def none():
+                return None
+
+            dense, lexical = await asyncio.gather(
+                dense_search() if self.mode != "lexical" else none(),
+                asyncio.to_thread(self._lexical, query, filters) if self.mode != "dense" else none(),
+            )
+            if self.reranker is None:
+                return self._combine(query, dense, lexical)
+            return await asyncio.to_thread(self._combine, query, dense, lexical)
+
+    def stats(self):
+        """Returns the configuration and per-stage latency histograms."""
+        return {
+            "mode": self.mode,
+            "k": self.k,
+            "candidates": self.candidates,
+            "reranker": self.reranker.model_name if self.reranker is not None else None,
+            "lexical_documents": len(self.lexical_index) if self.lexical_index is not None else None,
+            "latency": {stage: histogram.snapshot() for stage, histogram in self.latency.items()},
+        }
+
+
+def create_lexical_index(vectorstore, path=None):
+    """
+    Opens the BM25 index kept next to the vector store and keeps it in sync
+    with ingestion. When its ids differ from the vector store's, it is
+    first reconciled: stored chunks it lacks (e.g. ingested while
+    RETRIEVAL_MODE was dense, or by another deployment) are added and chunks
+    no longer stored are removed. Chunks other deployments write while the
+    server runs are picked up at the next start.
+
+        LEXICAL_INDEX_PATH -> str: index log file (default: "lexical.jsonl" in the local store
+                              directory, or "./lexical_index/index.jsonl" for Atlas).
+    """
+    if path is None:
+        default = os.path.join(vectorstore.path, "lexical.jsonl") if isinstance(vectorstore, LocalVectorStore) \
+            else "./lexical_index/index.jsonl"
+        path = os.getenv("LEXICAL_INDEX_PATH", default)
+
+    index = LexicalIndex(path)
+    # Held while reconciling so only the first of several worker processes does it
+    with index.exclusive():
+        stored = stored_document_ids(vectorstore)
+        indexed = set(index.ids())
+        if stored != indexed:
+            missing, batch, added = stored - indexed, [], 0
+            if missing:
+                for id, doc in iter_stored_documents(vectorstore):
+                    if id in missing:
+                        batch.append((id, doc))
+                    if len(batch) >= 1000:
+                        index.add(*zip(*batch))
+                        added, batch = added + len(batch), []
+                if batch:
+                    index.add(*zip(*batch))
+                    added += len(batch)
+            removed = list(indexed - stored)
+            index.delete(removed)
+            print(f"Lexical index reconciled with the vector store: {added} chunks added, {len(removed)} removed.")
+
+    register_ingest_listener(index.add)
+    register_delete_listener(index.delete)
+    return index
+
+
+def create_retriever(vectorstore):
+    """
+    Builds the retrieval pipeline from the environment.
+
+        RETRIEVAL_MODE -> "dense", "lexical" or "hybrid" (default: "dense" on Atlas, whose chunks every
+                          worker would otherwise mirror into its own BM25 index, "hybrid" otherwise).
+        RETRIEVAL_K -> int: chunks passed to the LLM (default: 4).
+        RETRIEVAL_CANDIDATES -> int: chunks per retriever before fusion / re-ranking (default: 20).
+        RETRIEVAL_RRF_K -> int: reciprocal-rank fusion constant (default: 60).
+        RERANKER_MODEL -> str: cross-encoder model name; unset disables re-ranking.
+        RERANKER_BATCH_SIZE -> int: pairs per cross-encoder forward pass (default: 32).
+    """
+    default_mode = "dense" if isinstance(vectorstore, MongoDBAtlasVectorSearch) else "hybrid"
+    mode = os.getenv("RETRIEVAL_MODE", default_mode).lower()
+    reranker_model = os.getenv("RERANKER_MODEL")
+    return HybridRetriever(
+        vectorstore,
+        lexical_index=create_lexical_index(vectorstore) if mode != "dense" else None,
+        mode=mode,
+        k=int(os.getenv("RETRIEVAL_K", "4")),
+        candidates=int(os.getenv("RETRIEVAL_CANDIDATES", "20")),
+        rrf_k=int(os.getenv("RETRIEVAL_RRF_K", "60")),
+        reranker=CrossEncoderReranker(reranker_model, int(os.getenv("RERANKER_BATCH_SIZE", "32"))) if reranker_model else None,
+    )
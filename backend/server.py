@@ -1,14 +1,35 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Depends
+from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, Query
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 import os
+import json
 import shutil
+import tempfile
+import threading
+import time
 from pathlib import Path
 from typing import Optional
 from uuid import uuid4
-from db import initialize_db, store_pdf_in_db, store_url_in_db
+from batch import create_batch_runner
+from db import initialize_db, initialize_async_collection, store_pdf_in_db, store_url_in_db, store_crawl_in_db, register_ingest_listener, register_delete_listener
+from cache import create_response_cache
+from context import create_context_builder
+from filters import normalize_filters
+from ingest import shutdown_embedding_pool
+from chunking import shutdown_chunking_pool
+from jobs import create_job_queue
+from limiter import create_invoke_limiter, OverloadedError
+from metrics import REGISTRY
+from profiler import profile, profiling_enabled
+from retrieval import create_retriever
+from sessions import create_conversation_memory
+from startup import StartupState
+from tracing import recent_traces
 
 
-from chains import invoke_llm
+from chains import ainvoke_llm, astream_llm, create_rag_chain
+from models import create_chat_model, create_http_clients
 
 
 from dotenv import load_dotenv
@@ -17,88 +38,543 @@ load_dotenv()
 
 app = FastAPI()
 
+
+class RequestMetricsMiddleware:
+    """Records http_request_duration_seconds per method, route and status, including streamed bodies."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REGISTRY.histogram(
+                "http_request_duration_seconds", "HTTP request latency until the last body chunk is sent.",
+                method=scope["method"], route=route, status=status,
+            ).observe(time.perf_counter() - start)
+
+
+app.add_middleware(RequestMetricsMiddleware)
+
 DATA_DIR = Path("../data")
 os.makedirs(DATA_DIR, exist_ok=True)
 
 # Initialize db only once
 vectorstore = None
 
-@app.on_event("startup")
+# Long-lived LLM client and chain, built once at startup
+http_clients = None
+chat_model = None
+rag_chain = None
+
+# Async driver handle for non-blocking $vectorSearch
+async_collection = None
+
+# Dense + lexical retrieval pipeline over the vector store
+retriever = None
+
+# Bounded concurrency for /invoke, rejects with 503 when saturated
+invoke_limiter = create_invoke_limiter()
+
+# Exact + semantic answer cache, emptied whenever new documents are ingested
+response_cache = create_response_cache()
+if response_cache is not None:
+    register_ingest_listener(response_cache.invalidate)
+    register_delete_listener(response_cache.invalidate)
+
+# Packs retrieved chunks into a deduplicated, token-budgeted prompt context
+context_builder = None
+
+# Server-side chat sessions: recent turns, running summary and follow-up condensation
+conversation = None
+
+# Background ingestion jobs; queries get priority over them for the CPU
+job_queue = create_job_queue()
+
+# Startup phases and component readiness, reported by /readyz
+startup_state = StartupState(required=("db", "embedding_model", "rag_chain"))
+_init_lock = threading.Lock()
+
+# Component counters exported on /metrics, read at scrape time
+REGISTRY.register_stats("rag_ready", lambda: {"state": startup_state.ready})
+REGISTRY.register_stats("rag_invoke_limiter", invoke_limiter.stats)
+REGISTRY.register_stats("rag_cache", lambda: response_cache.stats() if response_cache is not None else {})
+REGISTRY.register_stats("rag_embeddings", lambda: vectorstore.embeddings.stats() if hasattr(getattr(vectorstore, "embeddings", None), "stats") else {})
+REGISTRY.register_stats("rag_retrieval", lambda: retriever.stats() if retriever is not None else {}, label="stage")
+REGISTRY.register_stats("rag_context", lambda: context_builder.stats() if context_builder is not None else {})
+REGISTRY.register_stats("rag_sessions", lambda: conversation.stats() if conversation is not None else {})
+REGISTRY.register_stats("rag_llm_gateway", lambda: chat_model.stats() if hasattr(chat_model, "stats") else {})
+
 def get_db():
     """Initialize db if not already initialized."""
-    global vectorstore
+    global vectorstore, async_collection, retriever
+    with _init_lock:
+        if vectorstore is None:
+            store = initialize_db(startup_state)
+            async_collection = initialize_async_collection()
+            with startup_state.phase("retriever", component="retriever"):
+                retriever = create_retriever(store)
+            vectorstore = store
+            print("Vector store initialized successfully...")
+    return vectorstore
+
+def get_rag_chain():
+    """Build the pooled LLM client and the RAG chain once, unless RAG_CHAIN_REUSE=false."""
+    global http_clients, chat_model, rag_chain, context_builder, conversation
+    with startup_state.phase("rag_chain", component="rag_chain"):
+        if context_builder is None:
+            context_builder = create_context_builder()
+            if context_builder is not None:
+                context_builder.tokenizer.count("warm-up")  # loads the encoding now rather than on the first query
+        llm = None
+        if rag_chain is None and os.getenv("RAG_CHAIN_REUSE", "true").lower() == "true":
+            http_clients = create_http_clients()
+            llm = chat_model = create_chat_model(http_client=http_clients[0], http_async_client=http_clients[1])
+            rag_chain = create_rag_chain(llm)
+            print("RAG chain initialized successfully...")
+        if conversation is None:
+            conversation = create_conversation_memory(llm)
+    return rag_chain
+
+def initialize():
+    """Builds everything the endpoints need, recording how long each phase took."""
+    try:
+        chain = threading.Thread(target=get_rag_chain, name="rag-chain-init")
+        chain.start()
+        get_db()
+        chain.join()
+        print(f"Startup finished: {json.dumps(startup_state.to_dict()['phases_seconds'])}")
+    except Exception as e:
+        print(f"Startup failed: {e}")
+
+@app.on_event("startup")
+def start_initialization():
+    """
+    Starts initialization. With STARTUP_BACKGROUND=true (default) it runs on a
+    background thread so the server accepts connections (and answers /healthz)
+    immediately; /readyz reports when it is done.
+    """
+    if os.getenv("STARTUP_BACKGROUND", "true").lower() == "true":
+        threading.Thread(target=initialize, name="startup", daemon=True).start()
+    else:
+        initialize()
+
+def require_vectorstore():
+    """Dependency that rejects requests with 503 until the vector store is initialized."""
     if vectorstore is None:
-        vectorstore = initialize_db()
-        print("Vector store initialized successfully...")
+        detail = "Vector store initialization failed." if startup_state.failed else "Server is starting up."
+        raise HTTPException(status_code=503, detail=detail, headers={"Retry-After": "5"})
+    return vectorstore
+
+def require_writable_vectorstore(vectorstore=Depends(require_vectorstore)):
+    """
+    Dependency for ingestion: rejects with 409 when several server workers
+    share the local store, whose index each worker holds in its own memory.
+    """
+    if os.getenv("VECTOR_STORE", "atlas").lower() == "local" and int(os.getenv("SERVE_WORKERS", "1")) > 1:
+        raise HTTPException(
+            status_code=409,
+            detail="The local vector store is read-only with several server workers; ingest with one worker or use Atlas.",
+        )
     return vectorstore
 
+@app.get("/healthz")
+def healthz():
+    """Liveness: the process is up and serving requests."""
+    return {"status": "ok", "uptime_seconds": round(time.time() - startup_state.started_at, 3)}
+
+@app.get("/readyz")
+def readyz():
+    """Readiness: 200 once the vector store, embedding model and chain are ready, 503 before."""
+    state = startup_state.to_dict()
+    return JSONResponse(state, status_code=200 if state["ready"] else 503)
+
+@app.on_event("shutdown")
+async def close_http_clients():
+    """Close the pooled LLM connections."""
+    if http_clients is not None:
+        http_clients[0].close()
+        await http_clients[1].aclose()
+
+@app.on_event("shutdown")
+def stop_embedding_pool():
+    """Drain running ingestion jobs (up to SHUTDOWN_TIMEOUT seconds), then stop the embedding and chunking workers."""
+    job_queue.shutdown(timeout=float(os.getenv("SHUTDOWN_TIMEOUT", "30")))
+    shutdown_embedding_pool()
+    shutdown_chunking_pool()
+
 # Request model
 class QueryRequest(BaseModel):
     user_query: str
+    session_id: Optional[str] = None
+    tenant: Optional[str] = None
+    filters: Optional[dict] = None
+
+#Batch Request model
+class BatchQueryRequest(BaseModel):
+    queries: list[str]
+    tenant: Optional[str] = None
+    filters: Optional[dict] = None
 
 #Web URL Request model
 class WebURLRequest(BaseModel):
     url: str
+    tenant: Optional[str] = None
+
+#Crawl Request model
+class CrawlRequest(BaseModel):
+    urls: list[str] = []
+    sitemap: Optional[str] = None
+    max_depth: int = 1
+    max_pages: int = 100
+    same_host: bool = True
+    tenant: Optional[str] = None
+
+def request_filters(request):
+    """
+    Combines a query request's tenant and metadata filters into the
+    normalized filters pushed down into vector search.
+
+    A query without a tenant is not scoped: it retrieves the chunks of every
+    tenant as well as the untagged ones. A query with a tenant retrieves only
+    that tenant's chunks, never the untagged ones. Deployments that rely on tenants for
+    isolation set REQUIRE_TENANT so such queries are rejected.
+
+        REQUIRE_TENANT -> bool: Reject queries that do not name a tenant (default: false).
+
+    Throws:
+        HTTPException 422 -> on a field that is not in FILTER_FIELDS, an unknown operator,
+                             or a missing tenant when REQUIRE_TENANT is set
+    """
+    if request.tenant is None and os.getenv("REQUIRE_TENANT", "false").lower() == "true":
+        raise HTTPException(status_code=422, detail="A tenant is required for queries (REQUIRE_TENANT).")
+    try:
+        return normalize_filters(request.filters, request.tenant)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
 
 @app.post("/invoke")
-def invoke(request: QueryRequest):
+async def invoke(request: QueryRequest, vectorstore=Depends(require_vectorstore)):
     """
     Invoke the AI response
     Args:
-        request (QueryRequest) -> request model with request string
+        request (QueryRequest) -> request model with request string, optional tenant and filters
+                                  such as {"source": ["a.pdf", "b.pdf"], "page": {"$lte": 10}}
     Throws:
+        HTTPException 422 -> if the filters are invalid
+        HTTPException 503 -> if the server is at capacity or still starting up
         e (Exception) -> if any unexpected exception occurs
     """
+    filters = request_filters(request)
     try:
-        response = invoke_llm(request.user_query, vectorstore)
-        return {"response": str(response)}
+        async with invoke_limiter:
+            with job_queue.query_running():
+                response = await ainvoke_llm(
+                    request.user_query, vectorstore, rag_chain, async_collection, response_cache, retriever, context_builder,
+                    conversation, request.session_id, filters,
+                )
+        return {"response": str(response), "session_id": request.session_id}
+    except OverloadedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         print(str(e))
         raise HTTPException(status_code=500, detail=str(e))
+
+def sse_event(data, event=None):
+    """Formats a server-sent event."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+@app.post("/invoke/stream")
+async def invoke_stream(request: QueryRequest, vectorstore=Depends(require_vectorstore)):
+    """
+    Stream the AI response as server-sent events.
+
+    Every token is sent as `data: {"token": ...}`. The stream ends with an
+    `event: metrics` carrying time-to-first-token and tokens/sec, or with an
+    `event: error` if generation fails midway (or no slot frees up within
+    INVOKE_QUEUE_TIMEOUT).
+
+    Args:
+        request (QueryRequest) -> request model with request string, optional tenant and filters
+    Throws:
+        HTTPException 422 -> if the filters are invalid
+        HTTPException 503 -> if the server is at capacity or still starting up
+    """
+    filters = request_filters(request)
+    try:
+        invoke_limiter.check()
+    except OverloadedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+    async def event_stream():
+        # The slot is taken inside the generator so it is released however the stream ends,
+        # including a client that disconnects before the body starts (the generator never runs)
+        metrics = {}
+        try:
+            async with invoke_limiter:
+                with job_queue.query_running():
+                    async for token in astream_llm(
+                        request.user_query, vectorstore, rag_chain, async_collection, metrics, response_cache, retriever,
+                        context_builder, conversation, request.session_id, filters,
+                    ):
+                        yield sse_event({"token": token})
+            yield sse_event(metrics, event="metrics")
+        except Exception as e:
+            print(str(e))
+            yield sse_event({"detail": str(e)}, event="error")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
     
-@app.post("/ingest/pdf")
-async def ingest_pdf_document(file: UploadFile, vectorstore=Depends(get_db)):
+@app.post("/invoke/batch")
+async def invoke_batch(request: BatchQueryRequest, vectorstore=Depends(require_vectorstore)):
+    """
+    Answer many queries at once, streamed back as NDJSON.
+
+    Each line is `{"type": "result", "index": ..., "query": ..., "response": ...}`
+    (or `"error"` instead of `"response"`) in completion order; the last line
+    is `{"type": "summary", ...}` with counts and the elapsed time.
+
+    Args:
+        request (BatchQueryRequest) -> request model with the list of queries, optional tenant and filters
+    Throws:
+        HTTPException 413 -> if there are more than BATCH_MAX_QUERIES queries (default: 10000)
+        HTTPException 422 -> if the filters are invalid
+        HTTPException 503 -> if the RAG chain is still starting up
+    """
+    if startup_state.components.get("rag_chain") != "ready":
+        detail = "RAG chain initialization failed." if startup_state.components.get("rag_chain") == "failed" else "Server is starting up."
+        raise HTTPException(status_code=503, detail=detail, headers={"Retry-After": "5"})
+    max_queries = int(os.getenv("BATCH_MAX_QUERIES", "10000"))
+    if len(request.queries) > max_queries:
+        raise HTTPException(status_code=413, detail=f"At most {max_queries} queries per batch.")
+    filters = request_filters(request)
+
+    # With RAG_CHAIN_REUSE=false there is no shared chain: the batch builds its own and reuses it for every query
+    runner = create_batch_runner(
+        vectorstore, rag_chain or create_rag_chain(), retriever, context_builder, async_collection, response_cache, invoke_limiter
+    )
+
+    async def lines():
+        async for result in runner.run(request.queries, filters):
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@app.get("/cache/stats")
+def cache_stats():
+    """Report response cache hit/miss counters."""
+    if response_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **response_cache.stats()}
+
+@app.get("/embeddings/stats")
+def embedding_stats():
+    """Report query-embedding cache counters and batch-size/latency histograms."""
+    embeddings = getattr(vectorstore, "embeddings", None)
+    if not hasattr(embeddings, "stats"):
+        return {"batching": False}
+    return {"batching": True, **embeddings.stats()}
+
+@app.get("/context/stats")
+def context_stats():
+    """Report prompt tokens retrieved vs. sent to the LLM after deduplication and budgeting."""
+    if context_builder is None:
+        return {"enabled": False}
+    return {"enabled": True, **context_builder.stats()}
+
+@app.get("/retrieval/stats")
+def retrieval_stats():
+    """Report the retrieval mode and per-stage (embed, dense, lexical, fusion, rerank) latency histograms."""
+    if retriever is None:
+        return {"enabled": False}
+    return retriever.stats()
+
+@app.get("/llm/stats")
+def llm_stats():
+    """Report LLM calls, hedges, and per-endpoint circuit breaker state and latency."""
+    if not hasattr(chat_model, "stats"):
+        return {"gateway": False}
+    return {"gateway": True, **chat_model.stats()}
+
+@app.get("/sessions/{session_id}")
+def get_session(session_id: str):
+    """
+    Reports a conversation's running summary and the turns kept verbatim.
+
+    Throws:
+        HTTPException 404 -> if the session is unknown or expired
+    """
+    session = conversation.store.get(session_id, create=False) if conversation is not None else None
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
+    return session.to_dict()
+
+@app.delete("/sessions/{session_id}")
+def delete_session(session_id: str):
+    """Forgets a conversation."""
+    if conversation is None or not conversation.store.delete(session_id):
+        raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
+    return {"deleted": session_id}
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus scrape endpoint: per-stage latency, token, document and batch-size metrics."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/traces")
+def traces(limit: int = Query(20, ge=1, le=1000)):
+    """Recent request and ingestion traces with the duration and counts of every stage."""
+    return {"traces": recent_traces(limit)}
+
+@app.get("/debug/profile")
+def debug_profile(seconds: float = Query(10, gt=0, le=120), interval_ms: float = Query(10, ge=1), include_idle: bool = False, format: str = Query("collapsed", pattern="^(collapsed|top)$")):
+    """
+    Samples every thread's stack for `seconds` while the server keeps serving,
+    and returns collapsed stacks for a flame graph or the hottest functions.
+
+    Throws:
+        HTTPException 404 -> unless PROFILING_ENABLED=true
+        HTTPException 409 -> if a profile is already running
+    """
+    if not profiling_enabled():
+        raise HTTPException(status_code=404, detail="Profiling is disabled, set PROFILING_ENABLED=true.")
+    try:
+        profiler = profile(seconds, interval_ms / 1000, include_idle)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if format == "top":
+        return {"samples": profiler.samples, "functions": profiler.top()}
+    return PlainTextResponse(profiler.collapsed())
+
+def run_ingest_job(job, store, *args, **kwargs):
+    """Runs an ingestion function as a job, reporting progress and yielding to queries between batches."""
+    def on_progress(stats):
+        job.update_progress(stats)
+        job_queue.yield_to_queries()
+
+    stats = store(*args, on_progress=on_progress, **kwargs)
+    job.update_progress(stats)
+    return stats
+
+@app.post("/ingest/pdf", status_code=202)
+async def ingest_pdf_document(file: UploadFile, priority: int = Query(10), tenant: Optional[str] = Query(None), vectorstore=Depends(require_writable_vectorstore)):
         """
-        Ingests a document (PDF) and stores it in VectorDB.
+        Queues a document (PDF) for ingestion into VectorDB.
 
         Args:
             file (UploadFile): The uploaded PDF file.
+            priority (int): Job priority, lower runs first.
+            tenant (str): Tenant the document belongs to. Queries for another tenant do not retrieve it, queries without a tenant do. Without one the document is untagged and only queries without a tenant retrieve it.
 
         Returns:
-            dict: Success message or error.
+            dict: Job id to poll at /jobs/{job_id}, or error.
         """
         try:
-            # Read uploaded file
-            file_content = await file.read()
+            # Keep our own spooled copy; the upload is closed once this request returns
+            spooled = tempfile.SpooledTemporaryFile(max_size=int(os.getenv("INGEST_SPOOL_MAX_BYTES", str(16 * 1024 * 1024))))
+            await run_in_threadpool(shutil.copyfileobj, file.file, spooled)
+            spooled.seek(0)
 
-            # Call the function to store PDF in vector db
-            store_pdf_in_db(file, file_content,vectorstore)
+            def ingest(job):
+                try:
+                    return run_ingest_job(job, store_pdf_in_db, file, spooled, vectorstore, tenant=tenant)
+                finally:
+                    spooled.close()
 
-            return {"message": f"Successfully ingested {file.filename} into vector db"}
+            job = job_queue.submit("pdf", ingest, priority=priority, description=file.filename)
+            return {"message": f"Queued {file.filename} for ingestion into vector db", "job_id": job.id, "status": job.status}
         
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error ingesting document: {str(e)}")
 
 
-@app.post("/ingest/url")
-async def ingest_from_url(request: WebURLRequest, vectorstore=Depends(get_db)):
+@app.post("/ingest/url", status_code=202)
+async def ingest_from_url(request: WebURLRequest, priority: int = Query(10), vectorstore=Depends(require_writable_vectorstore)):
     """
-    Ingests a document from a URL and stores it in VectorDB.
+    Queues a document from a URL for ingestion into VectorDB.
 
     Args:
         url (str): The URL of the document.
+        tenant (str): Tenant the document belongs to. Queries for another tenant do not retrieve it, queries without a tenant do. Without one the document is untagged and only queries without a tenant retrieve it.
+        priority (int): Job priority, lower runs first.
 
     Returns:
-        dict: Success message or error.
+        dict: Job id to poll at /jobs/{job_id}, or error.
     """
     try:
-        store_url_in_db(vectorstore,request)
-        return {"message": f"Successfully ingested content from {request.url} into VectorDB."}
+        job = job_queue.submit(
+            "url", run_ingest_job, store_url_in_db, vectorstore, request, priority=priority, description=request.url
+        )
+        return {"message": f"Queued {request.url} for ingestion into VectorDB.", "job_id": job.id, "status": job.status}
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error ingesting document from URL: {str(e)}")  
 
 
+@app.post("/ingest/crawl", status_code=202)
+async def ingest_from_crawl(request: CrawlRequest, priority: int = Query(10), vectorstore=Depends(require_writable_vectorstore)):
+    """
+    Queues a crawl of a list of URLs and/or a sitemap for ingestion into VectorDB.
+
+    Args:
+        request (CrawlRequest): Seed urls, optional sitemap url, crawl limits and tenant (see /ingest/url).
+        priority (int): Job priority, lower runs first.
+
+    Returns:
+        dict: Job id to poll at /jobs/{job_id}, or error.
+    """
+    if not request.urls and not request.sitemap:
+        raise HTTPException(status_code=422, detail="Provide at least one url or a sitemap.")
+
+    try:
+        description = request.sitemap or ", ".join(request.urls[:3])
+        job = job_queue.submit(
+            "crawl", run_ingest_job, store_crawl_in_db, vectorstore, request, priority=priority, description=description
+        )
+        return {"message": f"Queued crawl of {description} for ingestion into VectorDB.", "job_id": job.id, "status": job.status}
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error ingesting documents from crawl: {str(e)}")
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """
+    Reports an ingestion job's status, progress (chunks embedded/stored) and per-stage timings.
+
+    Throws:
+        HTTPException 404 -> if the job is unknown
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job.to_dict()
+
+@app.get("/jobs")
+def list_jobs():
+    """List tracked ingestion jobs, newest first."""
+    return {"jobs": [job.to_dict() for job in job_queue.list()]}
+
+
 
 
 # Run with: uvicorn server:app --reload
\ No newline at end of file
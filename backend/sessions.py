@@ -0,0 +1,408 @@
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.output_parsers import StrOutputParser
+
+from prompts import condense_question_prompt, summarize_history_prompt
+
+# Words and openings that make a question depend on earlier turns
+FOLLOW_UP_PATTERN = re.compile(
+    r"\b(it|its|it's|they|them|their|this|that|these|those|he|she|him|her|his|there|former|latter|above|"
+    r"previous|same|else|other|another|one|ones)\b|^\s*(and|but|also|so|what about|how about|why|how come)\b",
+    re.IGNORECASE,
+)
+
+# Seconds after which a compaction claimed by another process (that may have died) is ignored
+COMPACTION_LEASE = 300
+
+
+class Session:
+    """
+    One conversation: the most recent turns verbatim and a running summary of
+    everything older.
+
+    Attributes:
+        turns -> list of (user, assistant) pairs not yet folded into the summary
+        summary -> str: summary of the older turns ("" until the first compaction)
+        summarized_turns -> int: turns folded into the summary so far
+    """
+
+    def __init__(self, id):
+        self.id = id
+        self.turns = []
+        self.summary = ""
+        self.summarized_turns = 0
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.lock = threading.Lock()
+        self.compacting_at = None
+
+    def state(self):
+        """Everything needed to restore the session in another process."""
+        return {
+            "turns": self.turns,
+            "summary": self.summary,
+            "summarized_turns": self.summarized_turns,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "compacting_at": self.compacting_at,
+        }
+
+    def restore(self, state):
+        self.turns = [tuple(turn) for turn in state["turns"]]
+        self.summary = state["summary"]
+        self.summarized_turns = state["summarized_turns"]
+        self.created_at = state["created_at"]
+        self.updated_at = state["updated_at"]
+        self.compacting_at = state["compacting_at"]
+        if self.compacting_at is not None and time.time() - self.compacting_at > COMPACTION_LEASE:
+            self.compacting_at = None
+
+    @property
+    def compacting(self):
+        return self.compacting_at is not None
+
+    @compacting.setter
+    def compacting(self, value):
+        self.compacting_at = time.time() if value else None
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                "session_id": self.id,
+                "summary": self.summary,
+                "summarized_turns": self.summarized_turns,
+                "turns": [{"user": user, "assistant": assistant} for user, assistant in self.turns],
+                "created_at": self.created_at,
+                "updated_at": self.updated_at,
+            }
+
+
+class SessionStore:
+    """
+    In-process LRU store of sessions with an idle time to live.
+
+    Args:
+        max_sessions -> int: Sessions kept before the least recently used one is evicted.
+        ttl -> float or None: Seconds a session may stay idle (None keeps sessions until evicted).
+    """
+
+    def __init__(self, max_sessions=1000, ttl=3600):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.evictions = 0
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id, create=True):
+        """Returns the session, creating it when `create` is set; None if unknown or expired."""
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None and self.ttl is not None and now - session.updated_at > self.ttl:
+                del self._sessions[session_id]
+                self.evictions += 1
+                session = None
+            if session is None:
+                if not create:
+                    return None
+                session = self._sessions[session_id] = Session(session_id)
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evictions += 1
+            return session
+
+    def update(self, session, fn):
+        """Applies fn(session) under the session's lock and returns its result."""
+        with session.lock:
+            return fn(session)
+
+    def delete(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class DiskSessionStore:
+    """
+    SQLite-backed session store shared by every process pointing at the same
+    file, so a conversation can continue on any server worker. Updates are
+    read-modify-write transactions, so turns recorded by two workers at once
+    are both kept.
+
+    Args:
+        path -> str: SQLite file to store sessions in.
+        max_sessions -> int: Sessions kept before the least recently used one is evicted.
+        ttl -> float or None: Seconds a session may stay idle (None keeps sessions until evicted).
+    """
+
+    def __init__(self, path, max_sessions=1000, ttl=3600):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, state TEXT, updated REAL)")
+
+    def _load(self, session_id):
+        row = self._conn.execute("SELECT state FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        if row is None:
+            return None
+        session = Session(session_id)
+        session.restore(json.loads(row[0]))
+        return session
+
+    def _save(self, session):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO sessions (id, state, updated) VALUES (?, ?, ?)",
+            (session.id, json.dumps(session.state()), session.updated_at),
+        )
+
+    def get(self, session_id, create=True):
+        """Returns the session, creating it when `create` is set; None if unknown or expired."""
+        now = time.time()
+        with self._lock:
+            session = self._load(session_id)
+            if session is not None and self.ttl is not None and now - session.updated_at > self.ttl:
+                self._conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+                self.evictions += 1
+                session = None
+            if session is None and create:
+                session = Session(session_id)
+                self._save(session)
+                evicted = self._conn.execute(
+                    "DELETE FROM sessions WHERE id IN (SELECT id FROM sessions ORDER BY updated DESC LIMIT -1 OFFSET ?)",
+                    (self.max_sessions,),
+                ).rowcount
+                self.evictions += max(0, evicted)
+            return session
+
+    def update(self, session, fn):
+        """Reloads the session, applies fn(session) and saves it in one transaction; returns fn's result."""
+        with self._lock, session.lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                latest = self._load(session.id)
+                if latest is not None:
+                    session.restore(latest.state())
+                result = fn(session)
+                self._save(session)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return result
+
+    def delete(self, session_id):
+        with self._lock:
+            return self._conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,)).rowcount > 0
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+class ConversationMemory:
+    """
+    Makes retrieval and generation conversation-aware at a bounded cost per turn.
+
+    - Follow-up questions are rewritten into standalone queries before
+      retrieval. The rewrite is one short LLM call over the summary and the
+      last turn, and is skipped for questions that do not look like follow-ups.
+    - The prompt gets the running summary plus the turns not yet summarized.
+      Once 2 * `recent_turns` turns are pending, all but the last `recent_turns`
+      are folded into the summary in one LLM call (off the request path for
+      async callers), so prompt size stays roughly constant however long the
+      conversation gets.
+
+    Args:
+        store -> SessionStore or DiskSessionStore
+        llm -> chat model used for condensation and summaries
+        recent_turns -> int: Turns kept verbatim after a compaction (default: 4).
+        condense -> "auto" (follow-ups only), "always" or "off" (default: "auto").
+        summary_max_words -> int: Length the summary is asked to stay within (default: 150).
+        turn_max_chars -> int: Characters of each stored message kept for the prompt (default: 1500).
+    """
+
+    def __init__(self, store, llm, recent_turns=4, condense="auto", summary_max_words=150, turn_max_chars=1500):
+        if condense not in ("auto", "always", "off"):
+            raise ValueError(f"Unknown condense mode '{condense}', expected 'auto', 'always' or 'off'")
+        self.store = store
+        self.recent_turns = max(1, recent_turns)
+        self.condense = condense
+        self.summary_max_words = summary_max_words
+        self.turn_max_chars = turn_max_chars
+        self.condense_chain = condense_question_prompt() | llm | StrOutputParser()
+        self.summary_chain = summarize_history_prompt() | llm | StrOutputParser()
+        self.condensed = 0
+        self.condense_skipped = 0
+        self.compactions = 0
+        self._tasks = set()
+
+    def get(self, session_id):
+        return self.store.get(session_id)
+
+    def needs_condensation(self, session, query):
+        if self.condense == "off" or not (session.turns or session.summary):
+            return False
+        return self.condense == "always" or len(query.split()) <= 4 or FOLLOW_UP_PATTERN.search(query) is not None
+
+    def _condense_input(self, session, query):
+        with session.lock:
+            lines = [f"Summary: {session.summary}"] if session.summary else []
+            for user, assistant in session.turns[-1:]:
+                lines += [f"User: {user}", f"Assistant: {assistant[:self.turn_max_chars]}"]
+        return {"history": "\n".join(lines), "query": query}
+
+    def _standalone(self, query, rewritten):
+        rewritten = rewritten.strip().strip('"').strip()
+        return rewritten or query
+
+    def condense_query(self, session, query):
+        """Returns the query to retrieve with: standalone already, or rewritten by the LLM."""
+        if not self.needs_condensation(session, query):
+            self.condense_skipped += 1
+            return query
+        self.condensed += 1
+        return self._standalone(query, self.condense_chain.invoke(self._condense_input(session, query)))
+
+    async def acondense_query(self, session, query):
+        if not self.needs_condensation(session, query):
+            self.condense_skipped += 1
+            return query
+        self.condensed += 1
+        return self._standalone(query, await self.condense_chain.ainvoke(self._condense_input(session, query)))
+
+    def history_messages(self, session):
+        """Returns the summary and recent turns as chat messages for the prompt's history slot."""
+        with session.lock:
+            messages = [SystemMessage(f"Summary of the earlier conversation: {session.summary}")] if session.summary else []
+            for user, assistant in session.turns:
+                messages += [HumanMessage(user[:self.turn_max_chars]), AIMessage(assistant[:self.turn_max_chars])]
+        return messages
+
+    def _append(self, session, query, answer):
+        """Stores the turn and returns the turns to fold into the summary, or None."""
+        def append(session):
+            session.turns.append((query, answer))
+            session.updated_at = time.time()
+            # Fold a whole window at once so summarization runs once per recent_turns turns
+            if session.compacting or len(session.turns) < 2 * self.recent_turns:
+                return None
+            session.compacting = True
+            return session.turns[:-self.recent_turns]
+
+        return self.store.update(session, append)
+
+    def _summary_input(self, session, old_turns):
+        turns = "\n".join(f"User: {user}\nAssistant: {assistant[:self.turn_max_chars]}" for user, assistant in old_turns)
+        return {"summary": session.summary or "(empty)", "turns": turns, "max_words": self.summary_max_words}
+
+    def _fold(self, session, old_turns, summary):
+        def fold(session):
+            if summary is not None:
+                session.summary = summary.strip()
+                session.turns = session.turns[len(old_turns):]
+                session.summarized_turns += len(old_turns)
+                self.compactions += 1
+            session.compacting = False
+
+        self.store.update(session, fold)
+
+    def record(self, session, query, answer):
+        """Stores a finished turn, summarizing older turns inline when the window is full."""
+        old_turns = self._append(session, query, answer)
+        if old_turns is None:
+            return
+        summary = None
+        try:
+            summary = self.summary_chain.invoke(self._summary_input(session, old_turns))
+        except Exception as e:
+            print(f"History compaction failed for session {session.id}: {e}")
+        finally:
+            self._fold(session, old_turns, summary)
+
+    async def arecord(self, session, query, answer):
+        """Stores a finished turn; summarization of older turns runs as a background task."""
+        old_turns = self._append(session, query, answer)
+        if old_turns is None:
+            return
+
+        async def compact():
+            summary = None
+            try:
+                summary = await self.summary_chain.ainvoke(self._summary_input(session, old_turns))
+            except Exception as e:
+                print(f"History compaction failed for session {session.id}: {e}")
+            finally:
+                self._fold(session, old_turns, summary)
+
+        task = asyncio.create_task(compact())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def stats(self):
+        return {
+            "sessions": len(self.store),
+            "evictions": self.store.evictions,
+            "condensed": self.condensed,
+            "condense_skipped": self.condense_skipped,
+            "compactions": self.compactions,
+        }
+
+
+def create_conversation_memory(llm=None):
+    """
+    Creates the session store and conversation memory from the environment.
+
+        SESSIONS -> "true" or "false" (default: "true").
+        SESSION_STORE -> "memory" (this process only) or "disk" (SQLite, shared by every worker process) (default: "memory").
+        SESSION_STORE_PATH -> str: SQLite file for the disk store (default: "./session_store/sessions.sqlite").
+        SESSION_MAX -> int: Sessions kept, least recently used evicted first (default: 1000).
+        SESSION_TTL -> float: Seconds a session may stay idle, 0 disables expiry (default: 3600).
+        SESSION_RECENT_TURNS -> int: Turns kept verbatim in the prompt (default: 4).
+        SESSION_CONDENSE -> "auto", "always" or "off" (default: "auto").
+        SESSION_SUMMARY_MAX_WORDS -> int: Target length of the running summary (default: 150).
+
+    Args:
+        llm -> Chat model for condensation and summaries (default: a new model from create_chat_model).
+
+    Returns:
+        ConversationMemory, or None when disabled
+    """
+    if os.getenv("SESSIONS", "true").lower() != "true":
+        return None
+
+    if llm is None:
+        from models import create_chat_model
+        llm = create_chat_model()
+
+    max_sessions = int(os.getenv("SESSION_MAX", "1000"))
+    ttl = float(os.getenv("SESSION_TTL", "3600")) or None
+    backend = os.getenv("SESSION_STORE", "memory").lower()
+    if backend == "disk":
+        store = DiskSessionStore(os.getenv("SESSION_STORE_PATH", "./session_store/sessions.sqlite"), max_sessions, ttl)
+    elif backend == "memory":
+        store = SessionStore(max_sessions, ttl)
+    else:
+        raise ValueError(f"Unknown SESSION_STORE '{backend}', expected memory or disk")
+    return ConversationMemory(
+        store,
+        llm,
+        recent_turns=int(os.getenv("SESSION_RECENT_TURNS", "4")),
+        condense=os.getenv("SESSION_CONDENSE", "auto").lower(),
+        summary_max_words=int(os.getenv("SESSION_SUMMARY_MAX_WORDS", "150")),
+    )
@@ -0,0 +1,86 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StartupState:
+    """
+    Tracks server startup: how long each phase took and which components
+    are ready, so /readyz can answer while initialization is still running.
+
+    Components are "pending", "loading", "ready", "failed" or "timeout".
+    The server is ready once every required component is ready; a component
+    that timed out (e.g. a search index still building) does not block it.
+
+    Args:
+        required -> iterable of component names that must be ready
+    """
+
+    def __init__(self, required=()):
+        self.started_at = time.time()
+        self.finished_at = None
+        self.required = tuple(required)
+        self.components = {name: "pending" for name in self.required}
+        self.errors = {}
+        self.phases = {}
+        self._lock = threading.Lock()
+
+    def require(self, component):
+        """Adds a component that must be ready before the server is."""
+        with self._lock:
+            if component not in self.required:
+                self.required += (component,)
+                self.components.setdefault(component, "pending")
+                self.finished_at = None
+
+    def set(self, component, status, error=None):
+        with self._lock:
+            self.components[component] = status
+            if error is not None:
+                self.errors[component] = str(error)
+            if self.finished_at is None and self._ready():
+                self.finished_at = time.time()
+
+    @contextmanager
+    def phase(self, name, component=None):
+        """
+        Times a startup phase. With `component`, marks it loading while the
+        phase runs and ready or failed when it ends.
+        """
+        if component is not None:
+            self.set(component, "loading")
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            if component is not None:
+                self.set(component, "failed", e)
+            raise
+        finally:
+            with self._lock:
+                self.phases[name] = round(time.perf_counter() - start, 3)
+        if component is not None:
+            self.set(component, "ready")
+
+    def _ready(self):
+        return all(self.components.get(name) in ("ready", "timeout") for name in self.required)
+
+    @property
+    def ready(self):
+        with self._lock:
+            return self._ready()
+
+    @property
+    def failed(self):
+        with self._lock:
+            return any(self.components.get(name) == "failed" for name in self.required)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "ready": self._ready(),
+                "components": dict(self.components),
+                "errors": dict(self.errors),
+                "phases_seconds": dict(self.phases),
+                "startup_seconds": round((self.finished_at or time.time()) - self.started_at, 3),
+            }
@@ -0,0 +1,133 @@
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+from metrics import REGISTRY
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+# Finished root spans, newest last
+_recent_traces = deque(maxlen=int(os.getenv("TRACE_BUFFER_SIZE", "100")))
+_traces_lock = threading.Lock()
+
+
+class Span:
+    """
+    One timed stage of a request. Spans opened while another span is active
+    (on the same task, or a thread started with its context) become its children
+    and share its trace id.
+    """
+
+    def __init__(self, name, parent=None, attributes=None):
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex[:16]
+        self.attributes = dict(attributes or {})
+        self.children = []
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.duration = None
+        if parent is not None:
+            parent.children.append(self)
+
+    def set(self, **attributes):
+        """Adds attributes such as document or token counts to the span."""
+        self.attributes.update(attributes)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "attributes": self.attributes,
+            "children": [child.to_dict() for child in list(self.children)],
+        }
+
+
+def current_span():
+    """Returns the active span, or None outside any span."""
+    return _current_span.get()
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Times a pipeline stage and records its latency in the
+    rag_stage_duration_seconds{stage=name} histogram.
+
+    When the outermost span of a trace ends, the trace is kept for /traces
+    and printed if it took longer than TRACE_SLOW_MS (default: 0, never).
+
+    Yields:
+        Span -> call .set(...) on it to attach counts to the trace
+    """
+    parent = _current_span.get()
+    current = Span(name, parent, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.attributes["error"] = type(e).__name__
+        raise
+    finally:
+        current.duration = time.perf_counter() - current.start
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # Async generators can be closed from another context
+            _current_span.set(parent)
+        record_stage(name, current.duration)
+        if parent is None:
+            _finish_trace(current)
+
+
+def traced(name):
+    """Decorator that runs each call of a function, sync or async, in a span."""
+    def decorator(function):
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await function(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def annotate(**attributes):
+    """Adds attributes to the active span, if any."""
+    current = _current_span.get()
+    if current is not None:
+        current.set(**attributes)
+
+
+def record_stage(name, seconds):
+    """Records a stage latency measured without a span (e.g. per ingestion batch)."""
+    REGISTRY.histogram("rag_stage_duration_seconds", "Latency of each pipeline stage.", stage=name).observe(seconds)
+
+
+def _finish_trace(root):
+    trace = {"trace_id": root.trace_id, "started_at": root.started_at, **root.to_dict()}
+    with _traces_lock:
+        _recent_traces.append(trace)
+
+    slow_ms = float(os.getenv("TRACE_SLOW_MS", "0"))
+    if slow_ms > 0 and root.duration * 1000 >= slow_ms:
+        print(f"Slow trace {root.trace_id}: {json.dumps(trace)}")
+
+
+def recent_traces(limit=20):
+    """Returns the most recent finished traces, newest first."""
+    with _traces_lock:
+        return list(reversed(_recent_traces))[:limit]
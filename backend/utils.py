@@ -1,38 +1,64 @@
-import os
 from io import BytesIO
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import PyPDFLoader
+from langchain_core.documents import Document
+from pypdf import PdfReader
+from chunking import get_chunker, get_chunking_pool, iter_chunks
+from tracing import annotate, traced
 
+@traced("process_pdf")
 def process_pdf_for_rag(uploaded_file, file_content):
     """
     Processes the uploaded PDF file for storage
 
     Args:
         uploaded_file -> file for RAG ingestion pipeline
+        file_content -> bytes or seekable binary stream with the PDF data
 
     Returns:
         splits -> Str
     """
-    temp_file_path = f"temp_{uploaded_file.filename}"
-    try:
-        # Save the uploaded file temporarily
-        with open(temp_file_path, "wb") as f:
-            f.write(file_content)
+    splits = list(iter_splits(iter_pdf_pages(file_content, uploaded_file.filename)))
+    annotate(chunks=len(splits))
+    return splits
 
-        # Load Documents
-        loader = PyPDFLoader(temp_file_path)
-        docs = loader.load()
-        splits = doc_splitter(docs)
+def iter_pdf_pages(file_content, source):
+    """
+    Parses a PDF from memory and yields one document per page, without
+    writing it to disk first.
+
+    Args:
+        file_content -> bytes or seekable binary stream (e.g. the upload's SpooledTemporaryFile)
+        source -> str: value stored in each page's "source" metadata
+
+    Yields:
+        page -> Document with "source" and "page" metadata
+    """
+    if isinstance(file_content, (bytes, bytearray)):
+        file_content = BytesIO(file_content)
+
+    reader = PdfReader(file_content)
+    for page_number, page in enumerate(reader.pages):
+        yield Document(
+            page_content=page.extract_text() or "",
+            metadata={"source": source, "page": page_number},
+        )
 
-        return splits
-    finally:
-        # Ensure the temp file is deleted
-        if os.path.exists(temp_file_path): 
-            os.remove(temp_file_path)
+def iter_splits(docs):
+    """
+    Splits documents one at a time so pages can be streamed into the
+    embedding stage instead of being held in memory all at once. With
+    CHUNK_WORKERS set, pages are split in parallel on a process pool.
+
+    Args:
+        docs -> iterable of documents
+
+    Yields:
+        split -> Document chunk
+    """
+    yield from iter_chunks(docs, get_chunking_pool())
 
 def doc_splitter(docs):
     """
-    Processes the docs
+    Splits docs with the chunker selected by CHUNK_STRATEGY (see chunking.create_chunker)
 
     Args:
         docs -> docs for RAG ingestion pipeline
@@ -40,7 +66,6 @@ def doc_splitter(docs):
     Returns:
         splits -> Str
     """
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    splits = text_splitter.split_documents(docs)
+    splits = get_chunker().split_documents(docs)
 
-    return splits
\ No newline at end of file
+    return splits
@@ -0,0 +1,398 @@
+import json
+import os
+import threading
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+from filters import matches_value
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def _top_k(scores, k):
+    """Returns the positions of the k highest scores, best first."""
+    k = min(k, len(scores))
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def _hashable(value):
+    """Metadata value usable as a dict key; lists and dicts are keyed by their JSON."""
+    return json.dumps(value, sort_keys=True) if isinstance(value, (list, dict)) else value
+
+
+class FlatIndex:
+    """Exact brute-force cosine search over every stored vector. Best for small corpora."""
+
+    name = "flat"
+
+    def search(self, vectors, alive, query, k):
+        scores = vectors @ query
+        scores[~alive] = -np.inf
+        top = _top_k(scores, k)
+        top = top[np.isfinite(scores[top])]
+        return top, scores[top]
+
+    def add(self, vectors, start):
+        pass
+
+    def save(self, path):
+        pass
+
+
+class IVFIndex:
+    """
+    Inverted-file index: vectors are clustered with spherical k-means and a
+    query is only compared with the vectors of its `nprobe` closest clusters.
+
+    Centroids and assignments are persisted next to the vectors so startup
+    does not retrain. The index retrains once the corpus has grown to
+    `retrain_factor` times the size it was trained on.
+
+    Args:
+        nlist -> int or None: number of clusters (default: 4 * sqrt(n))
+        nprobe -> int: clusters searched per query
+        retrain_factor -> float: growth that triggers retraining
+    """
+
+    name = "ivf"
+
+    def __init__(self, nlist=None, nprobe=8, retrain_factor=4.0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.retrain_factor = retrain_factor
+        self.centroids = None
+        self.assign = np.empty(0, dtype=np.int32)
+        self.trained_size = 0
+        self._lists = None
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        index = cls(**kwargs)
+        if os.path.exists(os.path.join(path, "ivf.json")):
+            with open(os.path.join(path, "ivf.json")) as f:
+                index.trained_size = json.load(f)["trained_size"]
+            index.centroids = np.load(os.path.join(path, "ivf_centroids.npy"))
+            index.assign = np.load(os.path.join(path, "ivf_assign.npy"))
+        return index
+
+    def save(self, path):
+        if self.centroids is not None:
+            np.save(os.path.join(path, "ivf_centroids.npy"), self.centroids)
+            np.save(os.path.join(path, "ivf_assign.npy"), self.assign)
+            with open(os.path.join(path, "ivf.json"), "w") as f:
+                json.dump({"trained_size": self.trained_size}, f)
+
+    def _assign(self, vectors, chunk_size=65536):
+        return np.concatenate([
+            np.argmax(vectors[i:i + chunk_size] @ self.centroids.T, axis=1).astype(np.int32)
+            for i in range(0, len(vectors), chunk_size)
+        ]) if len(vectors) else np.empty(0, dtype=np.int32)
+
+    def train(self, vectors, iterations=10, seed=0):
+        rng = np.random.default_rng(seed)
+        nlist = min(self.nlist or int(4 * np.sqrt(len(vectors))), len(vectors))
+        sample = vectors[np.sort(rng.choice(len(vectors), min(len(vectors), nlist * 256), replace=False))]
+
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for cluster in range(nlist):
+                members = sample[labels == cluster]
+                if len(members):
+                    centroids[cluster] = members.sum(axis=0)
+            centroids = _normalize(centroids)
+
+        self.centroids = centroids
+        self.assign = self._assign(vectors)
+        self.trained_size = len(vectors)
+        self._lists = None
+
+    def add(self, vectors, start):
+        if self.centroids is None or len(vectors) > self.retrain_factor * self.trained_size:
+            self.train(vectors)
+            return
+        self.assign = np.concatenate([self.assign[:start], self._assign(vectors[start:])])
+        self._lists = None
+
+    def search(self, vectors, alive, query, k):
+        if self._lists is None:
+            order = np.argsort(self.assign, kind="stable")
+            offsets = np.concatenate([[0], np.cumsum(np.bincount(self.assign, minlength=len(self.centroids)))])
+            self._lists = (order, offsets)
+        order, offsets = self._lists
+
+        probes = _top_k(self.centroids @ query, self.nprobe)
+        candidates = np.concatenate([order[offsets[c]:offsets[c + 1]] for c in probes])
+        candidates = candidates[candidates < len(vectors)]
+        candidates = candidates[alive[candidates]]
+
+        scores = vectors[candidates] @ query
+        top = _top_k(scores, k)
+        return candidates[top], scores[top]
+
+
+class LocalVectorStore(VectorStore):
+    """
+    In-process vector store persisted to a local directory.
+
+    Vectors are appended to a raw float32 file that is memory-mapped on
+    startup, so opening a large store does not read it into memory. Texts and
+    metadata are appended to a JSON-lines file, and deletions are recorded
+    as tombstones. Scores are cosine similarities.
+
+    Searches take normalized metadata filters (see filters.normalize_filters)
+    as a pre-filter: matching rows are found through a value -> rows map per
+    filtered field, and when they are fewer than `ivf_min_vectors` only
+    those rows are scored, exactly.
+
+    Args:
+        embedding -> Embeddings used for queries and add_texts (can be set later through `embeddings`)
+        path -> str: directory holding the store
+        index -> "flat", "ivf" or "auto" (flat below `ivf_min_vectors`, ivf above)
+        ivf_min_vectors -> int: corpus size at which "auto" switches to ivf
+        nprobe -> int: clusters searched per query by the ivf index
+    """
+
+    def __init__(self, embedding, path, index="auto", ivf_min_vectors=50000, nprobe=8):
+        self._embedding = embedding
+        self.path = path
+        self.index_kind = index
+        self.ivf_min_vectors = ivf_min_vectors
+        self.nprobe = nprobe
+
+        self._lock = threading.Lock()
+        self._ids = []
+        self._texts = []
+        self._metadatas = []
+        self._rows = {}
+        self._values = {}
+        self._dim = None
+        self._vectors = np.empty((0, 0), dtype=np.float32)
+        self._alive = np.empty(0, dtype=bool)
+
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    @property
+    def embeddings(self):
+        return self._embedding
+
+    @embeddings.setter
+    def embeddings(self, embedding):
+        self._embedding = embedding
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        if os.path.exists(self._file("meta.json")):
+            with open(self._file("meta.json")) as f:
+                self._dim = json.load(f)["dim"]
+
+        if os.path.exists(self._file("docs.jsonl")):
+            with open(self._file("docs.jsonl")) as f:
+                for line in f:
+                    record = json.loads(line)
+                    self._rows[record["id"]] = len(self._ids)
+                    self._ids.append(record["id"])
+                    self._texts.append(record["text"])
+                    self._metadatas.append(record["metadata"])
+
+        self._alive = np.ones(len(self._ids), dtype=bool)
+        if os.path.exists(self._file("deleted.txt")):
+            with open(self._file("deleted.txt")) as f:
+                for line in f:
+                    self._alive[int(line)] = False
+        for id, row in list(self._rows.items()):
+            if not self._alive[row]:
+                del self._rows[id]
+
+        self._map_vectors()
+        self._index = self._create_index()
+
+    def _map_vectors(self):
+        rows = len(self._ids)
+        if rows and self._dim:
+            self._vectors = np.memmap(self._file("vectors.f32"), dtype=np.float32, mode="r", shape=(rows, self._dim))
+        else:
+            self._vectors = np.empty((0, self._dim or 0), dtype=np.float32)
+
+    def _create_index(self):
+        use_ivf = self.index_kind == "ivf" or (self.index_kind == "auto" and len(self._ids) >= self.ivf_min_vectors)
+        if not use_ivf:
+            return FlatIndex()
+        index = IVFIndex.load(self.path, nprobe=self.nprobe)
+        if len(index.assign) != len(self._ids) and len(self._ids):
+            index.add(self._vectors, len(index.assign))
+            index.save(self.path)
+        return index
+
+    def add_embeddings(self, documents, vectors, ids):
+        """
+        Appends documents with precomputed embeddings. Re-adding an existing id replaces it.
+
+        Args:
+            documents -> list of Document
+            vectors -> list of embeddings, one per document
+            ids -> list of str ids, one per document
+        """
+        vectors = _normalize(vectors)
+        if not len(vectors):
+            return []
+
+        with self._lock:
+            if self._dim is None:
+                self._dim = vectors.shape[1]
+                with open(self._file("meta.json"), "w") as f:
+                    json.dump({"dim": self._dim}, f)
+
+            replaced = [self._rows[id] for id in ids if id in self._rows]
+            start = len(self._ids)
+
+            with open(self._file("vectors.f32"), "ab") as f:
+                f.write(vectors.tobytes())
+            with open(self._file("docs.jsonl"), "a") as f:
+                for id, doc in zip(ids, documents):
+                    f.write(json.dumps({"id": id, "text": doc.page_content, "metadata": doc.metadata}) + "\n")
+                    self._rows[id] = len(self._ids)
+                    self._ids.append(id)
+                    self._texts.append(doc.page_content)
+                    self._metadatas.append(doc.metadata)
+                    for field, rows in self._values.items():
+                        rows.setdefault(_hashable(doc.metadata.get(field)), []).append(self._rows[id])
+
+            alive = np.ones(len(self._ids), dtype=bool)
+            alive[:start] = self._alive
+            self._alive = alive
+            self._tombstone(replaced)
+            self._map_vectors()
+
+            if isinstance(self._index, FlatIndex) and self.index_kind == "auto" and len(self._ids) >= self.ivf_min_vectors:
+                self._index = IVFIndex(nprobe=self.nprobe)
+                start = 0
+            self._index.add(self._vectors, start)
+            self._index.save(self.path)
+
+        return list(ids)
+
+    def _tombstone(self, rows):
+        if not rows:
+            return
+        self._alive[rows] = False
+        with open(self._file("deleted.txt"), "a") as f:
+            f.writelines(f"{row}\n" for row in rows)
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [None] * len(texts)
+        ids = [id or os.urandom(16).hex() for id in ids]
+        documents = [Document(page_content=text, metadata=metadata) for text, metadata in zip(texts, metadatas)]
+        return self.add_embeddings(documents, self._embedding.embed_documents(texts), ids)
+
+    def delete(self, ids=None, **kwargs):
+        with self._lock:
+            rows = [self._rows.pop(id) for id in ids or [] if id in self._rows]
+            self._tombstone(rows)
+        return True
+
+    def get_by_ids(self, ids):
+        return [self._document(self._rows[id]) for id in ids if id in self._rows]
+
+    def iter_documents(self):
+        """Yields every live document, in insertion order."""
+        for row in sorted(self._rows.values()):
+            yield self._document(row)
+
+    def _document(self, row):
+        return Document(id=self._ids[row], page_content=self._texts[row], metadata=self._metadatas[row])
+
+    def _field_values(self, field):
+        """Returns {value: rows} for a metadata field, built on first use and kept up to date by add_embeddings."""
+        if field not in self._values:
+            rows = {}
+            for row, metadata in enumerate(self._metadatas):
+                rows.setdefault(_hashable(metadata.get(field)), []).append(row)
+            self._values[field] = rows
+        return self._values[field]
+
+    def _filter_mask(self, filters, alive):
+        mask = alive.copy()
+        for field, condition in filters.items():
+            matching = np.zeros(len(alive), dtype=bool)
+            for value, rows in self._field_values(field).items():
+                if matches_value(value, condition):
+                    matching[rows] = True
+            mask &= matching
+        return mask
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        """
+        Args:
+            embedding -> query vector
+            k -> int: results returned
+            filter -> dict or None: normalized metadata filters applied before the search
+        """
+        with self._lock:
+            vectors, alive, index = self._vectors, self._alive, self._index
+            if filter:
+                alive = self._filter_mask(filter, alive)
+        if not len(vectors):
+            return []
+        query = _normalize(embedding)
+        if filter and alive.sum() < self.ivf_min_vectors:
+            candidates = np.flatnonzero(alive)
+            scores = vectors[candidates] @ query
+            top = _top_k(scores, k)
+            rows, scores = candidates[top], scores[top]
+        else:
+            rows, scores = index.search(vectors, alive, query, k)
+        return [(self._document(row), float(score)) for row, score in zip(rows, scores)]
+
+    def similarity_search_by_vector(self, embedding, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, **kwargs)]
+
+    def similarity_search_with_score(self, query, k=4, **kwargs):
+        return self.similarity_search_with_score_by_vector(self._embedding.embed_query(query), k, **kwargs)
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def _select_relevance_score_fn(self):
+        return self._cosine_relevance_score_fn
+
+    def __len__(self):
+        return int(self._alive.sum())
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, path="./vector_store", **kwargs):
+        store = cls(embedding, path, **kwargs)
+        store.add_texts(texts, metadatas, ids)
+        return store
+
+
+def create_local_vectorstore(embedding):
+    """
+    Opens the local vector store configured in the environment.
+
+        LOCAL_STORE_PATH -> str: directory holding the store (default: "./vector_store").
+        LOCAL_INDEX -> "auto", "flat" or "ivf" (default: "auto").
+        LOCAL_IVF_MIN_VECTORS -> int: corpus size at which "auto" switches to ivf (default: 50000).
+        LOCAL_IVF_NPROBE -> int: clusters searched per query (default: 8).
+    """
+    return LocalVectorStore(
+        embedding,
+        path=os.getenv("LOCAL_STORE_PATH", "./vector_store"),
+        index=os.getenv("LOCAL_INDEX", "auto").lower(),
+        ivf_min_vectors=int(os.getenv("LOCAL_IVF_MIN_VECTORS", "50000")),
+        nprobe=int(os.getenv("LOCAL_IVF_NPROBE", "8")),
+    )
@@ -0,0 +1,91 @@
+import argparse
+import json
+import os
+import sys
+
+import httpx
+from dotenv import load_dotenv
+
+##############################################################################################
+#       Runs a file of questions through the backend's /invoke/batch endpoint and writes     #
+#                          one JSON answer per line (NDJSON).                                #
+#                                                                                            #
+#       python batch_invoke.py questions.txt -o answers.jsonl                                #
+#       python batch_invoke.py questions.jsonl --url http://127.0.0.1:8001                   #
+##############################################################################################
+
+load_dotenv()
+
+
+def read_questions(path):
+    """
+    Reads questions from a text file (one per line) or a JSONL file of
+    {"id": ..., "query": ...} objects ("question" is accepted for "query").
+
+    Returns:
+        list of (id, query) -> ids default to the line number
+    """
+    questions = []
+    with open(path, encoding="utf-8") if path != "-" else sys.stdin as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            if path.endswith(".jsonl"):
+                record = json.loads(line)
+                questions.append((record.get("id", number), record.get("query") or record["question"]))
+            else:
+                questions.append((number, line))
+    return questions
+
+
+def run_batch(client, questions, output, tenant=None):
+    """Sends one batch and writes its results; returns the server's summary line."""
+    summary = {}
+    payload = {"queries": [query for _, query in questions], "tenant": tenant}
+    with client.stream("POST", "/invoke/batch", json=payload) as response:
+        if response.status_code != 200:
+            response.read()
+            raise SystemExit(f"Server error {response.status_code}: {response.text}")
+        for line in response.iter_lines():
+            if not line:
+                continue
+            result = json.loads(line)
+            if result.pop("type") == "summary":
+                summary = result
+                continue
+            result = {"id": questions[result.pop("index")][0], **result}
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a file of questions with the RAG backend.")
+    parser.add_argument("questions", help="Text file with one question per line, a .jsonl file, or - for stdin")
+    parser.add_argument("-o", "--output", help="NDJSON file for the answers (default: stdout)")
+    parser.add_argument("--url", default=os.getenv("BACKEND_URL", "http://127.0.0.1:8001"), help="Backend base url")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Questions sent per request")
+    parser.add_argument("--tenant", help="Answer from this tenant's documents only")
+    parser.add_argument("--timeout", type=float, default=None, help="Seconds to wait for each result (default: no limit)")
+    args = parser.parse_args()
+
+    questions = read_questions(args.questions)
+    totals = {}
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        with httpx.Client(base_url=args.url, timeout=httpx.Timeout(args.timeout, connect=10)) as client:
+            for offset in range(0, len(questions), args.batch_size):
+                summary = run_batch(client, questions[offset:offset + args.batch_size], output, args.tenant)
+                for key, value in summary.items():
+                    totals[key] = round(totals.get(key, 0) + value, 3)
+                print(f"Answered {min(offset + args.batch_size, len(questions))}/{len(questions)} questions", file=sys.stderr)
+    finally:
+        if args.output:
+            output.close()
+
+    print(json.dumps(totals), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Batch query benchmark.
+
+Answers the same list of questions (with a share of duplicates) two ways
+against a local stub of the OpenAI-compatible endpoint and an in-memory
+stand-in for the vector store:
+
+  sequential -> one ainvoke_llm call per question, as a client calling /invoke in a loop
+  batch      -> BatchRunner, as used by /invoke/batch
+
+Reports wall time, questions/sec, embedding forward passes and LLM retries.
+The stub can reject requests above a concurrency limit with 429 to show the
+batch runner backing off instead of failing.
+
+Usage: python benchmarks/bench_batch.py --questions 500 --duplicates 0.3 --llm-concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+
+import common
+from fakes import HashingEmbedding, TimedEmbedding, create_fake_vectorstore
+from stub_llm import start_stub_process
+
+
+def make_questions(count, duplicates, seed=0):
+    rng = random.Random(seed)
+    questions = []
+    for i in range(count):
+        if questions and rng.random() < duplicates:
+            questions.append(rng.choice(questions))
+        else:
+            questions.append(f"What does document {i} say about topic {i % 17}?")
+    return questions
+
+
+async def run_sequential(questions, vectorstore, rag_chain):
+    from chains import ainvoke_llm
+    failed = 0
+    for question in questions:
+        try:
+            await ainvoke_llm(question, vectorstore, rag_chain)
+        except Exception:
+            failed += 1
+    return {"failed": failed}
+
+
+async def run_batch(questions, vectorstore, rag_chain, args):
+    from batch import BatchRunner
+    runner = BatchRunner(
+        vectorstore, rag_chain, llm_concurrency=args.llm_concurrency, search_concurrency=args.search_concurrency,
+        retry_base_delay=0.2,
+    )
+    first_result = None
+    start = time.perf_counter()
+    async for result in runner.run(questions):
+        if first_result is None:
+            first_result = time.perf_counter() - start
+        if result["type"] == "summary":
+            summary = result
+    return {"failed": summary["failed"], "retries": summary["retries"], "unique": summary["unique"],
+            "first_result_seconds": round(first_result, 3)}
+
+
+def run(args):
+    stub, base_url = start_stub_process(
+        args.llm_port, latency=args.llm_latency, max_concurrency=args.llm_rate_limit, retry_after=0.2,
+    )
+    os.environ.update({"BASE_URL": base_url, "API_KEY": "stub", "MODEL": "stub"})
+
+    from chains import create_rag_chain
+    from models import create_chat_model
+
+    questions = make_questions(args.questions, args.duplicates)
+    results = {}
+    for mode in args.modes:
+        vectorstore = create_fake_vectorstore(search_latency=args.search_latency)
+        embedding = vectorstore.embedding = TimedEmbedding(HashingEmbedding())
+        rag_chain = create_rag_chain(create_chat_model())
+
+        start = time.perf_counter()
+        if mode == "sequential":
+            result = asyncio.run(run_sequential(questions, vectorstore, rag_chain))
+        else:
+            result = asyncio.run(run_batch(questions, vectorstore, rag_chain, args))
+        elapsed = time.perf_counter() - start
+
+        results[mode] = {
+            "seconds": round(elapsed, 3),
+            "questions_per_sec": round(len(questions) / elapsed, 2),
+            "embedding_passes": embedding.calls,
+            **result,
+        }
+
+    stub.terminate()
+    return {"questions": len(questions), "results": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=500)
+    parser.add_argument("--duplicates", type=float, default=0.3, help="Share of questions repeating an earlier one")
+    parser.add_argument("--modes", nargs="+", default=["sequential", "batch"], choices=["sequential", "batch"])
+    parser.add_argument("--llm-concurrency", type=int, default=8)
+    parser.add_argument("--search-concurrency", type=int, default=16)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Stub LLM seconds per completion")
+    parser.add_argument("--llm-rate-limit", type=int, default=0, help="Stub answers 429 above this many concurrent calls (0: off)")
+    parser.add_argument("--search-latency", type=float, default=0.01, help="Simulated vector search round-trip in seconds")
+    parser.add_argument("--llm-port", type=int, default=9103)
+    args = parser.parse_args()
+
+    print(json.dumps(run(args), indent=2))
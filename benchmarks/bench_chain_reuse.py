@@ -0,0 +1,57 @@
+"""
+Compares per-request latency of building the chat model and chain on every
+call (the old `invoke_llm` behaviour) against reusing one chain with a pooled
+HTTP client, both against a local stub of the OpenAI-compatible endpoint.
+
+Usage: python benchmarks/bench_chain_reuse.py --requests 200
+"""
+import argparse
+import json
+import os
+import time
+
+import common
+from stub_llm import start_stub_server
+
+
+def run(requests, latency):
+    server, base_url = start_stub_server(latency=latency)
+    os.environ.update({"BASE_URL": base_url, "API_KEY": "stub", "MODEL": "stub"})
+
+    from chains import create_rag_chain
+    from models import create_chat_model, create_http_clients
+
+    inputs = {"context": "Lorem ipsum " * 50, "query": "What is the answer?"}
+
+    def timed(call):
+        latencies = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            call()
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    # Old behaviour: new ChatOpenAI, prompt and chain per request
+    per_request = timed(lambda: create_rag_chain().invoke(inputs))
+
+    # New behaviour: one chain and one pooled client for all requests
+    sync_client, async_client = create_http_clients()
+    rag_chain = create_rag_chain(create_chat_model(http_client=sync_client, http_async_client=async_client))
+    reused = timed(lambda: rag_chain.invoke(inputs))
+    sync_client.close()
+
+    server.shutdown()
+    return {
+        "stub_latency_ms": latency * 1000,
+        "per_request_chain": common.summarize(per_request),
+        "reused_chain": common.summarize(reused),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated upstream latency in seconds")
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.requests, args.latency), indent=2))
@@ -0,0 +1,145 @@
+"""
+Chunking strategy benchmark.
+
+Splits two generated corpora with each chunking strategy / overlap pair:
+
+  pdf   -> text pages of generated PDFs (make_pdf), for throughput
+  html  -> pages of <h2> sections, each with its own topic and one fact,
+           converted with html_to_text like /ingest/url and /ingest/crawl
+
+and reports per strategy:
+  - chunking throughput in pages/sec (with --workers, on a CHUNK_WORKERS pool)
+  - chunk count, stored characters, duplicated text and float32 vector bytes
+  - tokens per chunk and chunks over the model's 256-token input
+  - retrieval quality on the html corpus: recall@k and MRR of dense search
+    for one question per section (a hit is a chunk containing the answer)
+
+Usage: python benchmarks/bench_chunking.py --pdf-pages 200 --html-pages 100
+       python benchmarks/bench_chunking.py --real-model --workers 4
+"""
+import argparse
+import json
+import os
+import random
+import time
+
+import numpy as np
+from bs4 import BeautifulSoup
+from langchain_core.documents import Document
+
+import common
+from corpus import make_pdf, make_sectioned_html
+from fakes import HashingEmbedding
+
+STRATEGIES = {
+    "recursive": ("recursive", "none"),
+    "token+tokens": ("token", "tokens"),
+    "token+none": ("token", "none"),
+    "structure+sentence": ("structure", "sentence"),
+    "structure+tokens": ("structure", "tokens"),
+    "structure+none": ("structure", "none"),
+}
+
+# Input limit of all-MiniLM-L6-v2, special tokens included
+MODEL_MAX_TOKENS = 256
+
+
+def make_corpora(pdf_pages, html_pages, seed=0):
+    import utils
+
+    pdf = list(utils.iter_pdf_pages(make_pdf(pdf_pages, seed=seed), "bench.pdf"))
+    rng = random.Random(seed)
+    html, facts = [], []
+    for number in range(html_pages):
+        page, page_facts = make_sectioned_html(rng, sections=rng.randint(3, 8), paragraphs=rng.randint(1, 5))
+        html.append(Document(page_content=page_text(page), metadata={"source": f"page-{number}"}))
+        facts.extend(page_facts)
+    return pdf, html, facts
+
+
+def page_text(page):
+    from chunking import html_to_text
+    return html_to_text(BeautifulSoup(page, "html.parser"))
+
+
+def split(docs, workers):
+    from chunking import get_chunking_pool, iter_chunks
+
+    start = time.perf_counter()
+    chunks = list(iter_chunks(docs, get_chunking_pool() if workers else None))
+    return chunks, time.perf_counter() - start
+
+
+def storage(docs, chunks, counter, dimensions):
+    source = sum(len(doc.page_content) for doc in docs)
+    stored = sum(len(chunk.page_content) for chunk in chunks)
+    tokens = counter.count_many(chunk.page_content for chunk in chunks)
+    return {
+        "chunks": len(chunks),
+        "stored_chars": stored,
+        "duplicated_text": round(stored / source - 1, 4),
+        "vector_bytes": len(chunks) * dimensions * 4,
+        "mean_tokens": round(sum(tokens) / len(tokens), 1),
+        "over_model_limit": sum(count > MODEL_MAX_TOKENS - 2 for count in tokens),
+    }
+
+
+def retrieval(chunks, facts, embedding, k):
+    vectors = np.array(embedding.embed_documents([chunk.page_content for chunk in chunks]), dtype=np.float32)
+    queries = np.array(embedding.embed_documents([fact["query"] for fact in facts]), dtype=np.float32)
+    hits, reciprocal_ranks = 0, 0.0
+    for fact, scores in zip(facts, queries @ vectors.T):
+        top = np.argsort(-scores)[:k]
+        rank = next((i for i, index in enumerate(top, start=1) if fact["answer"] in chunks[index].page_content), None)
+        hits += rank is not None
+        reciprocal_ranks += 1 / rank if rank else 0.0
+    return {f"recall@{k}": round(hits / len(facts), 4), "mrr": round(reciprocal_ranks / len(facts), 4)}
+
+
+def run(args):
+    import chunking
+
+    if args.real_model:
+        from models import create_hugging_face_embedding_model
+        embedding, tokenizer = create_hugging_face_embedding_model(), "model"
+    else:
+        embedding, tokenizer = HashingEmbedding(), "approx"
+    os.environ.update({"CHUNK_TOKENIZER": tokenizer, "CHUNK_WORKERS": str(args.workers)})
+    counter = chunking.create_token_counter(tokenizer)
+    dimensions = len(embedding.embed_query("dimensions"))
+
+    pdf, html, facts = make_corpora(args.pdf_pages, args.html_pages)
+    results = {}
+    for name in args.strategies:
+        strategy, overlap = STRATEGIES[name]
+        os.environ.update({"CHUNK_STRATEGY": strategy, "CHUNK_OVERLAP": overlap})
+        chunking._chunker = None
+        chunking.shutdown_chunking_pool()
+        split(pdf[:args.workers], args.workers)  # starts the pool workers
+
+        pdf_chunks, pdf_seconds = split(pdf, args.workers)
+        html_chunks, html_seconds = split(html, args.workers)
+        results[name] = {
+            "pdf_pages_per_sec": round(len(pdf) / pdf_seconds, 1),
+            "html_pages_per_sec": round(len(html) / html_seconds, 1),
+            "pdf": storage(pdf, pdf_chunks, counter, dimensions),
+            "html": storage(html, html_chunks, counter, dimensions),
+            "html_retrieval": retrieval(html_chunks, facts, embedding, args.k),
+        }
+    chunking.shutdown_chunking_pool()
+    return {"pdf_pages": len(pdf), "html_pages": len(html), "questions": len(facts), "tokenizer": tokenizer,
+            "workers": args.workers, "results": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf-pages", type=int, default=200)
+    parser.add_argument("--html-pages", type=int, default=100)
+    parser.add_argument("--strategies", nargs="+", default=list(STRATEGIES), choices=list(STRATEGIES))
+    parser.add_argument("--workers", type=int, default=0, help="CHUNK_WORKERS pool size, 0 splits in this process")
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--real-model", action="store_true",
+                        help="Count tokens and embed with all-MiniLM-L6-v2 instead of an estimate and a fake embedding")
+    args = parser.parse_args()
+
+    print(json.dumps(run(args), indent=2))
@@ -0,0 +1,70 @@
+"""
+Crawl ingestion benchmark against a local fixture site.
+
+Runs a full crawl, an unchanged re-crawl (conditional GETs answered with
+304) and a re-crawl after a few pages changed, and reports pages/sec,
+pages re-processed and embedding calls saved for each.
+
+Usage: python benchmarks/bench_crawl.py --pages 200 --changed 10
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+import common
+from fakes import FakeVectorStore
+from fixture_site import FixtureSite, start_fixture_site
+
+
+def run(args):
+    os.environ["CRAWL_CACHE_PATH"] = os.path.join(tempfile.mkdtemp(), "validators.json")
+    os.environ["CRAWL_REQUESTS_PER_SECOND"] = str(args.rate)
+    os.environ["CRAWL_CONCURRENCY"] = str(args.concurrency)
+    os.environ.setdefault("CHUNK_TOKENIZER", "approx")
+
+    import db
+
+    site = FixtureSite(pages=args.pages, latency=args.latency)
+    server, base_url = start_fixture_site(site)
+    store = FakeVectorStore()
+
+    mode = {"sitemap": f"{base_url}/sitemap.xml", "urls": [], "max_depth": 0} if args.sitemap else \
+        {"sitemap": None, "urls": [f"{base_url}/page/0.html"], "max_depth": args.pages}
+    request = SimpleNamespace(max_pages=args.pages, same_host=True, tenant=None, **mode)
+
+    def crawl(label):
+        start = time.perf_counter()
+        stats = db.store_crawl_in_db(store, request)
+        elapsed = time.perf_counter() - start
+        requested = stats["pages_fetched"] + stats["pages_unchanged"] + stats["pages_failed"]
+        return {
+            "run": label,
+            "seconds": round(elapsed, 3),
+            "pages_per_sec": round(requested / elapsed, 2),
+            **{key: stats.get(key, 0) for key in
+               ("pages_fetched", "pages_unchanged", "pages_failed", "chunks_embedded", "embeddings_saved")},
+        }
+
+    results = [crawl("initial"), crawl("unchanged")]
+    for number in range(0, args.pages, max(1, args.pages // max(1, args.changed)))[: args.changed]:
+        site.version[number] += 1
+    results.append(crawl(f"{args.changed}_changed"))
+
+    server.shutdown()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--changed", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.02, help="Simulated server latency in seconds")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=0, help="Per-host requests/sec limit, 0 disables it")
+    parser.add_argument("--sitemap", action="store_true", help="Seed from /sitemap.xml instead of following links")
+    args = parser.parse_args()
+
+    print(json.dumps(run(args), indent=2))
@@ -0,0 +1,124 @@
+"""
+Embedding backend benchmark: torch vs ONNX Runtime vs int8-quantized ONNX.
+
+Each backend runs in a fresh process so load time and memory are measured
+in isolation. Reports load time, resident memory added by the model,
+latency and sentences/sec per batch size, and cosine agreement with the
+torch reference model on the same sentences.
+
+Usage: python benchmarks/bench_embeddings.py --backends torch onnx onnx-int8 --threads 4
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import common
+from corpus import make_sentence
+
+
+def make_sentences(count, seed=0):
+    rng = random.Random(seed)
+    return [" ".join(make_sentence(rng, rng.randint(6, 40)) for _ in range(rng.randint(1, 4))) for _ in range(count)]
+
+
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def worker(args):
+    """Runs one backend in this process and prints its measurements as JSON."""
+    before = rss_mb()
+    start = time.perf_counter()
+    from models import create_hugging_face_embedding_model, warm_up_embedding_model
+    model = create_hugging_face_embedding_model(backend=args.worker, threads=args.threads or None)
+    load_seconds = time.perf_counter() - start
+    warm_up_embedding_model(model)
+    model_mb = rss_mb() - before
+
+    sentences = make_sentences(max(args.batch_sizes) * args.repeats)
+    batches = {}
+    for batch_size in args.batch_sizes:
+        latencies = []
+        for repeat in range(args.repeats):
+            batch = sentences[repeat * batch_size:(repeat + 1) * batch_size]
+            start = time.perf_counter()
+            model.embed_documents(batch)
+            latencies.append(time.perf_counter() - start)
+        summary = common.summarize(latencies)
+        batches[str(batch_size)] = {
+            "p50_ms": summary["p50_ms"],
+            "p99_ms": summary["p99_ms"],
+            "sentences_per_sec": round(batch_size * len(latencies) / sum(latencies), 1),
+        }
+
+    vectors = np.asarray(model.embed_documents(make_sentences(args.agreement_sentences, seed=1)), dtype=np.float32)
+    np.save(args.vectors_out, vectors)
+
+    print(json.dumps({
+        "load_seconds": round(load_seconds, 3),
+        "model_rss_mb": round(model_mb, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "batches": batches,
+    }))
+
+
+def cosine_agreement(vectors, reference):
+    vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    cosines = np.sum(vectors * reference, axis=1)
+    return {"mean": round(float(cosines.mean()), 5), "min": round(float(cosines.min()), 5)}
+
+
+def run(args):
+    directory = tempfile.mkdtemp()
+    backends = ["torch"] + [backend for backend in args.backends if backend != "torch"]
+    results, reference = {}, None
+    for backend in backends:
+        vectors_path = os.path.join(directory, f"{backend}.npy")
+        command = [
+            sys.executable, os.path.abspath(__file__), "--worker", backend, "--vectors-out", vectors_path,
+            "--threads", str(args.threads), "--repeats", str(args.repeats),
+            "--agreement-sentences", str(args.agreement_sentences),
+            "--batch-sizes", *map(str, args.batch_sizes),
+        ]
+        process = subprocess.run(command, cwd=common.BACKEND_DIR, capture_output=True, text=True)
+        if process.returncode != 0:
+            results[backend] = {"error": process.stderr.strip().splitlines()[-1]}
+            continue
+
+        results[backend] = json.loads(process.stdout.strip().splitlines()[-1])
+        vectors = np.load(vectors_path)
+        if backend == "torch":
+            reference = vectors
+        elif reference is not None:
+            results[backend]["cosine_vs_torch"] = cosine_agreement(vectors, reference)
+
+    if "torch" not in args.backends:
+        results.pop("torch", None)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx-int8"], choices=["torch", "onnx", "onnx-int8"])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--repeats", type=int, default=20, help="Batches timed per batch size")
+    parser.add_argument("--threads", type=int, default=0, help="Intra-op threads, 0 uses the library default")
+    parser.add_argument("--agreement-sentences", type=int, default=500, help="Sentences compared with the torch reference")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--vectors-out", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args)
+    else:
+        print(json.dumps(run(args), indent=2))
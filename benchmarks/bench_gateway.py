@@ -0,0 +1,122 @@
+"""
+LLM gateway benchmark.
+
+Sends the same stream of chat calls through several LLM setups, all against
+local stubs of an OpenAI-compatible endpoint that inject tail latency and
+errors:
+
+  direct    -> plain client for one endpoint (LLM_GATEWAY=false), library retries
+  balanced  -> gateway over two endpoints, no hedging
+  hedged    -> gateway over two endpoints, hedging after the p95 latency
+  failover  -> gateway over an endpoint failing every call, one failing half
+               of them, and a smaller fallback model used while both primary
+               circuit breakers are open
+
+Reports p50/p95/p99 latency, failed calls, hedges and calls per endpoint.
+
+Usage: python benchmarks/bench_gateway.py --requests 500 --concurrency 8 --slow-rate 0.05 --slow-latency 1.0
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import common
+from stub_llm import start_stub_process
+
+
+def start_endpoints(args):
+    behaviour = {"latency": args.latency, "slow_rate": args.slow_rate, "slow_latency": args.slow_latency}
+    stubs = {
+        "a": start_stub_process(args.port, seed=1, **behaviour),
+        "b": start_stub_process(args.port + 1, seed=2, **behaviour),
+        "flaky": start_stub_process(args.port + 2, seed=3, error_rate=0.5, **behaviour),
+        "down": start_stub_process(args.port + 3, seed=4, error_rate=1.0),
+        "small": start_stub_process(args.port + 4, seed=5, latency=args.latency / 2),
+    }
+    return {name: process for name, (process, _) in stubs.items()}, {name: url for name, (_, url) in stubs.items()}
+
+
+def configure(mode, urls, args):
+    os.environ.update({
+        "API_KEY": "stub", "MODEL": "stub", "BASE_URL": urls["a"], "LLM_GATEWAY": "true", "LLM_HEDGE_AFTER": "off",
+        "LLM_BREAKER_RESET": str(args.breaker_reset),
+    })
+    os.environ.pop("LLM_ENDPOINTS", None)
+    if mode == "direct":
+        os.environ["LLM_GATEWAY"] = "false"
+        return
+    if mode == "failover":
+        endpoints = [
+            {"name": "down", "base_url": urls["down"]},
+            {"name": "flaky", "base_url": urls["flaky"]},
+            {"name": "small", "base_url": urls["small"], "fallback": True},
+        ]
+    else:
+        endpoints = [{"name": "a", "base_url": urls["a"]}, {"name": "b", "base_url": urls["b"]}]
+    if mode == "hedged":
+        os.environ["LLM_HEDGE_AFTER"] = "p95"
+    os.environ["LLM_ENDPOINTS"] = json.dumps(endpoints)
+
+
+async def drive(llm, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, failed = [], 0
+
+    async def call(i):
+        nonlocal failed
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await llm.ainvoke(f"question {i}")
+                latencies.append(time.perf_counter() - start)
+            except Exception:
+                failed += 1
+
+    await asyncio.gather(*(call(i) for i in range(requests)))
+    return latencies, failed
+
+
+def run(args):
+    from models import create_chat_model, create_http_clients
+
+    processes, urls = start_endpoints(args)
+    results = {}
+    try:
+        for mode in args.modes:
+            configure(mode, urls, args)
+            clients = create_http_clients()
+            llm = create_chat_model(http_client=clients[0], http_async_client=clients[1])
+            latencies, failed = asyncio.run(drive(llm, args.requests, args.concurrency))
+            summary = common.summarize(latencies)
+            result = {key: summary[key] for key in ("p50_ms", "p95_ms", "p99_ms")}
+            result["failed"] = failed
+            if hasattr(llm, "stats"):
+                stats = llm.stats()
+                result["hedges"] = stats["hedges"]
+                result["hedges_won"] = stats["hedges_won"]
+                result["calls_per_endpoint"] = {name: endpoint["calls"] for name, endpoint in stats["endpoints"].items()}
+                result["breaker_trips"] = {name: endpoint["breaker_trips"] for name, endpoint in stats["endpoints"].items()}
+            results[mode] = result
+            clients[0].close()
+    finally:
+        for process in processes.values():
+            process.terminate()
+    return {"requests": args.requests, "concurrency": args.concurrency, "results": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--modes", nargs="+", default=["direct", "balanced", "hedged", "failover"],
+                        choices=["direct", "balanced", "hedged", "failover"])
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub seconds per normal completion")
+    parser.add_argument("--slow-rate", type=float, default=0.05, help="Share of completions that are slow")
+    parser.add_argument("--slow-latency", type=float, default=1.0, help="Stub seconds per slow completion")
+    parser.add_argument("--breaker-reset", type=float, default=2.0, help="Seconds before an open breaker lets a probe through")
+    parser.add_argument("--port", type=int, default=9110, help="First of five ports used by the stub endpoints")
+    args = parser.parse_args()
+
+    print(json.dumps(run(args), indent=2))
@@ -0,0 +1,96 @@
+"""
+PDF ingestion benchmark over a corpus of generated PDFs.
+
+Compares the legacy path (temp file + PyPDFLoader, split everything, one
+add_documents call) with the staged pipeline behind store_pdf_in_db
+(in-memory parse, streamed splits, fixed-size embedding batches, bounded bulk
+inserts). Every run happens in a fresh subprocess so peak RSS is per run.
+
+Usage: python benchmarks/bench_ingest_pdf.py --pages 10 100 500
+       python benchmarks/bench_ingest_pdf.py --pages 100 --real-model --workers 2
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import common
+from corpus import make_pdf
+from fakes import FakeVectorStore
+
+
+class Upload:
+    """Minimal stand-in for FastAPI's UploadFile."""
+
+    def __init__(self, filename):
+        self.filename = filename
+
+
+def run_once(mode, pages, real_model):
+    import db
+    import utils
+    from langchain_community.document_loaders import PyPDFLoader
+
+    if real_model:
+        from models import create_hugging_face_embedding_model
+        store = FakeVectorStore(embedding=create_hugging_face_embedding_model(), discard_writes=True)
+    else:
+        store = FakeVectorStore(discard_writes=True)
+
+    content = make_pdf(pages)
+    start = time.perf_counter()
+
+    if mode == "legacy":
+        temp_file_path = f"temp_bench_{pages}.pdf"
+        with open(temp_file_path, "wb") as f:
+            f.write(content)
+        try:
+            splits = utils.doc_splitter(PyPDFLoader(temp_file_path).load())
+        finally:
+            os.remove(temp_file_path)
+        store.add_documents(splits)
+        chunks = len(splits)
+    else:
+        stats = db.store_pdf_in_db(Upload(f"bench_{pages}.pdf"), content, store)
+        chunks = stats["chunks_stored"]
+
+    elapsed = time.perf_counter() - start
+    return {
+        "mode": mode,
+        "pages": pages,
+        "chunks": chunks,
+        "seconds": round(elapsed, 3),
+        "pages_per_sec": round(pages / elapsed, 2),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--modes", nargs="+", default=["legacy", "pipeline"])
+    parser.add_argument("--real-model", action="store_true", help="Embed with all-MiniLM-L6-v2 instead of a fake embedding")
+    parser.add_argument("--workers", type=int, default=0, help="INGEST_EMBED_WORKERS for the pipeline")
+    parser.add_argument("--run", nargs=2, metavar=("MODE", "PAGES"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_once(args.run[0], int(args.run[1]), args.real_model)))
+        sys.exit(0)
+
+    env = {
+        "CHUNK_TOKENIZER": "model" if args.real_model else "approx",
+        **os.environ,
+        "INGEST_EMBED_WORKERS": str(args.workers),
+    }
+    results = []
+    for pages in args.pages:
+        for mode in args.modes:
+            command = [sys.executable, __file__, "--run", mode, str(pages)] + (["--real-model"] if args.real_model else [])
+            output = subprocess.run(command, env=env, capture_output=True, text=True, check=True).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(json.dumps(results, indent=2))
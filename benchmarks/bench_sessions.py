@@ -0,0 +1,85 @@
+"""
+Conversation history benchmark.
+
+Simulates a long chat session and reports the size of the RAG prompt's
+history at selected turns, sending the full history every turn (naive)
+vs. the session memory (running summary + recent turns). Also reports how
+many extra LLM calls condensation and summarization cost per turn.
+
+The LLM is a local fake: answers and summaries are synthetic text of a
+fixed length, so sizes are counted in whitespace-separated words.
+
+Usage: python benchmarks/bench_sessions.py --turns 50 --recent-turns 4
+"""
+import argparse
+import json
+import random
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+
+import common
+from corpus import make_sentence
+from prompts import rag_retrieval_prompt
+from sessions import ConversationMemory, SessionStore
+
+FOLLOW_UPS = ["and what about it?", "why?", "how does that work", "Can you give an example of this?"]
+
+
+def words(messages):
+    return sum(len(message.content.split()) for message in messages)
+
+
+def make_text(rng, count):
+    text = []
+    while len(text) < count:
+        text += make_sentence(rng).split()
+    return " ".join(text[:count])
+
+
+def run(args):
+    rng = random.Random(0)
+    summaries = [make_text(rng, args.summary_words) for _ in range(args.turns)]
+    helper = FakeListChatModel(responses=summaries)
+    memory = ConversationMemory(SessionStore(), helper, recent_turns=args.recent_turns, summary_max_words=args.summary_words)
+    session = memory.get("benchmark")
+    prompt = rag_retrieval_prompt()
+
+    naive, rows = [], {}
+    for turn in range(1, args.turns + 1):
+        query = rng.choice(FOLLOW_UPS) if turn % 2 == 0 else make_text(rng, 12) + "?"
+        memory.condense_query(session, query)
+        history = memory.history_messages(session)
+        messages = prompt.invoke({"context": "", "query": query, "history": history}).to_messages()
+
+        if turn in args.report or turn == args.turns:
+            rows[turn] = {
+                "naive_history_words": words(naive),
+                "session_history_words": words(history),
+                "session_prompt_words": words(messages),
+            }
+
+        answer = make_text(rng, args.answer_words)
+        memory.record(session, query, answer)
+        naive += [HumanMessage(query), AIMessage(answer)]
+
+    stats = memory.stats()
+    return {
+        "turns": args.turns,
+        "recent_turns": args.recent_turns,
+        "history_by_turn": rows,
+        "condense_calls_per_turn": round(stats["condensed"] / args.turns, 3),
+        "summary_calls_per_turn": round(stats["compactions"] / args.turns, 3),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--recent-turns", type=int, default=4)
+    parser.add_argument("--answer-words", type=int, default=150)
+    parser.add_argument("--summary-words", type=int, default=150)
+    parser.add_argument("--report", type=int, nargs="+", default=[1, 5, 10, 25, 50], help="Turns to report")
+    args = parser.parse_args()
+
+    print(json.dumps(run(args), indent=2))
@@ -0,0 +1,153 @@
+"""
+Startup time benchmark.
+
+Reports three breakdowns, each measured in fresh interpreters:
+
+  imports -> `python -X importtime` of backend/server.py: total, and the
+             cumulative import time of each backend module and of the
+             heaviest third-party packages
+  model   -> embedding model import, load and warm-up pass, then one query
+  server  -> time until uvicorn answers /healthz and /readyz with a local
+             vector store, per startup phase, with initialization on a
+             background thread (STARTUP_BACKGROUND=true) and inline (false)
+
+Usage: python benchmarks/bench_startup.py --runs 3
+"""
+import argparse
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+import common
+
+MODEL_SCRIPT = """
+import json, time
+start = time.perf_counter()
+from models import create_hugging_face_embedding_model, warm_up_embedding_model
+import langchain_huggingface, sentence_transformers
+imported = time.perf_counter()
+model = create_hugging_face_embedding_model()
+loaded = time.perf_counter()
+warm_up_embedding_model(model)
+warmed = time.perf_counter()
+model.embed_query("How are documents ingested?")
+queried = time.perf_counter()
+print(json.dumps({
+    "import_seconds": imported - start,
+    "load_seconds": loaded - imported,
+    "warmup_seconds": warmed - loaded,
+    "first_query_seconds": queried - warmed,
+}))
+"""
+
+
+def measure_imports(top):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import server"],
+        cwd=common.BACKEND_DIR, capture_output=True, text=True,
+    )
+    backend_modules = {name[:-3] for name in os.listdir(common.BACKEND_DIR) if name.endswith(".py")}
+    modules, packages = {}, {}
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)", line)
+        if not match:
+            continue
+        cumulative, name = int(match.group(2)) / 1e6, match.group(4)
+        if name in backend_modules:
+            modules[name] = round(cumulative, 3)
+        elif "." not in name:
+            packages[name] = max(packages.get(name, 0), round(cumulative, 3))
+    return {
+        "total_seconds": modules.get("server"),
+        "backend_modules_seconds": dict(sorted(modules.items(), key=lambda item: -item[1])),
+        "top_packages_seconds": dict(sorted(packages.items(), key=lambda item: -item[1])[:top]),
+    }
+
+
+def measure_model():
+    result = subprocess.run([sys.executable, "-c", MODEL_SCRIPT], cwd=common.BACKEND_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        return {"error": result.stderr.strip().splitlines()[-1]}
+    return {key: round(value, 3) for key, value in json.loads(result.stdout.strip().splitlines()[-1]).items()}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_server(background, timeout):
+    port = free_port()
+    env = {
+        **os.environ,
+        "VECTOR_STORE": "local",
+        "LOCAL_STORE_PATH": tempfile.mkdtemp(),
+        "STARTUP_BACKGROUND": "true" if background else "false",
+        "BASE_URL": "http://127.0.0.1:9/v1",
+        "API_KEY": "unused",
+    }
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port)],
+        cwd=common.BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    healthy = ready = None
+    state = {}
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=1) as client:
+            while ready is None and time.perf_counter() - start < timeout and process.poll() is None:
+                try:
+                    if healthy is None and client.get("/healthz").status_code == 200:
+                        healthy = time.perf_counter() - start
+                    response = client.get("/readyz")
+                    state = response.json()
+                    if response.status_code == 200:
+                        ready = time.perf_counter() - start
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.02)
+    finally:
+        process.terminate()
+        process.wait()
+    return {
+        "healthz_seconds": round(healthy, 3) if healthy else None,
+        "readyz_seconds": round(ready, 3) if ready else None,
+        "phases_seconds": state.get("phases_seconds"),
+        "errors": state.get("errors") or None,
+    }
+
+
+def median_runs(runs):
+    keys = [key for key in runs[0] if key.endswith("_seconds") and isinstance(runs[0][key], (int, float))]
+    return {key: round(statistics.median(run[key] for run in runs if run[key] is not None), 3)
+            for key in keys if any(run[key] is not None for run in runs)}
+
+
+def run(args):
+    results = {"imports": measure_imports(args.top)}
+    if not args.skip_model:
+        results["model"] = measure_model()
+    for background in (True, False):
+        runs = [measure_server(background, args.timeout) for _ in range(args.runs)]
+        results[f"server_background_{str(background).lower()}"] = {"median": median_runs(runs), "last_run": runs[-1]}
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10, help="Third-party packages listed in the import breakdown")
+    parser.add_argument("--timeout", type=float, default=120, help="Seconds to wait for /readyz per run")
+    parser.add_argument("--skip-model", action="store_true", help="Skip the embedding model measurement")
+    args = parser.parse_args()
+
+    print(json.dumps(run(args), indent=2))
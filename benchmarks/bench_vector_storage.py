@@ -0,0 +1,145 @@
+"""
+Compact vector storage benchmark.
+
+For each storage layout (BSON array of doubles, packed float32 binary vector,
+int8 binary vector) reports BSON bytes per chunk and client-side encode
+throughput; with --mongo-uri it also bulk-inserts into a scratch collection
+and reports insert throughput and the collection's storage statistics.
+
+Recall@k of each index variant (float, scalar/int8, binary) against exact
+float search is simulated offline by exhaustive search over the quantized
+vectors, with and without local rescoring of k * rescore_factor candidates
+(float storage only; int8 storage has no full-precision vectors to rescore with).
+This is an upper bound on what the quantized ANN index achieves.
+
+Usage: python benchmarks/bench_vector_storage.py --chunks 20000 --rescore-factor 4
+       python benchmarks/bench_vector_storage.py --mongo-uri "$MONGO_API_KEY"
+"""
+import argparse
+import json
+import random
+import time
+
+import bson
+import numpy as np
+
+import common
+from bench_vectorstores import make_corpus
+from corpus import make_sentence
+from quantization import STORAGE_FORMATS, decode_vector, encode_vector, quantize_int8
+from vectorstores import _normalize, _top_k
+
+
+def make_chunks(vectors, seed=0):
+    rng = random.Random(seed)
+    text = " ".join(make_sentence(rng) for _ in range(12))[:1000]
+    return [
+        {"_id": f"{i:032x}", "text": text, "embedding": vector, "source": "benchmark.pdf", "page": i // 10, "start_index": 0}
+        for i, vector in enumerate(vectors)
+    ]
+
+
+def measure_layout(chunks, storage, mongo_uri=None):
+    start = time.perf_counter()
+    documents = [{**chunk, "embedding": encode_vector(chunk["embedding"], storage)} for chunk in chunks]
+    encoded = [bson.encode(document) for document in documents]
+    encode_seconds = time.perf_counter() - start
+
+    result = {
+        "bytes_per_chunk": round(sum(map(len, encoded)) / len(encoded), 1),
+        "embedding_bytes_per_chunk": len(bson.encode({"embedding": documents[0]["embedding"]})),
+        "encode_chunks_per_sec": round(len(chunks) / encode_seconds, 1),
+    }
+
+    if mongo_uri:
+        from pymongo import MongoClient
+        collection = MongoClient(mongo_uri)["benchmarks"][f"vector_storage_{storage}"]
+        collection.drop()
+        start = time.perf_counter()
+        for offset in range(0, len(documents), 1000):
+            collection.insert_many(documents[offset:offset + 1000], ordered=False)
+        insert_seconds = time.perf_counter() - start
+        stats = collection.database.command("collStats", collection.name)
+        result.update({
+            "insert_chunks_per_sec": round(len(documents) / insert_seconds, 1),
+            "avg_obj_size": stats.get("avgObjSize"),
+            "storage_size_bytes": stats.get("storageSize"),
+        })
+        collection.drop()
+
+    # Round trip the stored vector to check it decodes to the same direction
+    decoded = decode_vector(bson.decode(encoded[0])["embedding"])
+    original = np.asarray(chunks[0]["embedding"], dtype=np.float32)
+    result["roundtrip_cosine"] = round(float(decoded @ original / (np.linalg.norm(decoded) * np.linalg.norm(original))), 5)
+    return result
+
+
+def measure_recall(vectors, queries, k, rescore_factor):
+    truth = [set(_top_k(vectors @ query, k)) for query in queries]
+    int8 = _normalize(np.stack([quantize_int8(vector) for vector in vectors]).astype(np.float32))
+    bits = np.packbits(vectors > 0, axis=1)
+
+    def search(candidates_fn, rescore_with):
+        hits, rescored_hits = 0, 0
+        for query, expected in zip(queries, truth):
+            candidates = candidates_fn(query, k * rescore_factor)
+            hits += len(expected & set(candidates[:k]))
+            if rescore_with is not None:
+                scores = rescore_with[candidates] @ query
+                rescored_hits += len(expected & set(candidates[np.argsort(-scores)[:k]]))
+        total = k * len(queries)
+        if rescore_with is None:
+            return {f"recall@{k}": round(hits / total, 4)}
+        return {f"recall@{k}": round(hits / total, 4), f"recall@{k}_rescored": round(rescored_hits / total, 4)}
+
+    def scalar_candidates(query, n):
+        return _top_k(int8 @ _normalize(quantize_int8(query).astype(np.float32)), n)
+
+    def binary_candidates(query, n):
+        distances = np.unpackbits(bits ^ np.packbits(query > 0), axis=1).sum(axis=1)
+        return np.argsort(distances, kind="stable")[:n]
+
+    return {
+        "float (current)": {f"recall@{k}": 1.0},
+        "scalar index, float storage": search(scalar_candidates, vectors),
+        "binary index, float storage": search(binary_candidates, vectors),
+        # No full-precision copy to rescore against
+        "int8 storage": search(scalar_candidates, None),
+    }
+
+
+def run(args):
+    if args.real_model:
+        from models import create_hugging_face_embedding_model
+        rng = random.Random(0)
+        model = create_hugging_face_embedding_model()
+        texts = [" ".join(make_sentence(rng) for _ in range(3)) for _ in range(args.chunks + args.queries)]
+        embedded = _normalize(model.embed_documents(texts))
+        vectors, queries = embedded[: args.chunks], embedded[args.chunks:]
+    else:
+        vectors = make_corpus(args.chunks, args.dim, clusters=max(10, args.chunks // 100), seed=0)
+        rng = np.random.default_rng(1)
+        noise = 0.05 * rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+        queries = _normalize(vectors[rng.choice(args.chunks, args.queries)] + noise)
+
+    chunks = make_chunks(vectors.tolist())
+    return {
+        "chunks": args.chunks,
+        "dimensions": int(vectors.shape[1]),
+        "layouts": {storage: measure_layout(chunks, storage, args.mongo_uri) for storage in STORAGE_FORMATS},
+        "recall": measure_recall(vectors, queries, args.k, args.rescore_factor),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--rescore-factor", type=int, default=4)
+    parser.add_argument("--mongo-uri", help="Also insert into a scratch database on this cluster")
+    parser.add_argument("--real-model", action="store_true", help="Embed synthetic text with all-MiniLM-L6-v2")
+    args = parser.parse_args()
+
+    print(json.dumps(run(args), indent=2))
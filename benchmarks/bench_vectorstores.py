@@ -0,0 +1,110 @@
+"""
+Local vector store benchmark: flat (exact) vs IVF index.
+
+Builds clustered synthetic embeddings at several corpus sizes, stores them in
+a LocalVectorStore on disk and reports, per index: build time, time to
+reopen the store (startup), recall@k against exact search, and p50/p99
+query latency. With --tenants, chunks are spread over that many tenants and
+the same queries are also run pre-filtered to one tenant, reporting the
+filtered recall (against exact search within the tenant) and latency.
+
+Usage: python benchmarks/bench_vectorstores.py --sizes 10000 100000 --queries 200 --tenants 50
+"""
+import argparse
+import json
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from langchain_core.documents import Document
+
+import common
+from vectorstores import LocalVectorStore, _normalize
+
+
+def make_corpus(size, dim, clusters, seed):
+    """Unit vectors scattered around `clusters` random centres, like topical document embeddings."""
+    rng = np.random.default_rng(seed)
+    centres = _normalize(rng.standard_normal((clusters, dim)))
+    labels = rng.integers(0, clusters, size)
+    return _normalize(centres[labels] + 1.4 * rng.standard_normal((size, dim)) / np.sqrt(dim))
+
+
+def build(path, index, vectors, batch_size, nprobe, tenants):
+    store = LocalVectorStore(None, path, index=index, nprobe=nprobe)
+    for start in range(0, len(vectors), batch_size):
+        batch = vectors[start:start + batch_size]
+        ids = [str(i) for i in range(start, start + len(batch))]
+        documents = [Document(page_content=id, metadata={"tenant": f"t{int(id) % tenants}"} if tenants else {}) for id in ids]
+        store.add_embeddings(documents, batch, ids)
+
+
+def measure(store, queries, truth, k, filters=None):
+    latencies, hits = [], 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        found = store.similarity_search_by_vector(query, k=k, filter=filters)
+        latencies.append(time.perf_counter() - start)
+        hits += len(expected & {doc.id for doc in found})
+    return round(hits / (k * len(queries)), 4), common.summarize(latencies)
+
+
+def run(args):
+    results = []
+    for size in args.sizes:
+        vectors = make_corpus(size, args.dim, args.clusters, seed=size)
+        rng = np.random.default_rng(0)
+        queries = _normalize(vectors[rng.choice(size, args.queries)] + 0.05 * rng.standard_normal((args.queries, args.dim)))
+        truth = [set(np.argsort(-(vectors @ query))[: args.k].astype(str)) for query in queries]
+        if args.tenants:
+            # Exact top-k within tenant "t0": rows 0, tenants, 2 * tenants, ...
+            rows = np.arange(0, size, args.tenants)
+            tenant_truth = [set(rows[np.argsort(-(vectors[rows] @ query))[: args.k]].astype(str)) for query in queries]
+
+        for index in args.indexes:
+            path = tempfile.mkdtemp()
+            start = time.perf_counter()
+            build(path, index, vectors, args.batch_size, args.nprobe, args.tenants)
+            build_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            store = LocalVectorStore(None, path, index=index, nprobe=args.nprobe)
+            open_seconds = time.perf_counter() - start
+
+            recall, summary = measure(store, queries, truth, args.k)
+            result = {
+                "size": size,
+                "index": index,
+                "build_seconds": round(build_seconds, 3),
+                "open_ms": round(open_seconds * 1000, 3),
+                f"recall@{args.k}": recall,
+                "p50_ms": summary["p50_ms"],
+                "p99_ms": summary["p99_ms"],
+            }
+            if args.tenants:
+                recall, summary = measure(store, queries, tenant_truth, args.k, {"tenant": {"$eq": "t0"}})
+                result.update({
+                    f"tenant_recall@{args.k}": recall,
+                    "tenant_p50_ms": summary["p50_ms"],
+                    "tenant_p99_ms": summary["p99_ms"],
+                })
+            results.append(result)
+            shutil.rmtree(path)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--indexes", nargs="+", default=["flat", "ivf"], choices=["flat", "ivf"])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=200, help="Topic clusters in the synthetic corpus")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--nprobe", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=5000, help="Vectors per add_embeddings call")
+    parser.add_argument("--tenants", type=int, default=0, help="Spread chunks over this many tenants and also search one of them (0: off)")
+    args = parser.parse_args()
+
+    print(json.dumps(run(args), indent=2))
@@ -0,0 +1,226 @@
+"""
+Multi-worker deployment benchmark.
+
+Launches the production server (`python app.py serve`) over TCP with a
+pre-built local vector store and a local stub LLM, for each worker count and
+embedding mode:
+
+  shared  -> one embedding server process holds the model, workers embed
+             through it over a Unix socket (the default)
+  private -> every worker loads its own copy of the model (--model-per-worker)
+
+and reports per run:
+  - /invoke throughput and p50/p95/p99 latency at --concurrency clients
+  - resident (RSS) and proportional (PSS, shared pages split between the
+    processes mapping them) memory of the workers, the embedding server and
+    the whole process tree
+  - drain: statuses of the requests in flight when SIGTERM arrives (all 200
+    when the workers finish them before exiting)
+
+The query embedding cache and the response cache are disabled, so every
+request runs the model.
+
+Usage: python benchmarks/bench_workers.py --workers 1 2 4 --requests 2000 --concurrency 64
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+import common
+from bench_startup import free_port
+from corpus import make_sentence
+from load_invoke import drive
+from stub_llm import start_stub_process
+
+ROOT_DIR = os.path.dirname(common.BENCH_DIR)
+
+
+def build_store(path, documents):
+    from models import create_hugging_face_embedding_model
+    from vectorstores import LocalVectorStore
+
+    rng = random.Random(0)
+    texts = [" ".join(make_sentence(rng) for _ in range(4)) for _ in range(documents)]
+    store = LocalVectorStore(create_hugging_face_embedding_model(), path)
+    for start in range(0, len(texts), 256):
+        store.add_texts(texts[start:start + 256])
+
+
+def read_memory(pid):
+    """Returns (rss_mb, pss_mb) of a process from /proc, or None once it is gone."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            rss = next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            pss = next(int(line.split()[1]) for line in f if line.startswith("Pss:"))
+    except (OSError, StopIteration):
+        return None
+    return round(rss / 1024, 1), round(pss / 1024, 1)
+
+
+def process_tree(root):
+    """Returns {pid: command line} for root and all its descendants."""
+    children = {}
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat") as f:
+                parent = int(f.read().rsplit(")", 1)[1].split()[1])
+            with open(f"/proc/{name}/cmdline", "rb") as f:
+                command = f.read().replace(b"\0", b" ").decode(errors="replace")
+        except OSError:
+            continue
+        children.setdefault(parent, []).append((int(name), command))
+
+    tree, pending = {}, [root]
+    while pending:
+        for pid, command in children.get(pending.pop(), []):
+            tree[pid] = command
+            pending.append(pid)
+    return tree
+
+
+def memory_report(launcher):
+    workers, supervisor, embed_server, total_rss, total_pss = [], None, None, 0.0, 0.0
+    for pid, command in process_tree(launcher.pid).items():
+        memory = read_memory(pid)
+        if memory is None:
+            continue
+        total_rss += memory[0]
+        total_pss += memory[1]
+        if "embed_server.py" in command:
+            embed_server = {"rss_mb": memory[0], "pss_mb": memory[1]}
+        elif "spawn_main" in command:
+            workers.append(memory)
+        elif "uvicorn" in command:
+            supervisor = memory
+    # With one worker uvicorn serves from the supervisor process itself
+    workers = workers or [supervisor]
+    return {
+        "workers": len(workers),
+        "worker_rss_mb": round(sum(rss for rss, _ in workers) / max(1, len(workers)), 1),
+        "worker_pss_mb": round(sum(pss for _, pss in workers) / max(1, len(workers)), 1),
+        "embed_server": embed_server,
+        "total_rss_mb": round(total_rss, 1),
+        "total_pss_mb": round(total_pss, 1),
+    }
+
+
+def wait_ready(base_url, workers, timeout):
+    """Waits until /readyz answers 200 on enough consecutive new connections to have reached every worker."""
+    deadline = time.perf_counter() + timeout
+    ready = 0
+    with httpx.Client(base_url=base_url, timeout=2) as client:
+        while time.perf_counter() < deadline:
+            try:
+                ready = ready + 1 if client.get("/readyz", headers={"Connection": "close"}).status_code == 200 else 0
+            except httpx.TransportError:
+                ready = 0
+            # New connections are spread over the workers; several in a row means all are up
+            if ready >= 4 * workers:
+                return
+            time.sleep(0.05)
+    raise RuntimeError(f"Server at {base_url} not ready after {timeout}s")
+
+
+async def load(base_url, concurrency, requests):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        await drive(client, "/invoke", concurrency, concurrency * 2)  # warm-up
+        return await drive(client, "/invoke", concurrency, requests)
+
+
+async def drain(base_url, launcher, concurrency):
+    """Sends SIGTERM while `concurrency` requests are in flight; returns how many still succeeded."""
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        async def ask(i):
+            try:
+                return (await client.post("/invoke", json={"user_query": f"drain {i}"})).status_code
+            except httpx.TransportError:
+                return "connection_error"
+
+        requests = [asyncio.create_task(ask(i)) for i in range(concurrency)]
+        await asyncio.sleep(0.2)
+        launcher.send_signal(signal.SIGTERM)
+        statuses = await asyncio.gather(*requests)
+    counts = {}
+    for status in statuses:
+        counts[status] = counts.get(status, 0) + 1
+    return {"in_flight": concurrency, "statuses": counts}
+
+
+def run_one(workers, mode, store_path, llm_url, args):
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = {
+        **os.environ, "VECTOR_STORE": "local", "LOCAL_STORE_PATH": store_path, "BASE_URL": llm_url, "API_KEY": "stub",
+        "MODEL": "stub", "LLM_GATEWAY": "false", "RESPONSE_CACHE": "off", "EMBED_CACHE_SIZE": "0",
+        "SESSION_STORE_PATH": os.path.join(store_path, "sessions.sqlite"),
+        "JOBS_STATE_PATH": os.path.join(store_path, "jobs.sqlite"),
+        "EMBED_SERVER": os.path.join(store_path, f"embed-{port}.sock"),
+    }
+    command = [sys.executable, "app.py", "serve", "--workers", str(workers), "--host", "127.0.0.1", "--port", str(port)]
+    if mode == "private":
+        command.append("--model-per-worker")
+
+    start = time.perf_counter()
+    launcher = subprocess.Popen(command, cwd=ROOT_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_ready(base_url, workers, args.timeout)
+        startup_seconds = time.perf_counter() - start
+        stats = asyncio.run(load(base_url, args.concurrency, args.requests))
+        memory = memory_report(launcher)
+        drained = asyncio.run(drain(base_url, launcher, args.concurrency))
+        launcher.wait(timeout=args.timeout)
+    finally:
+        if launcher.poll() is None:
+            launcher.terminate()  # lets the launcher stop the workers and the embedding server
+            launcher.wait()
+    return {
+        "startup_seconds": round(startup_seconds, 2),
+        "throughput_rps": stats["throughput_rps"],
+        "statuses": stats["statuses"],
+        **{key: stats[key] for key in ("p50_ms", "p95_ms", "p99_ms")},
+        **memory,
+        "drain": drained,
+    }
+
+
+def run(args):
+    store_path = tempfile.mkdtemp()
+    build_store(store_path, args.documents)
+    stub, llm_url = start_stub_process(args.llm_port, latency=args.llm_latency)
+    results = {}
+    try:
+        for mode in args.modes:
+            for workers in args.workers:
+                results[f"{mode}/w{workers}"] = run_one(workers, mode, store_path, llm_url, args)
+    finally:
+        stub.terminate()
+    return {"cpus": os.cpu_count(), "documents": args.documents, "requests": args.requests,
+            "concurrency": args.concurrency, "results": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--modes", nargs="+", default=["shared", "private"], choices=["shared", "private"])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--documents", type=int, default=2000, help="Chunks in the pre-built local store")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Stub LLM seconds per completion")
+    parser.add_argument("--llm-port", type=int, default=9130)
+    parser.add_argument("--timeout", type=float, default=180, help="Seconds allowed for startup and shutdown")
+    args = parser.parse_args()
+
+    print(json.dumps(run(args), indent=2))
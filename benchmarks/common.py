@@ -0,0 +1,50 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Importing this module puts `backend/` on sys.path so the benchmarks can use
+the backend modules the same way `uvicorn server:app` does.
+"""
+import os
+import statistics
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(os.path.dirname(BENCH_DIR), "backend")
+
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+def percentile(values, pct):
+    """Returns the pct-th percentile (0-100) of values using nearest-rank."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies):
+    """
+    Summarizes a list of latencies in seconds.
+
+    Returns:
+        dict -> count, mean, p50, p95 and p99 in milliseconds
+    """
+    return {
+        "count": len(latencies),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def import_server():
+    """
+    Imports backend/server.py the way uvicorn does (from inside backend/)
+    without running its startup hooks.
+    """
+    os.chdir(BACKEND_DIR)
+    import server
+    return server
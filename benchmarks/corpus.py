@@ -0,0 +1,93 @@
+"""
+Synthetic document corpora for the benchmarks.
+"""
+import random
+
+WORDS = (
+    "vector index query embedding retrieval document chunk model latency throughput "
+    "cluster shard replica token context answer source page section table figure "
+    "network storage memory cache batch worker request response error timeout"
+).split()
+
+
+def make_sentence(rng, words=12):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def make_pdf(pages, lines_per_page=45, seed=0):
+    """
+    Generates a text-only PDF with `pages` pages of pseudo-random sentences.
+
+    The file is written by hand (one Helvetica font, one content stream per
+    page) so the benchmarks need no PDF-writing dependency.
+
+    Returns:
+        bytes -> the PDF file
+    """
+    rng = random.Random(seed)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once the page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+
+    page_refs = []
+    for page in range(pages):
+        lines = [f"Page {page + 1}"] + [make_sentence(rng) for _ in range(lines_per_page)]
+        text = " T* ".join(f"({line})'" if i else f"({line}) Tj" for i, line in enumerate(lines))
+        stream = f"BT /F1 9 Tf 11 TL 40 800 Td {text} ET".encode()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref
+        )
+        page_refs.append(len(objects))
+
+    kids = " ".join(f"{ref} 0 R" for ref in page_refs).encode()
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, pages)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def make_topic_word(rng):
+    return "".join(rng.choice("bdfgklmnprstvz") + rng.choice("aeiou") for _ in range(3))
+
+
+def make_sectioned_html(rng, sections=6, paragraphs=4, sentences=5):
+    """
+    Generates an HTML page of <h2> sections, each about its own topic: a few
+    made-up words mixed into every sentence of the section. Every section
+    states one fact (a unique code) in a random paragraph.
+
+    Returns:
+        (html, facts) -> str, list of {"query", "answer"} with one fact per section
+    """
+    parts, facts = [f"<html><head><title>Manual {rng.randrange(10**6)}</title></head><body>"], []
+    for _ in range(sections):
+        topic = [make_topic_word(rng) for _ in range(6)]
+        code = f"{make_topic_word(rng)}-{rng.randrange(10**5)}"
+        title = f"{topic[0].capitalize()} {topic[1].capitalize()}"
+        fact_paragraph = rng.randrange(paragraphs)
+        parts.append(f"<h2>{title}</h2>")
+        for number in range(paragraphs):
+            text = [
+                " ".join(rng.choice(topic) if rng.random() < 0.4 else rng.choice(WORDS) for _ in range(12)).capitalize() + "."
+                for _ in range(sentences)
+            ]
+            if number == fact_paragraph:
+                text.insert(rng.randint(0, sentences), f"The {topic[2]} {topic[3]} code is {code}.")
+            parts.append(f"<p>{' '.join(text)}</p>")
+        facts.append({"query": f"{title}: which code does the {topic[2]} {topic[3]} use?", "answer": code})
+    parts.append("</body></html>")
+    return "".join(parts), facts
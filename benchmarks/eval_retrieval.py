@@ -0,0 +1,154 @@
+"""
+Offline retrieval evaluation: dense vs lexical vs hybrid (RRF) vs hybrid with
+cross-encoder re-ranking.
+
+Indexes a corpus into a temporary local vector store and lexical index, runs
+every query through each pipeline and reports recall@k, MRR and p50/p99
+latency per mode, overall and per query type. The built-in synthetic corpus
+mixes exact-term queries (error codes) with paraphrased topical queries; pass
+--corpus/--queries to evaluate on real data.
+
+    corpus JSONL:  {"id": "...", "text": "..."}
+    queries JSONL: {"query": "...", "relevant": ["id", ...], "type": "optional label"}
+
+Usage: python benchmarks/eval_retrieval.py --documents 2000 --queries 300 --k 4
+       python benchmarks/eval_retrieval.py --real-model --reranker cross-encoder/ms-marco-MiniLM-L-6-v2
+"""
+import argparse
+import json
+import random
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+
+from langchain_core.documents import Document
+
+import common
+from corpus import WORDS, make_sentence
+from fakes import HashingEmbedding
+from retrieval import CrossEncoderReranker, HybridRetriever, LexicalIndex
+from vectorstores import LocalVectorStore
+
+
+def make_dataset(documents, queries, seed=0):
+    """
+    Synthetic chunks of topical sentences, each mentioning one unique error
+    code. Half of the queries ask for a code, the other half paraphrase one
+    of the chunk's sentences with a third of its words dropped.
+    """
+    rng = random.Random(seed)
+    corpus, codes = [], []
+    for number in range(documents):
+        code = f"E{rng.randint(1000, 9999)}-{number}"
+        sentences = [make_sentence(rng) for _ in range(4)]
+        sentences.insert(rng.randint(0, 4), f"Error {code} is raised when the {rng.choice(WORDS)} {rng.choice(WORDS)} fails.")
+        corpus.append({"id": f"doc-{number}", "text": " ".join(sentences)})
+        codes.append((code, sentences))
+
+    evaluation = []
+    for _ in range(queries):
+        number = rng.randrange(documents)
+        code, sentences = codes[number]
+        if rng.random() < 0.5:
+            evaluation.append({"query": f"What does {code} mean?", "relevant": [f"doc-{number}"], "type": "exact_term"})
+        else:
+            words = [word for word in rng.choice(sentences).split() if rng.random() > 0.33]
+            evaluation.append({"query": " ".join(words), "relevant": [f"doc-{number}"], "type": "topical"})
+    return corpus, evaluation
+
+
+def load_jsonl(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def evaluate(retriever, queries, k):
+    """Returns recall@k, MRR and latency for all queries and per query type."""
+    groups = defaultdict(list)
+    for query in queries:
+        start = time.perf_counter()
+        found = [doc.id for doc in retriever.retrieve(query["query"])]
+        elapsed = time.perf_counter() - start
+
+        relevant = set(query["relevant"])
+        rank = next((i for i, id in enumerate(found, start=1) if id in relevant), None)
+        outcome = (len(relevant & set(found[:k])) / len(relevant), 1 / rank if rank else 0.0, elapsed)
+        groups["all"].append(outcome)
+        if "type" in query:
+            groups[query["type"]].append(outcome)
+
+    results = {}
+    for label, outcomes in groups.items():
+        recalls, reciprocal_ranks, latencies = zip(*outcomes)
+        summary = common.summarize(list(latencies))
+        results[label] = {
+            "queries": len(outcomes),
+            f"recall@{k}": round(sum(recalls) / len(outcomes), 4),
+            "mrr": round(sum(reciprocal_ranks) / len(outcomes), 4),
+            "p50_ms": summary["p50_ms"],
+            "p99_ms": summary["p99_ms"],
+        }
+    return results
+
+
+def run(args):
+    if args.corpus:
+        corpus, queries = load_jsonl(args.corpus), load_jsonl(args.queries_file)
+    else:
+        corpus, queries = make_dataset(args.documents, args.queries)
+
+    if args.real_model:
+        from models import create_hugging_face_embedding_model
+        embedding = create_hugging_face_embedding_model()
+    else:
+        embedding = HashingEmbedding()
+
+    path = tempfile.mkdtemp()
+    store = LocalVectorStore(embedding, path, index="flat")
+    lexical = LexicalIndex()
+    for start in range(0, len(corpus), 256):
+        batch = corpus[start:start + 256]
+        ids = [record["id"] for record in batch]
+        documents = [Document(page_content=record["text"]) for record in batch]
+        store.add_embeddings(documents, embedding.embed_documents([doc.page_content for doc in documents]), ids)
+        lexical.add(ids, documents)
+
+    pipelines = {
+        "dense": HybridRetriever(store, mode="dense", k=args.k),
+        "lexical": HybridRetriever(store, lexical, mode="lexical", k=args.k),
+        "hybrid": HybridRetriever(store, lexical, mode="hybrid", k=args.k, candidates=args.candidates),
+    }
+    if args.reranker:
+        reranker = CrossEncoderReranker(args.reranker)
+        pipelines["hybrid+rerank"] = HybridRetriever(
+            store, lexical, mode="hybrid", k=args.k, candidates=args.candidates, reranker=reranker
+        )
+
+    results = {}
+    for name, retriever in pipelines.items():
+        results[name] = evaluate(retriever, queries, args.k)
+        results[name]["stages_mean_ms"] = {
+            stage: round(histogram.snapshot()["mean"] * 1000, 3)
+            for stage, histogram in retriever.latency.items() if histogram.snapshot()["count"]
+        }
+
+    shutil.rmtree(path)
+    return {"documents": len(corpus), "queries": len(queries), "k": args.k, "results": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=2000, help="Synthetic corpus size")
+    parser.add_argument("--queries", type=int, default=300, help="Synthetic query count")
+    parser.add_argument("--corpus", help="Corpus JSONL file instead of the synthetic corpus")
+    parser.add_argument("--queries-file", help="Queries JSONL file, required with --corpus")
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--candidates", type=int, default=20, help="Chunks per retriever before fusion / re-ranking")
+    parser.add_argument("--reranker", help="Cross-encoder model to evaluate hybrid+rerank with")
+    parser.add_argument("--real-model", action="store_true", help="Embed with all-MiniLM-L6-v2 instead of a hashing embedding")
+    args = parser.parse_args()
+    if args.corpus and not args.queries_file:
+        parser.error("--queries-file is required with --corpus")
+
+    print(json.dumps(run(args), indent=2))
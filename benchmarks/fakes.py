@@ -0,0 +1,113 @@
+"""
+Local stand-ins for external services used by the benchmarks.
+"""
+import asyncio
+import re
+import time
+import zlib
+
+import numpy as np
+from langchain_core.embeddings import DeterministicFakeEmbedding, Embeddings
+from langchain_core.vectorstores import InMemoryVectorStore
+
+
+class HashingEmbedding(Embeddings):
+    """
+    Bag-of-words embedding: the normalized sum of a fixed random vector per
+    word. Unlike DeterministicFakeEmbedding, texts sharing words get similar
+    vectors, so retrieval quality can be compared without downloading a model.
+    """
+
+    def __init__(self, size=384):
+        self.size = size
+
+    def _embed(self, text):
+        vector = np.zeros(self.size, dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            vector += np.random.default_rng(zlib.crc32(word.encode())).standard_normal(self.size)
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+class TimedEmbedding(Embeddings):
+    """
+    Wraps an embedding model and adds the cost profile of a real one: a fixed
+    overhead per forward pass plus a cost per text, so batching pays off.
+    Counts forward passes in `calls`.
+    """
+
+    def __init__(self, model, per_call=0.01, per_text=0.001):
+        self.model = model
+        self.per_call = per_call
+        self.per_text = per_text
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        time.sleep(self.per_call + self.per_text * len(texts))
+        return self.model.embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class FakeVectorStore(InMemoryVectorStore):
+    """
+    In-memory stand-in for the MongoDB Atlas vector store.
+
+    Adds a fixed `search_latency` (seconds) to every similarity search to
+    model the network round-trip to Atlas. The async path sleeps without
+    blocking the event loop, like the async Mongo driver does. With
+    `discard_writes` documents are embedded and counted but not kept, so
+    ingestion benchmarks measure the pipeline's memory rather than the store's.
+    """
+
+    def __init__(self, embedding=None, search_latency=0.0, discard_writes=False):
+        super().__init__(embedding or DeterministicFakeEmbedding(size=384))
+        self.search_latency = search_latency
+        self.discard_writes = discard_writes
+        self.written = 0
+
+    def similarity_search(self, query, k=4, **kwargs):
+        time.sleep(self.search_latency)
+        return super().similarity_search(query, k=k, **kwargs)
+
+    async def asimilarity_search(self, query, k=4, **kwargs):
+        await asyncio.sleep(self.search_latency)
+        return super().similarity_search(query, k=k, **kwargs)
+
+    def similarity_search_by_vector(self, embedding, k=4, **kwargs):
+        time.sleep(self.search_latency)
+        return super().similarity_search_by_vector(embedding, k=k, **kwargs)
+
+    async def asimilarity_search_by_vector(self, embedding, k=4, **kwargs):
+        await asyncio.sleep(self.search_latency)
+        return super().similarity_search_by_vector(embedding, k=k, **kwargs)
+
+    def add_documents(self, documents, ids=None, **kwargs):
+        if not self.discard_writes:
+            return super().add_documents(documents, ids=ids, **kwargs)
+        self.embedding.embed_documents([doc.page_content for doc in documents])
+        self.written += len(documents)
+        return ids or []
+
+    def add_embeddings(self, documents, vectors, ids):
+        """Stores documents with precomputed vectors, like a bulk insert into Mongo."""
+        self.written += len(documents)
+        if self.discard_writes:
+            return
+        for id, doc, vector in zip(ids, documents, vectors):
+            self.store[id] = {"id": id, "vector": list(vector), "text": doc.page_content, "metadata": doc.metadata}
+
+
+def create_fake_vectorstore(documents=200, search_latency=0.0):
+    """Builds a FakeVectorStore pre-filled with `documents` synthetic chunks."""
+    store = FakeVectorStore(search_latency=search_latency)
+    store.add_texts([f"Synthetic document {i} about topic {i % 17}. " * 10 for i in range(documents)])
+    return store
@@ -0,0 +1,95 @@
+"""
+Local HTTP server serving a generated documentation site for crawler tests
+and benchmarks.
+
+Pages live at /page/<n>.html, each linking to the next `fanout` pages, and
+are listed in /sitemap.xml. Responses carry an ETag and Last-Modified and
+answer conditional GETs with 304. Bumping `site.version[n]` changes page n.
+"""
+import random
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from corpus import make_sentence
+
+
+class FixtureSite:
+    def __init__(self, pages=50, fanout=3, latency=0.0):
+        self.pages = pages
+        self.fanout = fanout
+        self.latency = latency
+        self.version = [0] * pages
+        self.requests = 0
+        self.not_modified = 0
+
+    def render(self, number):
+        rng = random.Random(number * 1000 + self.version[number])
+        links = "".join(
+            f'<li><a href="/page/{target}.html">Page {target}</a></li>'
+            for target in range(number + 1, min(self.pages, number + 1 + self.fanout))
+        )
+        paragraphs = "".join(f"<p>{make_sentence(rng, 20)}</p>" for _ in range(20))
+        return (
+            f"<html><head><title>Page {number}</title><style>p {{margin: 0}}</style></head>"
+            f"<body><h1>Page {number}</h1>{paragraphs}<ul>{links}</ul></body></html>"
+        )
+
+    def sitemap(self, base_url):
+        urls = "".join(f"<url><loc>{base_url}/page/{n}.html</loc></url>" for n in range(self.pages))
+        return f'<?xml version="1.0"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{urls}</urlset>'
+
+
+def start_fixture_site(site, port=0):
+    """
+    Serves `site` from a daemon thread.
+
+    Returns:
+        (server, base_url)
+    """
+    import time
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, body=b"", headers=None):
+            self.send_response(status)
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            site.requests += 1
+            time.sleep(site.latency)
+            base_url = f"http://{self.headers['Host']}"
+
+            if self.path == "/sitemap.xml":
+                self._send(200, site.sitemap(base_url).encode(), {"Content-Type": "application/xml"})
+                return
+
+            try:
+                number = int(self.path.removeprefix("/page/").removesuffix(".html"))
+                assert 0 <= number < site.pages
+            except (ValueError, AssertionError):
+                self._send(404)
+                return
+
+            etag = f'"{number}-{site.version[number]}"'
+            headers = {"ETag": etag, "Last-Modified": formatdate(1_700_000_000 + site.version[number], usegmt=True)}
+            if self.headers.get("If-None-Match") == etag:
+                site.not_modified += 1
+                self._send(304, headers=headers)
+                return
+
+            self._send(200, site.render(number).encode(), {"Content-Type": "text/html; charset=utf-8", **headers})
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
@@ -0,0 +1,83 @@
+"""
+Load-test harness for /invoke.
+
+Drives the FastAPI app in-process at several concurrency levels against a
+local fake LLM server and an in-memory stand-in for the Mongo vector store.
+It compares the async /invoke path with a sync baseline route that mirrors
+the old threadpool-bound handler, and reports throughput, latency and how
+many requests were shed with 503 by the concurrency limiter.
+
+Usage: python benchmarks/load_invoke.py --concurrency 10 50 200 --requests 400
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import common
+from fakes import create_fake_vectorstore
+from stub_llm import start_stub_process
+
+
+async def drive(client, path, concurrency, requests):
+    latencies, statuses = [], {}
+    pending = iter(range(requests))
+
+    async def user():
+        for i in pending:
+            start = time.perf_counter()
+            response = await client.post(path, json={"user_query": f"question {i % 50}"})
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "throughput_rps": round(requests / elapsed, 2),
+        "statuses": statuses,
+        **common.summarize(latencies),
+    }
+
+
+async def run(args):
+    import httpx
+
+    stub, base_url = start_stub_process(args.llm_port, latency=args.llm_latency)
+    os.environ.update({"BASE_URL": base_url, "API_KEY": "stub", "MODEL": "stub", "RESPONSE_CACHE": "off"})
+
+    server = common.import_server()
+    from chains import invoke_llm
+
+    # Pre-populate the globals the startup hooks would set, with local stand-ins
+    server.vectorstore = create_fake_vectorstore(search_latency=args.search_latency)
+    server.get_rag_chain()
+
+    @server.app.post("/invoke-sync")
+    def invoke_sync(request: server.QueryRequest):
+        return {"response": invoke_llm(request.user_query, server.vectorstore, server.rag_chain)}
+
+    transport = httpx.ASGITransport(app=server.app)
+    results = {"async": [], "sync_baseline": []}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for concurrency in args.concurrency:
+            results["async"].append(await drive(client, "/invoke", concurrency, args.requests))
+            results["sync_baseline"].append(await drive(client, "/invoke-sync", concurrency, args.requests))
+
+    stub.terminate()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Simulated LLM latency in seconds")
+    parser.add_argument("--llm-port", type=int, default=9100)
+    parser.add_argument("--search-latency", type=float, default=0.02, help="Simulated vector search latency in seconds")
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))
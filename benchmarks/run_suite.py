@@ -0,0 +1,291 @@
+"""
+Regression benchmark suite for the query and ingestion paths.
+
+Runs fully offline against a local stub of the OpenAI-compatible endpoint,
+an in-memory stand-in for the vector store and generated PDF/HTML corpora:
+
+  invoke       -> concurrent POST /invoke through the ASGI app, per concurrency level
+  ingest_pdf   -> store_pdf_in_db over generated PDFs, per page count
+  ingest_html  -> store_url_in_db over every page of a local fixture site, per site size
+  cold_start   -> fresh interpreter to the first /invoke answer (startup hooks
+                  replaced by the stand-ins), repeated --starts times
+
+Every scenario runs in its own subprocess, so peak RSS is per scenario. Each
+one reports throughput, p50/p95/p99 latency and peak RSS in one JSON document.
+With --compare the results are checked against a stored baseline and the
+script exits with status 1 when a metric got worse by more than --tolerance.
+
+Usage: python benchmarks/run_suite.py --save-baseline
+       python benchmarks/run_suite.py --compare --tolerance 0.25
+       python benchmarks/run_suite.py --scenarios invoke ingest_pdf --pdf-pages 10 --compare
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+
+import common
+
+SCENARIOS = ("invoke", "ingest_pdf", "ingest_html", "cold_start")
+DEFAULT_BASELINE = os.path.join(common.BENCH_DIR, "baseline.json")
+
+# Metrics compared with the baseline, and whether a higher value is better
+COMPARED = {"throughput": True, "p50_ms": False, "p95_ms": False, "p99_ms": False, "peak_rss_mb": False}
+
+
+def peak_rss_mb():
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def result(latencies, count, seconds, unit, **extra):
+    summary = common.summarize(latencies)
+    return {
+        "throughput": round(count / seconds, 2),
+        "unit": unit,
+        "seconds": round(seconds, 3),
+        **{key: summary[key] for key in ("count", "p50_ms", "p95_ms", "p99_ms")},
+        "peak_rss_mb": peak_rss_mb(),
+        **extra,
+    }
+
+
+def run_invoke(concurrency, args):
+    import httpx
+    from fakes import create_fake_vectorstore
+    from load_invoke import drive
+
+    server = common.import_server()
+    server.vectorstore = create_fake_vectorstore(search_latency=args.search_latency)
+    server.get_rag_chain()
+
+    async def load():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            await drive(client, "/invoke", concurrency, concurrency)  # warm-up
+            return await drive(client, "/invoke", concurrency, args.requests)
+
+    stats = asyncio.run(load())
+    failed = sum(count for status, count in stats["statuses"].items() if status != 200)
+    return {
+        "throughput": stats["throughput_rps"],
+        "unit": "requests/s",
+        "seconds": round(args.requests / stats["throughput_rps"], 3),
+        **{key: stats[key] for key in ("count", "p50_ms", "p95_ms", "p99_ms")},
+        "peak_rss_mb": peak_rss_mb(),
+        "failed": failed,
+    }
+
+
+def run_ingest_pdf(pages, args):
+    import db
+    from bench_ingest_pdf import Upload
+    from corpus import make_pdf
+    from fakes import FakeVectorStore
+
+    store = FakeVectorStore(discard_writes=True)
+    latencies, chunks = [], 0
+    start = time.perf_counter()
+    for seed in range(args.pdf_documents):
+        content = make_pdf(pages, seed=seed)
+        began = time.perf_counter()
+        chunks += db.store_pdf_in_db(Upload(f"suite_{pages}_{seed}.pdf"), content, store)["chunks_stored"]
+        latencies.append(time.perf_counter() - began)
+    return result(latencies, pages * args.pdf_documents, time.perf_counter() - start, "pages/s", chunks=chunks)
+
+
+def run_ingest_html(pages, args):
+    import db
+    from fakes import FakeVectorStore
+    from fixture_site import FixtureSite, start_fixture_site
+
+    site = FixtureSite(pages=pages)
+    server, base_url = start_fixture_site(site)
+    store = FakeVectorStore(discard_writes=True)
+    latencies, chunks = [], 0
+    start = time.perf_counter()
+    try:
+        for number in range(pages):
+            request = SimpleNamespace(url=f"{base_url}/page/{number}.html", tenant=None)
+            began = time.perf_counter()
+            chunks += db.store_url_in_db(store, request)["chunks_stored"]
+            latencies.append(time.perf_counter() - began)
+    finally:
+        server.shutdown()
+    return result(latencies, pages, time.perf_counter() - start, "pages/s", chunks=chunks)
+
+
+def run_first_answer(args):
+    import httpx
+    from fakes import create_fake_vectorstore
+
+    server = common.import_server()
+    server.vectorstore = create_fake_vectorstore(search_latency=args.search_latency)
+    server.get_rag_chain()
+
+    async def ask():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            return (await client.post("/invoke", json={"user_query": "question 0"})).status_code
+
+    return {"status": asyncio.run(ask()), "peak_rss_mb": peak_rss_mb()}
+
+
+def child_command(scenario, size, args):
+    return [
+        sys.executable, os.path.abspath(__file__), "--run", scenario, str(size),
+        "--requests", str(args.requests), "--pdf-documents", str(args.pdf_documents),
+        "--search-latency", str(args.search_latency),
+    ]
+
+
+def run_child(scenario, size, args, env):
+    output = subprocess.run(child_command(scenario, size, args), env=env, capture_output=True, text=True)
+    if output.returncode != 0:
+        raise RuntimeError(f"{scenario} {size} failed:\n{output.stderr[-2000:]}")
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def run_cold_start(args, env):
+    latencies, rss, failed = [], [], 0
+    for _ in range(args.starts):
+        start = time.perf_counter()
+        child = run_child("cold_start", 0, args, env)
+        latencies.append(time.perf_counter() - start)
+        rss.append(child["peak_rss_mb"])
+        failed += child["status"] != 200
+    summary = result(latencies, len(latencies), sum(latencies), "starts/s", failed=failed)
+    summary["peak_rss_mb"] = max(rss)
+    return summary
+
+
+def run(args):
+    from stub_llm import start_stub_process
+
+    stub, base_url = start_stub_process(args.llm_port, latency=args.llm_latency)
+    env = {
+        **os.environ, "BASE_URL": base_url, "API_KEY": "stub", "MODEL": "stub", "LLM_GATEWAY": "false",
+        "RESPONSE_CACHE": "off", "INGEST_EMBED_WORKERS": "0", **environment()["workload"],
+    }
+    sizes = {
+        "invoke": [(f"c{n}", n) for n in args.invoke_concurrency],
+        "ingest_pdf": [(f"{n}p", n) for n in args.pdf_pages],
+        "ingest_html": [(f"{n}p", n) for n in args.html_pages],
+    }
+    results = {}
+    try:
+        for scenario in args.scenarios:
+            if scenario == "cold_start":
+                results["cold_start"] = run_cold_start(args, env)
+                continue
+            for label, size in sizes[scenario]:
+                results[f"{scenario}/{label}"] = run_child(scenario, size, args, env)
+    finally:
+        stub.terminate()
+    return results
+
+
+# Settings that change the work a scenario does, recorded so a baseline taken with others does not match
+WORKLOAD_SETTINGS = {
+    "CHUNK_STRATEGY": "structure", "CHUNK_TOKENS": "250", "CHUNK_MIN_TOKENS": "50", "CHUNK_OVERLAP": "sentence",
+    "CHUNK_OVERLAP_TOKENS": "40", "CHUNK_TOKENIZER": "approx", "CONTEXT_BUILDER": "true", "CONTEXT_TOKENIZER": "approx",
+    "CONTEXT_MAX_TOKENS": "3000", "RETRIEVAL_MODE": "hybrid", "RETRIEVAL_K": "4",
+}
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(terse=True),
+        "cpus": os.cpu_count(),
+        "workload": {name: os.getenv(name, default) for name, default in WORKLOAD_SETTINGS.items()},
+    }
+
+
+def compare(results, baseline, args):
+    """
+    Checks results against a baseline run.
+
+    A metric regresses when it got worse by more than `tolerance` (a
+    fraction) and, for latencies and memory, by more than the absolute noise
+    floor, so sub-millisecond jitter is not reported.
+
+    Returns:
+        dict -> regressions and improvements, one entry per scenario and metric
+    """
+    floors = {"p50_ms": args.min_delta_ms, "p95_ms": args.min_delta_ms, "p99_ms": args.min_delta_ms,
+              "peak_rss_mb": args.min_delta_mb, "throughput": 0}
+    regressions, improvements, missing = [], [], []
+    for name, current in results.items():
+        before = baseline["scenarios"].get(name)
+        if before is None:
+            missing.append(name)
+            continue
+        for metric, higher_is_better in COMPARED.items():
+            old, new = before.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            if abs(new - old) <= floors[metric] or abs(worse) <= args.tolerance:
+                continue
+            entry = {"scenario": name, "metric": metric, "baseline": old, "current": new,
+                     "change_pct": round(change * 100, 1)}
+            (regressions if worse > 0 else improvements).append(entry)
+    return {
+        "baseline": args.baseline,
+        "tolerance": args.tolerance,
+        "environment_matches": baseline.get("environment") == environment(),
+        "not_in_baseline": missing,
+        "regressions": regressions,
+        "improvements": improvements,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=SCENARIOS)
+    parser.add_argument("--invoke-concurrency", type=int, nargs="+", default=[10, 50])
+    parser.add_argument("--requests", type=int, default=400, help="/invoke requests per concurrency level")
+    parser.add_argument("--pdf-pages", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--pdf-documents", type=int, default=3, help="PDFs ingested per page count")
+    parser.add_argument("--html-pages", type=int, nargs="+", default=[50, 200], help="Fixture site sizes")
+    parser.add_argument("--starts", type=int, default=5, help="Cold starts measured")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Stub LLM seconds per completion")
+    parser.add_argument("--search-latency", type=float, default=0.005, help="Simulated vector search round-trip in seconds")
+    parser.add_argument("--llm-port", type=int, default=9120)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results to --baseline")
+    parser.add_argument("--compare", action="store_true", help="Compare with --baseline; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative change before a metric regresses")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="Latency changes below this are noise")
+    parser.add_argument("--min-delta-mb", type=float, default=10.0, help="Peak RSS changes below this are noise")
+    parser.add_argument("--run", nargs=2, metavar=("SCENARIO", "SIZE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        scenario, size = args.run[0], int(args.run[1])
+        if scenario == "cold_start":
+            print(json.dumps(run_first_answer(args)))
+        else:
+            runner = {"invoke": run_invoke, "ingest_pdf": run_ingest_pdf, "ingest_html": run_ingest_html}[scenario]
+            print(json.dumps(runner(size, args)))
+        sys.exit(0)
+
+    report = {"environment": environment(), "scenarios": run(args)}
+    if args.compare:
+        with open(args.baseline) as f:
+            report["comparison"] = compare(report["scenarios"], json.load(f), args)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({"environment": report["environment"], "scenarios": report["scenarios"]}, f, indent=2)
+            f.write("\n")
+
+    print(json.dumps(report, indent=2))
+    if args.compare and report["comparison"]["regressions"]:
+        sys.exit(1)
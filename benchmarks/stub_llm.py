@@ -0,0 +1,180 @@
+"""
+Local stub of an OpenAI-compatible chat completions endpoint for benchmarks.
+
+Run standalone with `python stub_llm.py --port 9000` or start it in-process
+with `start_stub_server()` and point BASE_URL at the returned url.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_handler(latency=0.0, tokens=32, token_latency=0.0, max_concurrency=0, retry_after=1.0,
+                 error_rate=0.0, slow_rate=0.0, slow_latency=1.0, seed=0):
+    """
+    Builds a request handler class with the given simulated behaviour.
+
+    Args:
+        latency -> float: Seconds to wait before the first byte of the response.
+        tokens -> int: Number of tokens in every completion.
+        token_latency -> float: Seconds between streamed tokens.
+        max_concurrency -> int: Requests served at once; more get 429 like a rate-limited API (0: no limit).
+        retry_after -> float: Retry-After seconds sent with a 429.
+        error_rate -> float: Share of requests answered with a 503, like an overloaded upstream.
+        slow_rate -> float: Share of requests that wait `slow_latency` instead of `latency` (tail latency).
+        slow_latency -> float: Seconds to wait for a slow request.
+        seed -> int: Seed for the error and slow request draws.
+    """
+    inflight = [0]
+    lock = threading.Lock()
+    rng = random.Random(seed)
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, body, headers=None):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+
+            if not self.path.endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": "not found"}})
+                return
+
+            with lock:
+                limited = max_concurrency and inflight[0] >= max_concurrency
+                if not limited:
+                    inflight[0] += 1
+            if limited:
+                self._send_json(429, {"error": {"message": "rate limited", "type": "rate_limit"}}, {"Retry-After": str(retry_after)})
+                return
+            with lock:
+                failed, slow = rng.random() < error_rate, rng.random() < slow_rate
+            try:
+                if failed:
+                    self._send_json(503, {"error": {"message": "upstream overloaded", "type": "server_error"}})
+                else:
+                    self._complete(request, slow_latency if slow else latency)
+            finally:
+                with lock:
+                    inflight[0] -= 1
+
+        def _complete(self, request, delay):
+            time.sleep(delay)
+            words = [f"tok{i}" for i in range(tokens)]
+            model = request.get("model", "stub")
+
+            if not request.get("stream"):
+                self._send_json(200, {
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": " ".join(words)},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": tokens, "total_tokens": tokens},
+                })
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def write_chunk(data):
+                payload = f"data: {data}\n\n".encode()
+                self.wfile.write(f"{len(payload):x}\r\n".encode() + payload + b"\r\n")
+                self.wfile.flush()
+
+            for i, word in enumerate(words):
+                delta = {"content": word if i == 0 else " " + word}
+                write_chunk(json.dumps({
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": None}],
+                }))
+                time.sleep(token_latency)
+            write_chunk("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+
+    return StubHandler
+
+
+def start_stub_server(port=0, **behaviour):
+    """
+    Starts the stub in a daemon thread.
+
+    Returns:
+        (server, base_url) -> running server and the url to use as BASE_URL
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(**behaviour))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def start_stub_process(port, **behaviour):
+    """
+    Starts the stub in a separate process so it does not compete with the
+    code under test for the GIL.
+
+    Returns:
+        (process, base_url) -> running process and the url to use as BASE_URL
+    """
+    import multiprocessing
+    import socket
+
+    def serve():
+        ThreadingHTTPServer(("127.0.0.1", port), make_handler(**behaviour)).serve_forever()
+
+    process = multiprocessing.get_context("fork").Process(target=serve, daemon=True)
+    process.start()
+
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            break
+        except OSError:
+            time.sleep(0.05)
+    return process, f"http://127.0.0.1:{port}/v1"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub OpenAI-compatible LLM endpoint")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--tokens", type=int, default=32)
+    parser.add_argument("--token-latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--slow-latency", type=float, default=1.0)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(
+        args.latency, args.tokens, args.token_latency,
+        error_rate=args.error_rate, slow_rate=args.slow_rate, slow_latency=args.slow_latency,
+    ))
+    print(f"Stub LLM listening on http://127.0.0.1:{args.port}/v1")
+    server.serve_forever()
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class BackendError(Exception):
+    """Raised when the backend answers with an error status or cannot be reached."""
+
+
+class BackendClient:
+    """
+    Client for the FastAPI backend, shared by every Streamlit session.
+
+    One pooled `requests.Session` keeps connections to the backend alive
+    across reruns. Every call has a connect and a read timeout, so a hung
+    backend shows an error instead of freezing the UI. Connection failures
+    are retried for all calls, and 502/503/504 answers for GET calls (e.g.
+    job polling), honouring `Retry-After`.
+
+    Args:
+        base_url(str) -> backend address
+        connect_timeout(float) -> seconds to establish a connection
+        read_timeout(float) -> seconds to wait for the next bytes of a response
+        retries(int) -> retries after a connection failure or a 502/503/504 on GET
+        pool_size(int) -> connections kept alive to the backend
+    """
+
+    def __init__(self, base_url, connect_timeout=3.05, read_timeout=60, retries=2, pool_size=10):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=0,
+            status=retries,
+            backoff_factor=0.5,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({"GET"}),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _request(self, method, path, **kwargs):
+        """
+        Sends one request and returns (response, round trip in ms).
+
+        Throws:
+            BackendError -> if the backend cannot be reached or does not answer in time
+        """
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, f"{self.base_url}{path}", timeout=self.timeout, **kwargs)
+        except requests.Timeout:
+            raise BackendError(f"The server did not answer within {self.timeout[1]:.0f}s.")
+        except requests.ConnectionError:
+            raise BackendError(f"Could not connect to the server at {self.base_url}.")
+        return response, (time.perf_counter() - start) * 1000
+
+    @staticmethod
+    def _detail(response):
+        try:
+            return response.json()["detail"]
+        except (ValueError, KeyError, TypeError):
+            return f"Server error: {response.status_code}"
+
+    def _accepted(self, response, latency_ms):
+        """Returns the queued job's response body, with the round trip in `round_trip_ms`."""
+        if response.status_code != 202:
+            raise BackendError(self._detail(response))
+        return {**response.json(), "round_trip_ms": latency_ms}
+
+    def stream_answer(self, user_input, metrics, session_id=None):
+        """
+        Calls the streaming endpoint and yields answer tokens as they arrive.
+
+        Args:
+            user_input(str) -> user question
+            metrics(dict) -> filled with the server's response metrics, the client-side
+                             `round_trip_ms` and `first_byte_ms`, or an "error" message
+            session_id(str) -> conversation id, so the server answers follow-ups with the chat history
+        """
+        payload = {"user_query": user_input, "session_id": session_id}
+        start = time.perf_counter()
+        try:
+            server_response, metrics["first_byte_ms"] = self._request("POST", "/invoke/stream", json=payload, stream=True)
+        except BackendError as e:
+            metrics["error"] = str(e)
+            return
+
+        with server_response:
+            if server_response.status_code != 200:
+                metrics["error"] = f"Server error: {server_response.status_code}, Probably due to missing api-key or server code issue."
+                return
+
+            event = None
+            try:
+                for line in server_response.iter_lines(decode_unicode=True):
+                    if line.startswith("event:"):
+                        event = line[len("event:"):].strip()
+                    elif line.startswith("data:"):
+                        data = json.loads(line[len("data:"):])
+                        if event == "metrics":
+                            metrics.update(data)
+                        elif event == "error":
+                            metrics["error"] = f"Exception occurred while generating the response {data['detail']}"
+                        else:
+                            yield data["token"]
+                    elif not line:
+                        event = None
+            except (requests.Timeout, requests.ConnectionError):
+                metrics["error"] = f"The server stopped answering (no data for {self.timeout[1]:.0f}s)."
+            finally:
+                metrics["round_trip_ms"] = (time.perf_counter() - start) * 1000
+
+    def job(self, job_id):
+        """Returns an ingestion job's status."""
+        response, _ = self._request("GET", f"/jobs/{job_id}")
+        if response.status_code != 200:
+            raise BackendError(self._detail(response))
+        return response.json()
+
+    def ingest_url(self, url):
+        return self._accepted(*self._request("POST", "/ingest/url", json={"url": url}))
+
+    def ingest_crawl(self, url, max_depth, max_pages):
+        return self._accepted(*self._request("POST", "/ingest/crawl", json={"urls": [url], "max_depth": max_depth, "max_pages": max_pages}))
+
+    def ingest_pdf(self, name, content, content_type="application/pdf"):
+        return self._accepted(*self._request("POST", "/ingest/pdf", files={"file": (name, content, content_type)}))
+
+
+def file_hash(content):
+    """SHA-256 of an uploaded file's bytes, used to skip re-posting the same upload."""
+    return hashlib.sha256(content).hexdigest()
+
+
+def create_backend_client(base_url):
+    """
+    Creates the backend client from the environment.
+
+        BACKEND_CONNECT_TIMEOUT -> float: Seconds to connect to the backend (default: 3.05).
+        BACKEND_READ_TIMEOUT -> float: Seconds without data before a call fails (default: 60).
+        BACKEND_RETRIES -> int: Retries after connection failures and 502/503/504 on GET (default: 2).
+        BACKEND_POOL_SIZE -> int: Keep-alive connections to the backend (default: 10).
+
+    Args:
+        base_url(str) -> backend address (BACKEND_URL)
+
+    Returns:
+        BackendClient -> configured client
+    """
+    return BackendClient(
+        base_url,
+        connect_timeout=float(os.getenv("BACKEND_CONNECT_TIMEOUT", "3.05")),
+        read_timeout=float(os.getenv("BACKEND_READ_TIMEOUT", "60")),
+        retries=int(os.getenv("BACKEND_RETRIES", "2")),
+        pool_size=int(os.getenv("BACKEND_POOL_SIZE", "10")),
+    )
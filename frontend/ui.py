@@ -1,7 +1,9 @@
 import streamlit as st
 import os
-import requests
+import time
+from uuid import uuid4
 from dotenv import load_dotenv
+from client import BackendError, create_backend_client, file_hash
 
 # Load environment variables
 load_dotenv()
@@ -9,6 +11,8 @@ load_dotenv()
 API_KEY_PLACEHOLDER = "< ----- ADD YOUR API KEY HERE ------ >"
 API_KEY = os.getenv("API_KEY", API_KEY_PLACEHOLDER)
 BACKEND_URL = os.getenv("BACKEND_URL", "http://127.0.0.1:8001")
+# Longest the UI waits on one ingestion job before leaving it running in the background
+JOB_WAIT_TIMEOUT = float(os.getenv("JOB_WAIT_TIMEOUT", "600"))
 
 def getHeader(header):
     """
@@ -28,6 +32,52 @@ def show_fallback_ui():
     st.write("Please update your `.env` file with a valid API key and restart the application.")
 
 
+@st.cache_resource
+def get_backend_client():
+    """One pooled backend client for every session and rerun of this Streamlit server."""
+    return create_backend_client(BACKEND_URL)
+
+
+def wait_for_job(job_id, poll_interval=1.0, timeout=JOB_WAIT_TIMEOUT):
+    """
+    Polls an ingestion job until it finishes, showing live progress.
+
+    Args:
+        job_id(str) -> id returned by the ingest endpoint
+        poll_interval(float) -> seconds between status checks
+        timeout(float) -> seconds to wait before leaving the job running in the background
+
+    Returns:
+        job(dict) -> final job status, or its last status ("queued"/"running") when the wait ran out
+    """
+    deadline = time.monotonic() + timeout
+    with st.status("Ingestion queued...", expanded=True) as status:
+        progress = st.empty()
+        while True:
+            try:
+                job = get_backend_client().job(job_id)
+            except BackendError as e:
+                status.update(label="Lost track of the ingestion", state="error")
+                return {"status": "failed", "error": str(e)}
+            counters = job["progress"]
+            progress.write(f"Chunks embedded: {counters.get('chunks_embedded', 0)} · stored: {counters.get('chunks_stored', 0)}")
+
+            if job["status"] == "succeeded":
+                stages = ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in job["stages"].items())
+                status.update(label=f"Ingestion finished in {job['elapsed_seconds']:.1f}s", state="complete")
+                st.caption(stages)
+                return job
+            if job["status"] == "failed":
+                status.update(label="Ingestion failed", state="error")
+                return job
+            if time.monotonic() >= deadline:
+                status.update(label=f"Ingestion still {job['status']} after {timeout:.0f}s, check {BACKEND_URL}/jobs/{job_id}", state="running")
+                return job
+
+            status.update(label=f"Ingestion {job['status']}...")
+            time.sleep(poll_interval)
+
+
 def create_simple_chat_app():
     """
     Simple chat app for Streamlit UI
@@ -53,6 +103,9 @@ def create_simple_chat_app():
         # Maintain chat history
         if "messages" not in st.session_state:
             st.session_state.messages = []
+        # The server keeps the history for this id
+        if "session_id" not in st.session_state:
+            st.session_state.session_id = uuid4().hex
 
         # Display chat messages
         for message in st.session_state.messages:
@@ -68,41 +121,55 @@ def create_simple_chat_app():
             with st.chat_message("user"):
                 st.markdown(user_input)
 
-            # Generate bot response from server
-            try:
-                server_response = requests.post(f"{BACKEND_URL}/invoke", json={"user_query": user_input})
-                content = "Failed to get a response from the AI."
-                if server_response.status_code == 200:
-                    json_data = server_response.json()
-            
-                    # Check if 'response' key exists in the JSON response
-                    if "response" in json_data:
-                        content = json_data["response"]
-                    else:
-                        content = "Response received but in an unexpected format."
-                else:
-                    content = f"Server error: {server_response.status_code}, Probably due to missing api-key or server code issue."
-            except Exception as e:
-                content = f"Exception occurred while calling the server {e}"
-            
+            # Stream bot response from server and render tokens as they arrive. Every turn goes to the
+            # server, which records it in the session history; repeated questions hit its response cache
+            metrics = {}
+            with st.chat_message("assistant"):
+                try:
+                    content = st.write_stream(get_backend_client().stream_answer(user_input, metrics, st.session_state.session_id))
+                    if not content:
+                        content = metrics.get("error", "Failed to get a response from the AI.")
+                        st.markdown(content)
+                    elif "error" in metrics:
+                        st.error(metrics["error"])
+                except Exception as e:
+                    content = f"Exception occurred while calling the server {e}"
+                    st.markdown(content)
+
+                timings = []
+                if "ttft_ms" in metrics:
+                    timings.append(f"First token {metrics['ttft_ms']:.0f} ms · {metrics['tokens_per_sec'] or 0:.1f} tokens/sec · total {metrics['total_ms']:.0f} ms")
+                if "round_trip_ms" in metrics:
+                    timings.append(f"round trip {metrics['round_trip_ms']:.0f} ms")
+                if timings:
+                    st.caption(" · ".join(timings))
+
             # Store the bot response in session state
             st.session_state.messages.append({"role": "assistant", "content": content})
-
-            # Display bot response
-            with st.chat_message("assistant"):
-                st.markdown(content)
     elif section == "RAG Ingestion Web":
         getHeader("RAG Web URL Ingestion")
 
         url = st.text_input("Enter the document URL:")
+        depth = st.number_input("Follow links up to depth (0 ingests only this page):", min_value=0, max_value=5, value=0)
+        max_pages = st.number_input("Maximum pages to crawl:", min_value=1, max_value=5000, value=100, disabled=depth == 0)
         if st.button("Ingest URL"):
             if url:
-                response = requests.post(f"{BACKEND_URL}/ingest/url", json={"url": url})
-
-                if response.status_code == 200:
-                    st.success(response.json()["message"])
+                try:
+                    if depth == 0:
+                        queued = get_backend_client().ingest_url(url)
+                    else:
+                        queued = get_backend_client().ingest_crawl(url, depth, max_pages)
+                except BackendError as e:
+                    st.error(f"Error: {e}")
                 else:
-                    st.error(f"Error: {response.json()['detail']}")
+                    st.caption(f"Queued in {queued['round_trip_ms']:.0f} ms")
+                    job = wait_for_job(queued["job_id"])
+                    if job["status"] == "succeeded":
+                        st.success(f"Successfully ingested content from {url} into VectorDB.")
+                    elif job["status"] == "failed":
+                        st.error(f"Error: {job['error']}")
+                    else:
+                        st.info("The ingestion is still running in the background.")
             else:
                 st.warning("Please enter a URL.")
 
@@ -112,15 +179,36 @@ def create_simple_chat_app():
 
         uploaded_file = st.file_uploader("Upload a file:", type=["pdf"])
 
+        # Outcome of each file ingested in this session, by content hash, so reruns don't re-post it
+        if "uploads" not in st.session_state:
+            st.session_state.uploads = {}
+
         if uploaded_file is not None:
-            # Convert the uploaded file into a format requests can handle
-            files = {"file": (uploaded_file.name, uploaded_file, uploaded_file.type)}
-            response = requests.post(f"{BACKEND_URL}/ingest/pdf", files=files)
-            
-            if response.status_code == 200:
-                st.success(f"File '{uploaded_file.name}' uploaded  and file embedding stored in vectordb successfully!") 
+            content = uploaded_file.getvalue()
+            digest = file_hash(content)
+            job = st.session_state.uploads.get(digest)
+            if job is not None:
+                st.info(f"'{uploaded_file.name}' has the same content as a file already uploaded in this session, so it was not sent again.")
+                if job["status"] not in ("succeeded", "failed"):
+                    job = st.session_state.uploads[digest] = wait_for_job(job["job_id"])
             else:
-                st.error(f"Failed to upload: {response.json()['detail']}")
+                try:
+                    queued = get_backend_client().ingest_pdf(uploaded_file.name, content, uploaded_file.type)
+                except BackendError as e:
+                    st.error(f"Failed to upload: {e}")
+                else:
+                    st.caption(f"Uploaded in {queued['round_trip_ms']:.0f} ms")
+                    job = wait_for_job(queued["job_id"])
+                    st.session_state.uploads[digest] = job
+
+            if job is not None and job["status"] == "succeeded":
+                st.success(f"File '{uploaded_file.name}' uploaded  and file embedding stored in vectordb successfully!")
+            elif job is not None and job["status"] == "failed":
+                # Forgotten, so uploading the file again retries it
+                st.session_state.uploads.pop(digest, None)
+                st.error(f"Failed to ingest: {job['error']}")
+            elif job is not None:
+                st.info("The ingestion is still running in the background; it is checked again on the next rerun.")
 
 
 
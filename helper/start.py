@@ -1,5 +1,9 @@
 import os
+import signal
 import subprocess
+import sys
+import tempfile
+import time
 
 parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 frontend_dir = os.path.join(parent_dir, "frontend")
@@ -48,3 +52,79 @@ def start_all():
             server_process.terminate()
         if ui_process:
             ui_process.terminate()
+
+
+def start_embed_server(socket_path):
+    """Start the process that holds the one copy of the embedding model shared by all workers."""
+    print("Starting the embedding server....")
+    return subprocess.Popen([sys.executable, "embed_server.py", "--uds", socket_path], cwd=backend_dir, start_new_session=True)
+
+
+def start_production(workers=None, host="0.0.0.0", port=8001, shared_embeddings=True):
+    """
+    Start the FastAPI server with several worker processes, without auto-reload.
+
+    The embedding model is loaded once, in a separate embedding server, and
+    the workers embed through it over a Unix socket, so adding workers adds
+    cores without adding model copies. Sessions, the response cache and job
+    states move to SQLite files every worker shares unless configured
+    otherwise. On SIGTERM or Ctrl+C the workers stop accepting connections and
+    finish in-flight requests and ingestion jobs (up to SHUTDOWN_TIMEOUT
+    seconds) before the embedding server is stopped.
+
+        WEB_CONCURRENCY -> int: Worker processes when `workers` is not given (default: CPU count).
+        SHUTDOWN_TIMEOUT -> int: Seconds allowed to drain requests and jobs on shutdown (default: 30).
+
+    Args:
+        workers -> int or None: Worker processes.
+        host -> str, port -> int: Address to listen on.
+        shared_embeddings -> bool: Serve the model from one embedding server (False loads it in every worker).
+
+    Returns:
+        int -> exit code of the server
+    """
+    workers = workers or int(os.getenv("WEB_CONCURRENCY", "0")) or os.cpu_count() or 1
+    drain_timeout = os.getenv("SHUTDOWN_TIMEOUT", "30")
+    env = {**os.environ, "SERVE_WORKERS": str(workers), "SHUTDOWN_TIMEOUT": drain_timeout}
+    if workers > 1:
+        env.setdefault("SESSION_STORE", "disk")
+        env.setdefault("RESPONSE_CACHE", "disk")
+        env.setdefault("JOBS_STATE_PATH", "./jobs_state/jobs.sqlite")
+
+    embed_server = None
+    if shared_embeddings:
+        socket_path = env.setdefault("EMBED_SERVER", os.path.join(tempfile.gettempdir(), f"rag-embed-{os.getpid()}.sock"))
+        embed_server = start_embed_server(socket_path)
+    else:
+        env.pop("EMBED_SERVER", None)
+
+    print(f"Starting the FastAPI Server with {workers} workers....")
+    # Own session, so Ctrl+C reaches the workers once, through uvicorn, rather than also directly
+    server = subprocess.Popen(
+        ["uvicorn", "server:app", "--host", host, "--port", str(port), "--workers", str(workers),
+         "--timeout-graceful-shutdown", drain_timeout],
+        cwd=backend_dir, env=env, start_new_session=True,
+    )
+
+    def forward(signum, frame):
+        server.send_signal(signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    try:
+        while server.poll() is None:
+            if embed_server is not None and embed_server.poll() is not None:
+                print("Embedding server exited, stopping the workers....")
+                server.send_signal(signal.SIGTERM)
+                break
+            time.sleep(0.5)
+        # The shutdown hooks drain ingestion jobs for up to SHUTDOWN_TIMEOUT after the requests
+        return server.wait(timeout=2 * float(drain_timeout) + 10)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        return server.wait()
+    finally:
+        print("Shutting down gracefully....")
+        if embed_server is not None and embed_server.poll() is None:
+            embed_server.terminate()
+            embed_server.wait()